@@ -0,0 +1,213 @@
+"""Lazy temporal binning of microscopy series."""
+
+from typing import Optional
+
+import numpy as np
+
+import ndx_microscopy
+from ndx_microscopy.streaming import _get_frames_per_chunk, stream_microscopy_frames
+
+BINNING_METHODS = ("mean", "sum", "max")
+
+
+class TemporallyBinnedMicroscopySeries:
+    """A lazy view of a microscopy series whose frames are binned in time.
+
+    Each binned frame is the mean, sum or max of ``bin_size`` consecutive frames of the source series; trailing
+    frames that do not fill a whole bin are dropped. Binned frames are computed from the source data only when
+    indexed, reading the source in blocks of whole bins, and the view has the ``rate``, ``starting_time`` and
+    ``timestamps`` of the binned frames, each at the mean time of the frames of its bin.
+
+    Use ``to_microscopy_series`` to write the binned frames as a new microscopy series without ever loading the
+    full-rate movie.
+
+    Parameters
+    ----------
+    microscopy_series : PlanarMicroscopySeries or VolumetricMicroscopySeries
+        The series to bin.
+    bin_size : int
+        Number of consecutive frames in each bin.
+    method : str, default: "mean"
+        How the frames of a bin are combined: "mean", "sum" or "max".
+    dtype : numpy.dtype, optional
+        Data type of the binned frames. Defaults to the data type of the source for "max", and to at least
+        float32 for "mean" and "sum".
+    frames_per_chunk : int, optional
+        Approximate number of source frames read at once, rounded down to whole bins. Defaults to blocks of about
+        64 MB, aligned to the storage chunks of the data.
+
+    Raises
+    ------
+    ValueError
+        If bin_size is not positive or larger than the number of frames, or method is not supported.
+    """
+
+    def __init__(
+        self,
+        microscopy_series: ndx_microscopy.MicroscopySeries,
+        bin_size: int,
+        method: str = "mean",
+        dtype: Optional[np.dtype] = None,
+        frames_per_chunk: Optional[int] = None,
+    ):
+        if method not in BINNING_METHODS:
+            raise ValueError(f"'method' must be one of {BINNING_METHODS}, got '{method}'.")
+        source_data = microscopy_series.data
+        if not hasattr(source_data, "shape"):
+            source_data = np.asarray(source_data)
+        if not 1 <= bin_size <= source_data.shape[0]:
+            raise ValueError(
+                f"'bin_size' must be between 1 and the number of frames ({source_data.shape[0]}), got {bin_size}."
+            )
+
+        self.microscopy_series = microscopy_series
+        self.bin_size = bin_size
+        self.method = method
+        self.source_data = source_data
+        if dtype is None:
+            dtype = source_data.dtype if method == "max" else np.result_type(source_data.dtype, np.float32)
+        self.dtype = np.dtype(dtype)
+        frames_per_chunk = frames_per_chunk or _get_frames_per_chunk(data=source_data)
+        self.bins_per_chunk = max(1, frames_per_chunk // bin_size)
+
+    @property
+    def name(self):
+        return self.microscopy_series.name
+
+    @property
+    def number_of_bins(self):
+        return self.source_data.shape[0] // self.bin_size
+
+    @property
+    def shape(self):
+        return (self.number_of_bins,) + tuple(self.source_data.shape[1:])
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    @property
+    def data(self):
+        """The binned frames, as this lazy view."""
+        return self
+
+    @property
+    def rate(self):
+        if self.microscopy_series.rate is None:
+            return None
+        return self.microscopy_series.rate / self.bin_size
+
+    @property
+    def starting_time(self):
+        if self.microscopy_series.rate is None:
+            return None
+        source_rate, source_starting_time = self.microscopy_series.rate, self.microscopy_series.starting_time or 0.0
+        return source_starting_time + (self.bin_size - 1) / (2 * source_rate)
+
+    @property
+    def timestamps(self):
+        if self.microscopy_series.timestamps is None:
+            return None
+        source_timestamps = np.asarray(self.microscopy_series.timestamps[: self.number_of_bins * self.bin_size])
+        return source_timestamps.reshape(self.number_of_bins, self.bin_size).mean(axis=1)
+
+    def __len__(self):
+        return self.number_of_bins
+
+    def _read_bins(self, start, stop):
+        """Bin the source frames of bins [start, stop), reading them in blocks of whole bins."""
+        binned_frames = np.empty(shape=(stop - start,) + self.shape[1:], dtype=self.dtype)
+        for block_start in range(start, stop, self.bins_per_chunk):
+            block_stop = min(block_start + self.bins_per_chunk, stop)
+            frames = np.asarray(self.source_data[block_start * self.bin_size : block_stop * self.bin_size])
+            frames = frames.reshape((block_stop - block_start, self.bin_size) + frames.shape[1:])
+            if self.method == "max":
+                binned_frames[block_start - start : block_stop - start] = frames.max(axis=1)
+            else:
+                reduce = np.mean if self.method == "mean" else np.sum
+                binned_frames[block_start - start : block_stop - start] = reduce(frames, axis=1, dtype=np.float64)
+        return binned_frames
+
+    def __getitem__(self, key):
+        time_key, spatial_key = (key[0], key[1:]) if isinstance(key, tuple) else (key, ())
+        bins = np.arange(self.number_of_bins)[time_key]
+        if np.ndim(bins) == 0:
+            return self._read_bins(start=int(bins), stop=int(bins) + 1)[0][spatial_key]
+        if len(bins) > 0 and np.all(np.diff(bins) == 1):
+            binned_frames = self._read_bins(start=int(bins[0]), stop=int(bins[-1]) + 1)
+        else:
+            binned_frames = np.empty(shape=(len(bins),) + self.shape[1:], dtype=self.dtype)
+            for index, binned_frame in enumerate(bins):
+                binned_frames[index] = self._read_bins(start=int(binned_frame), stop=int(binned_frame) + 1)[0]
+        return binned_frames[(slice(None),) + spatial_key]
+
+    def __iter__(self):
+        for block_start in range(0, self.number_of_bins, self.bins_per_chunk):
+            yield from self._read_bins(
+                start=block_start, stop=min(block_start + self.bins_per_chunk, self.number_of_bins)
+            )
+
+    def to_microscopy_series(
+        self,
+        name: Optional[str] = None,
+        description: Optional[str] = None,
+        frames_per_chunk: Optional[int] = None,
+        compression: Optional[str] = "gzip",
+        compression_opts: Optional[int] = 4,
+    ) -> ndx_microscopy.MicroscopySeries:
+        """Create a microscopy series of the same type as the source whose data is streamed from the binned frames.
+
+        No source frame is read when the series is created: the binned frames are only computed, block by block,
+        when the NWB file is written.
+
+        Parameters
+        ----------
+        name : str, optional
+            Name of the new series. Defaults to the name of the source with a suffix, e.g., "PlanarMicroscopySeries"
+            binned by 4 is named "PlanarMicroscopySeriesBinned4".
+        description : str, optional
+            Description of the new series. Defaults to the description of the source and how it was binned.
+        frames_per_chunk : int, optional
+            Number of binned frames per storage chunk, see ``stream_microscopy_frames``.
+        compression : str, default: "gzip"
+            HDF5 compression filter of the data; None to disable compression.
+        compression_opts : int, default: 4
+            Options of the compression filter, e.g., the gzip level.
+
+        Returns
+        -------
+        PlanarMicroscopySeries or VolumetricMicroscopySeries
+            The binned series, with the devices, light paths, imaging space and units of the source.
+        """
+        source = self.microscopy_series
+        if isinstance(source, ndx_microscopy.PlanarMicroscopySeries):
+            imaging_space = dict(planar_imaging_space=source.planar_imaging_space)
+        else:
+            imaging_space = dict(volumetric_imaging_space=source.volumetric_imaging_space)
+        if source.timestamps is not None:
+            timing = dict(timestamps=self.timestamps)
+        else:
+            timing = dict(starting_time=self.starting_time, rate=self.rate)
+
+        binning_description = f"Frames binned in time by {self.bin_size} ({self.method})."
+        return type(source)(
+            name=name or f"{source.name}Binned{self.bin_size}",
+            description=description or f"{source.description} {binning_description}".strip(),
+            microscope=source.microscope,
+            excitation_light_path=source.excitation_light_path,
+            emission_light_path=source.emission_light_path,
+            data=stream_microscopy_frames(
+                iter(self),
+                number_of_frames=self.number_of_bins,
+                frame_shape=self.shape[1:],
+                dtype=self.dtype,
+                frames_per_chunk=frames_per_chunk,
+                compression=compression,
+                compression_opts=compression_opts,
+            ),
+            unit=source.unit,
+            conversion=source.conversion,
+            offset=source.offset,
+            **imaging_space,
+            **timing,
+        )
@@ -0,0 +1,123 @@
+"""Recommendation of HDF5 chunk shapes for microscopy datasets based on how they will be read."""
+
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+
+# Default target size of a chunk, the size of the default HDF5 chunk cache of each dataset
+DEFAULT_CHUNK_SIZE_IN_BYTES = 1024**2
+
+ACCESS_PATTERNS = ("frame", "time", "block")
+
+
+def _get_block_chunk_shape(data_shape, itemsize, chunk_size_in_bytes):
+    """Shrink the largest axes of data_shape one at a time until a chunk of that shape fits in chunk_size_in_bytes."""
+    chunk_shape = list(data_shape)
+    while int(np.prod(chunk_shape)) * itemsize > chunk_size_in_bytes and max(chunk_shape) > 1:
+        largest_axis = int(np.argmax(chunk_shape))
+        chunk_shape[largest_axis] = (chunk_shape[largest_axis] + 1) // 2
+    return tuple(chunk_shape)
+
+
+def recommend_chunk_shape(
+    data_shape: Sequence[int],
+    dtype: np.dtype,
+    access_pattern: str = "frame",
+    chunk_size_in_bytes: int = DEFAULT_CHUNK_SIZE_IN_BYTES,
+) -> Tuple[int, ...]:
+    """Recommend the chunk shape of a dataset whose first axis is time (or ROIs) for an access pattern.
+
+    Parameters
+    ----------
+    data_shape : sequence of int
+        Shape of the dataset, e.g., (frames, height, width) for a PlanarMicroscopySeries, (frames, height, width,
+        depth) for a VolumetricMicroscopySeries, (frames, ROIs) for a MicroscopyResponseSeries, (ROIs, height,
+        width) for an image_mask column, or (number of elements,) for a pixel_mask or voxel_mask column.
+    dtype : numpy.dtype
+        Data type of the dataset, including compound dtypes such as ``PIXEL_MASK_DTYPE``.
+    access_pattern : str, default: "frame"
+        How the dataset will mostly be read:
+
+        - "frame": whole entries of the first axis, e.g., frames in a viewer. Chunks hold whole frames, as many as
+          fit in the chunk size.
+        - "time": the whole first axis of a few elements of the other axes, e.g., the time series of pixels or
+          the trace of a ROI. Chunks span as much time as fits over a small block of the other axes.
+        - "block": regions spanning all axes. Chunks are the most even split of the dataset that fits.
+    chunk_size_in_bytes : int, default: 1 MB
+        Target size of a chunk. The default matches the default HDF5 chunk cache size of a dataset.
+
+    Returns
+    -------
+    tuple of int
+        The recommended chunk shape.
+
+    Raises
+    ------
+    ValueError
+        If access_pattern is not one of the supported values.
+    """
+    if access_pattern not in ACCESS_PATTERNS:
+        raise ValueError(f"'access_pattern' must be one of {ACCESS_PATTERNS}, got '{access_pattern}'.")
+    data_shape = tuple(max(1, int(length)) for length in data_shape)
+    itemsize = np.dtype(dtype).itemsize
+    number_of_elements_per_chunk = max(1, chunk_size_in_bytes // itemsize)
+    if len(data_shape) == 1 or access_pattern == "block":
+        return _get_block_chunk_shape(data_shape=data_shape, itemsize=itemsize, chunk_size_in_bytes=chunk_size_in_bytes)
+
+    entry_shape = data_shape[1:]
+    if access_pattern == "frame":
+        entries_per_chunk = max(1, number_of_elements_per_chunk // int(np.prod(entry_shape)))
+        return (min(entries_per_chunk, data_shape[0]),) + entry_shape
+
+    # Split the other axes into the most even block that leaves room for the whole first axis, if possible
+    entry_elements_per_chunk = max(1, number_of_elements_per_chunk // data_shape[0])
+    entry_chunk_shape = _get_block_chunk_shape(
+        data_shape=entry_shape, itemsize=1, chunk_size_in_bytes=entry_elements_per_chunk
+    )
+    time_per_chunk = max(1, number_of_elements_per_chunk // int(np.prod(entry_chunk_shape)))
+    return (min(time_per_chunk, data_shape[0]),) + entry_chunk_shape
+
+
+def recommend_data_io_settings(
+    data_shape: Sequence[int],
+    dtype: np.dtype,
+    access_pattern: str = "frame",
+    chunk_size_in_bytes: int = DEFAULT_CHUNK_SIZE_IN_BYTES,
+    compression: Optional[str] = "gzip",
+    compression_opts: Optional[int] = 4,
+) -> dict:
+    """Recommend the ``H5DataIO`` settings of a microscopy dataset for an access pattern.
+
+    Parameters
+    ----------
+    data_shape : sequence of int
+        Shape of the dataset, see ``recommend_chunk_shape``.
+    dtype : numpy.dtype
+        Data type of the dataset.
+    access_pattern : str, default: "frame"
+        How the dataset will mostly be read: "frame", "time" or "block", see ``recommend_chunk_shape``.
+    chunk_size_in_bytes : int, default: 1 MB
+        Target size of a chunk.
+    compression : str, default: "gzip"
+        HDF5 compression filter; None to disable compression.
+    compression_opts : int, default: 4
+        Options of the compression filter, e.g., the gzip level.
+
+    Returns
+    -------
+    dict
+        Keyword arguments for ``H5DataIO``, e.g., ``H5DataIO(data=data, **settings)``.
+    """
+    settings = dict(
+        chunks=recommend_chunk_shape(
+            data_shape=data_shape,
+            dtype=dtype,
+            access_pattern=access_pattern,
+            chunk_size_in_bytes=chunk_size_in_bytes,
+        )
+    )
+    if compression is not None:
+        settings.update(compression=compression)
+        if compression_opts is not None:
+            settings.update(compression_opts=compression_opts)
+    return settings
@@ -0,0 +1,267 @@
+"""Lazy data sources over raw binary and TIFF files of microscopy frames."""
+
+import os
+from abc import ABCMeta, abstractmethod
+from typing import Optional, Tuple
+
+import numpy as np
+from hdmf.data_utils import GenericDataChunkIterator
+
+from ndx_microscopy.chunking import recommend_chunk_shape
+
+# Approximate size of each buffer of whole frames read from the file and written at once
+DEFAULT_BUFFER_SIZE_IN_BYTES = 64 * 1024**2
+
+
+def _split_frame_key(key, ndim):
+    """Split an index of the data into the index of the frames and the index of the axes of each frame."""
+    key = key if isinstance(key, tuple) else (key,)
+    if any(index is Ellipsis for index in key):
+        ellipsis_position = next(position for position, index in enumerate(key) if index is Ellipsis)
+        missing_slices = (slice(None),) * (ndim - len(key) + 1)
+        key = key[:ellipsis_position] + missing_slices + key[ellipsis_position + 1 :]
+    if len(key) > ndim:
+        raise IndexError(f"Too many indices for the {ndim}-dimensional data: {len(key)}.")
+    return key[0], key[1:]
+
+
+class _MicroscopyFileData(GenericDataChunkIterator, metaclass=ABCMeta):
+    """Base of the data sources over the frames of a file, which subclasses open before calling ``__init__``.
+
+    Subclasses set ``_shape`` and ``_dtype``, the keyword arguments that reopen the file as ``_source_kwargs``,
+    and implement ``_read_frames``; a subclass that does not cannot be instantiated.
+    """
+
+    def __init__(
+        self, chunk_shape: Optional[Tuple[int, ...]] = None, buffer_size_in_bytes: int = DEFAULT_BUFFER_SIZE_IN_BYTES
+    ):
+        chunk_shape = tuple(chunk_shape or recommend_chunk_shape(data_shape=self._shape, dtype=self._dtype))
+        frame_size_in_bytes = int(np.prod(self._shape[1:])) * self._dtype.itemsize
+        chunks_per_buffer = max(1, buffer_size_in_bytes // (chunk_shape[0] * frame_size_in_bytes))
+        frames_per_buffer = min(chunks_per_buffer * chunk_shape[0], self._shape[0])
+        super().__init__(chunk_shape=chunk_shape, buffer_shape=(frames_per_buffer,) + tuple(self._shape[1:]))
+
+    def _get_maxshape(self):
+        return self._shape
+
+    def _get_dtype(self):
+        return self._dtype
+
+    def _get_data(self, selection):
+        # Buffers are loaded in memory, as hdmf requires, rather than views of a memory map
+        return np.array(self[selection])
+
+    def _to_dict(self):
+        """Get the arguments that reopen the file, to pickle the data source, e.g., for a parallel Zarr write."""
+        return dict(self._source_kwargs)
+
+    @classmethod
+    def _from_dict(cls, dictionary):
+        return cls(**dictionary)
+
+    @property
+    def shape(self):
+        return self._shape
+
+    @property
+    def ndim(self):
+        return len(self._shape)
+
+    def __len__(self):
+        return self._shape[0]
+
+    @abstractmethod
+    def _read_frames(self, frame_indices):
+        """Read the frames at frame_indices, an array of frame indices, into an array of shape (frames, ...)."""
+        pass
+
+    def __getitem__(self, key):
+        time_key, frame_key = _split_frame_key(key=key, ndim=self.ndim)
+        frame_indices = np.arange(self._shape[0])[time_key]
+        frames = self._read_frames(frame_indices=np.atleast_1d(frame_indices))
+        frames = frames[(slice(None),) + frame_key]
+        return frames[0] if np.ndim(frame_indices) == 0 else frames
+
+    def __array__(self, dtype=None):
+        return np.asarray(self[:], dtype=dtype)
+
+
+class RawBinaryMicroscopyData(_MicroscopyFileData):
+    """Frames of a raw binary file, memory-mapped, to pass as the ``data`` of a microscopy series.
+
+    The file holds the frames one after the other, each in C order: (height, width) for a
+    ``PlanarMicroscopySeries`` or (height, width, depth) for a ``VolumetricMicroscopySeries``, e.g., the
+    ``data.bin`` of suite2p, possibly after a header.
+
+    Indexing the data source, e.g., ``data[100:200]``, reads only the requested frames from the file. When the
+    series is written, the frames are read and written one buffer of whole frames at a time, so a file of any
+    length is converted without loading it into memory. To compress the data, wrap the data source in an
+    ``H5DataIO``, e.g., ``H5DataIO(data=data, compression="gzip")``, or a ``ZarrDataIO``; the storage chunks are
+    those of the data source. Like any data chunk iterator, a data source is consumed when written: create a new
+    one to write it again.
+
+    A data source can be pickled, by reopening its file, so that hdmf-zarr writes its buffers concurrently
+    across processes with ``NWBZarrIO.write(nwbfile, number_of_jobs=...)``.
+
+    Parameters
+    ----------
+    file_path : str or path-like
+        Path of the raw binary file.
+    dtype : numpy.dtype
+        Data type of the pixels, e.g., numpy.int16, including its byte order if not native, e.g., ">u2".
+    frame_shape : tuple of int
+        Shape of each frame: (height, width), or (height, width, depth) for volumes.
+    header_size_in_bytes : int, default: 0
+        Size of the header before the first frame.
+    number_of_frames : int, optional
+        Number of frames to map. Defaults to all the frames of the file.
+    chunk_shape : tuple of int, optional
+        Shape of the storage chunks when written. Defaults to ``recommend_chunk_shape`` for frame access.
+    buffer_size_in_bytes : int, default: 64 MB
+        Approximate size of each buffer of whole frames read and written at once, in whole chunks.
+
+    Raises
+    ------
+    ValueError
+        If the file is not made of whole frames after the header, or has fewer than number_of_frames frames.
+    """
+
+    def __init__(
+        self,
+        file_path: str,
+        dtype: np.dtype,
+        frame_shape: Tuple[int, ...],
+        header_size_in_bytes: int = 0,
+        number_of_frames: Optional[int] = None,
+        chunk_shape: Optional[Tuple[int, ...]] = None,
+        buffer_size_in_bytes: int = DEFAULT_BUFFER_SIZE_IN_BYTES,
+    ):
+        self.file_path = os.fspath(file_path)
+        self._source_kwargs = dict(
+            file_path=self.file_path,
+            dtype=dtype,
+            frame_shape=frame_shape,
+            header_size_in_bytes=header_size_in_bytes,
+            number_of_frames=number_of_frames,
+            chunk_shape=chunk_shape,
+            buffer_size_in_bytes=buffer_size_in_bytes,
+        )
+        self._dtype = np.dtype(dtype)
+        frame_shape = tuple(int(length) for length in frame_shape)
+        frame_size_in_bytes = int(np.prod(frame_shape)) * self._dtype.itemsize
+        data_size_in_bytes = os.path.getsize(self.file_path) - header_size_in_bytes
+        number_of_frames_in_file, remaining_bytes = divmod(data_size_in_bytes, frame_size_in_bytes)
+        if number_of_frames is None:
+            if remaining_bytes != 0:
+                raise ValueError(
+                    f"The {data_size_in_bytes} bytes of '{self.file_path}' after the header are not whole frames of "
+                    f"shape {frame_shape} and data type {self._dtype} ({frame_size_in_bytes} bytes each)."
+                )
+            number_of_frames = number_of_frames_in_file
+        elif number_of_frames > number_of_frames_in_file:
+            raise ValueError(
+                f"'{self.file_path}' has {number_of_frames_in_file} frames, fewer than the {number_of_frames} "
+                "requested."
+            )
+        self._shape = (int(number_of_frames),) + frame_shape
+        self._memmap = np.memmap(
+            self.file_path, dtype=self._dtype, mode="r", offset=header_size_in_bytes, shape=self._shape
+        )
+        super().__init__(chunk_shape=chunk_shape, buffer_size_in_bytes=buffer_size_in_bytes)
+
+    def _read_frames(self, frame_indices):
+        # A run of consecutive frames is a view of the memory map, so that only the pixels selected from it are read
+        if len(frame_indices) > 1 and np.all(np.diff(frame_indices) == 1):
+            return np.asarray(self._memmap[frame_indices[0] : frame_indices[-1] + 1])
+        return np.asarray(self._memmap[frame_indices])
+
+
+class TiffMicroscopyData(_MicroscopyFileData):
+    """Frames of a multi-page TIFF file, read lazily, to pass as the ``data`` of a microscopy series.
+
+    Each page of the file is a (height, width) image; the pages of a volume are consecutive, so the frames of a
+    ``VolumetricMicroscopySeries`` of depth ``number_of_planes`` are groups of that many pages. An uncompressed
+    TIFF is memory-mapped; the pages of any other TIFF are decoded one at a time as they are read.
+
+    Indexing the data source, e.g., ``data[100:200]``, reads only the pages of the requested frames. When the
+    series is written, the frames are read and written one buffer of whole frames at a time, see
+    ``RawBinaryMicroscopyData``, also for writing in parallel with hdmf-zarr.
+
+    Reading TIFF files requires the ``tifffile`` package, e.g., ``pip install ndx-microscopy[tiff]``.
+
+    Parameters
+    ----------
+    file_path : str or path-like
+        Path of the TIFF file.
+    number_of_planes : int, default: 1
+        Number of consecutive pages in each frame. Frames of more than one plane have the shape (height, width,
+        depth).
+    chunk_shape : tuple of int, optional
+        Shape of the storage chunks when written. Defaults to ``recommend_chunk_shape`` for frame access.
+    buffer_size_in_bytes : int, default: 64 MB
+        Approximate size of each buffer of whole frames read and written at once, in whole chunks.
+
+    Raises
+    ------
+    ValueError
+        If the number of pages of the file is not a multiple of number_of_planes.
+    """
+
+    def __init__(
+        self,
+        file_path: str,
+        number_of_planes: int = 1,
+        chunk_shape: Optional[Tuple[int, ...]] = None,
+        buffer_size_in_bytes: int = DEFAULT_BUFFER_SIZE_IN_BYTES,
+    ):
+        try:
+            import tifffile
+        except ImportError:
+            raise ImportError("Reading TIFF files requires the 'tifffile' package: pip install tifffile")
+
+        self.file_path = os.fspath(file_path)
+        self._source_kwargs = dict(
+            file_path=self.file_path,
+            number_of_planes=number_of_planes,
+            chunk_shape=chunk_shape,
+            buffer_size_in_bytes=buffer_size_in_bytes,
+        )
+        self.number_of_planes = number_of_planes
+        self._tiff_file = tifffile.TiffFile(self.file_path)
+        self._pages = self._tiff_file.pages
+        self._pages.useframes = True
+        number_of_pages = len(self._pages)
+        if number_of_pages % number_of_planes != 0:
+            self.close()
+            raise ValueError(
+                f"'{self.file_path}' has {number_of_pages} pages, which is not a multiple of the "
+                f"{number_of_planes} planes of each frame."
+            )
+        first_page = self._pages[0]
+        page_shape = tuple(first_page.shape)
+        self._dtype = np.dtype(first_page.dtype)
+        number_of_frames = number_of_pages // number_of_planes
+        self._shape = (number_of_frames,) + page_shape + ((number_of_planes,) if number_of_planes > 1 else ())
+
+        # Map the pages of an uncompressed file as (frames, planes, height, width) when they are contiguous
+        try:
+            page_memmap = tifffile.memmap(self.file_path, mode="r")
+            self._memmap = page_memmap.reshape((number_of_frames, number_of_planes) + page_shape)
+        except ValueError:
+            self._memmap = None
+        super().__init__(chunk_shape=chunk_shape, buffer_size_in_bytes=buffer_size_in_bytes)
+
+    def _read_frames(self, frame_indices):
+        if self._memmap is not None:
+            frames = self._memmap[frame_indices]
+        else:
+            frames = np.empty(shape=(len(frame_indices), self.number_of_planes) + self._shape[1:3], dtype=self._dtype)
+            for index, frame_index in enumerate(frame_indices):
+                for plane in range(self.number_of_planes):
+                    frames[index, plane] = self._pages[frame_index * self.number_of_planes + plane].asarray()
+        return np.moveaxis(frames, 1, -1) if self.number_of_planes > 1 else frames[:, 0]
+
+    def close(self):
+        """Close the TIFF file."""
+        self._memmap = None
+        self._tiff_file.close()
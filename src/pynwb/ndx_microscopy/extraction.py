@@ -0,0 +1,211 @@
+"""Extraction of ROI responses from microscopy series."""
+
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Sequence
+
+import h5py
+import numpy as np
+import scipy.sparse as sps
+
+import ndx_microscopy
+from ndx_microscopy.streaming import _get_frames_per_chunk
+
+
+def _check_segmentation_matches_series(microscopy_series, segmentation):
+    """Check that a segmentation has the same dimensionality as a microscopy series."""
+    if isinstance(microscopy_series, ndx_microscopy.PlanarMicroscopySeries):
+        expected_segmentation_type = ndx_microscopy.Segmentation2D
+    elif isinstance(microscopy_series, ndx_microscopy.VolumetricMicroscopySeries):
+        expected_segmentation_type = ndx_microscopy.Segmentation3D
+    else:
+        raise ValueError(
+            "microscopy_series must be a PlanarMicroscopySeries or a VolumetricMicroscopySeries, "
+            f"got {type(microscopy_series).__name__}."
+        )
+    if not isinstance(segmentation, expected_segmentation_type):
+        raise ValueError(
+            f"A {type(microscopy_series).__name__} requires a {expected_segmentation_type.__name__}, "
+            f"got {type(segmentation).__name__}."
+        )
+
+
+def _get_roi_weights(segmentation, rois, mask_type, frame_shape):
+    """Get the sparse (number of ROIs, number of pixels) weight matrix of the selected ROIs and its row sums."""
+    roi_weights = segmentation.get_sparse_mask_matrix(mask_type=mask_type, image_shape=frame_shape)
+    roi_weights = sps.csr_matrix(roi_weights[rois], dtype=np.float64)
+    total_weights = np.asarray(roi_weights.sum(axis=1)).ravel()
+    return roi_weights, total_weights
+
+
+def _extract_frames(data, roi_weights, total_weights, start, stop):
+    """Compute the weighted mean of each ROI over the frames [start, stop) of the data."""
+    frames = np.asarray(data[start:stop], dtype=np.float64).reshape(stop - start, -1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return (roi_weights @ frames.T).T / total_weights
+
+
+# State of each worker process of a parallel extraction, set once by _initialize_worker
+_worker_state = dict()
+
+
+def _initialize_worker(file_path, dataset_path, roi_weights, total_weights):
+    """Store the ROI weights and, for HDF5-backed data, the location of the dataset in a worker process."""
+    _worker_state.update(
+        file_path=file_path, dataset_path=dataset_path, roi_weights=roi_weights, total_weights=total_weights
+    )
+
+
+def _extract_frames_in_worker(start, stop, frames=None):
+    """Compute the responses of the frames [start, stop), reading them from the worker's dataset if not given."""
+    if frames is None:
+        # The file is only open while the block is read, so that no handle outlives the block
+        with h5py.File(_worker_state["file_path"], mode="r") as file:
+            frames = file[_worker_state["dataset_path"]][start:stop]
+    return _extract_frames(
+        data=frames,
+        roi_weights=_worker_state["roi_weights"],
+        total_weights=_worker_state["total_weights"],
+        start=0,
+        stop=stop - start,
+    )
+
+
+def _extract_responses_in_parallel(data, roi_weights, total_weights, responses, frames_per_chunk, max_workers):
+    """Fill responses by distributing blocks of frames across a pool of processes.
+
+    Workers of HDF5-backed data read their own blocks from the file when it is open read-only; other data, and data
+    of a file open for writing, which the workers could neither open nor see unflushed changes of, is sent to the
+    workers block by block. At most two blocks per worker are in flight at any time, and results are written in
+    time order.
+    """
+    if isinstance(data, h5py.Dataset) and data.file.mode == "r":
+        file_path, dataset_path = data.file.filename, data.name
+    else:
+        file_path, dataset_path = None, None
+
+    number_of_frames = responses.shape[0]
+    pending_blocks = deque()
+    with ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_initialize_worker,
+        initargs=(file_path, dataset_path, roi_weights, total_weights),
+    ) as executor:
+        for start in range(0, number_of_frames, frames_per_chunk):
+            stop = min(start + frames_per_chunk, number_of_frames)
+            frames = None if file_path is not None else np.asarray(data[start:stop])
+            pending_blocks.append((start, stop, executor.submit(_extract_frames_in_worker, start, stop, frames)))
+            if len(pending_blocks) >= 2 * max_workers:
+                block_start, block_stop, future = pending_blocks.popleft()
+                responses[block_start:block_stop] = future.result()
+        while pending_blocks:
+            block_start, block_stop, future = pending_blocks.popleft()
+            responses[block_start:block_stop] = future.result()
+
+
+def extract_microscopy_response_series(
+    *,
+    microscopy_series: ndx_microscopy.MicroscopySeries,
+    segmentation: ndx_microscopy.Segmentation,
+    name: str = "MicroscopyResponseSeries",
+    description: str = "Weighted mean of each ROI over the frames of the microscopy series.",
+    rois: Optional[Sequence[int]] = None,
+    mask_type: Optional[str] = None,
+    frames_per_chunk: Optional[int] = None,
+    max_workers: int = 1,
+    dtype: np.dtype = np.float32,
+) -> ndx_microscopy.MicroscopyResponseSeries:
+    """Extract the responses of the ROIs of a segmentation from a microscopy series.
+
+    The response of each ROI is the mean of the frame weighted by the ROI mask. All ROIs are computed at once
+    as a sparse mask-by-frame product, reading the data of the microscopy series in blocks of frames so that the
+    whole movie never needs to fit in memory.
+
+    Parameters
+    ----------
+    microscopy_series : PlanarMicroscopySeries or VolumetricMicroscopySeries
+        The imaging data to extract the responses from.
+    segmentation : Segmentation2D or Segmentation3D
+        The segmentation defining the ROIs, matching the dimensionality of the microscopy series.
+    name : str, default: "MicroscopyResponseSeries"
+        Name of the returned MicroscopyResponseSeries.
+    description : str, optional
+        Description of the returned MicroscopyResponseSeries.
+    rois : sequence of int, optional
+        Indices of the ROIs in the segmentation to extract. Defaults to all ROIs.
+    mask_type : str, optional
+        The mask column of the segmentation to use ('pixel_mask', 'voxel_mask' or 'image_mask').
+        See ``get_sparse_mask_matrix``.
+    frames_per_chunk : int, optional
+        Number of frames read at once. Defaults to blocks of about 64 MB, aligned to the storage chunks of the data.
+    max_workers : int, default: 1
+        Number of processes across which the blocks of frames are distributed. With more than one worker, each
+        worker reads its own blocks of HDF5-backed data from a file open read-only. The result is identical to the
+        serial one.
+    dtype : numpy.dtype, default: numpy.float32
+        Data type of the extracted responses.
+
+    Returns
+    -------
+    MicroscopyResponseSeries
+        The responses, shaped (number of frames, number of ROIs), with the same timing, unit and conversion as
+        the microscopy series and a 'rois' region referencing the segmentation. ROIs with no weight have NaN
+        responses.
+
+    Raises
+    ------
+    ValueError
+        If the type of the segmentation does not match the type of the microscopy series, or if 'max_workers' is
+        less than 1.
+    """
+    _check_segmentation_matches_series(microscopy_series=microscopy_series, segmentation=segmentation)
+    if max_workers < 1:
+        raise ValueError(f"'max_workers' must be at least 1, got {max_workers}.")
+
+    data = microscopy_series.data
+    if not hasattr(data, "shape"):
+        data = np.asarray(data)
+    number_of_frames, frame_shape = data.shape[0], tuple(data.shape[1:])
+    rois = list(range(len(segmentation))) if rois is None else [int(roi) for roi in rois]
+    frames_per_chunk = frames_per_chunk or _get_frames_per_chunk(data=data)
+
+    roi_weights, total_weights = _get_roi_weights(
+        segmentation=segmentation, rois=rois, mask_type=mask_type, frame_shape=frame_shape
+    )
+    responses = np.empty(shape=(number_of_frames, len(rois)), dtype=dtype)
+    if max_workers > 1:
+        _extract_responses_in_parallel(
+            data=data,
+            roi_weights=roi_weights,
+            total_weights=total_weights,
+            responses=responses,
+            frames_per_chunk=frames_per_chunk,
+            max_workers=max_workers,
+        )
+    else:
+        for start in range(0, number_of_frames, frames_per_chunk):
+            stop = min(start + frames_per_chunk, number_of_frames)
+            responses[start:stop] = _extract_frames(
+                data=data, roi_weights=roi_weights, total_weights=total_weights, start=start, stop=stop
+            )
+
+    if microscopy_series.timestamps is not None:
+        timing = dict(timestamps=np.asarray(microscopy_series.timestamps[:]))
+    else:
+        timing = dict(starting_time=microscopy_series.starting_time, rate=microscopy_series.rate)
+
+    roi_table_region = segmentation.create_roi_table_region(
+        description=f"ROIs of '{segmentation.name}' extracted from '{microscopy_series.name}'.", region=rois
+    )
+    return ndx_microscopy.MicroscopyResponseSeries(
+        name=name,
+        description=description,
+        data=responses,
+        rois=roi_table_region,
+        unit=microscopy_series.unit,
+        conversion=microscopy_series.conversion,
+        offset=microscopy_series.offset,
+        **timing,
+    )
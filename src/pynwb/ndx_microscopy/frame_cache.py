@@ -0,0 +1,146 @@
+"""Cached random access to the frames of microscopy series."""
+
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# Default bound on the memory held by the decoded blocks of frames of a CachedFrameReader
+DEFAULT_CACHE_SIZE_IN_BYTES = 256 * 1024**2
+
+# Approximate size of a block of frames when the data is not chunked along time
+DEFAULT_BLOCK_SIZE_IN_BYTES = 1024**2
+
+
+class CachedFrameReader:
+    """Random access to the frames of a dataset through a byte-bounded LRU cache of decoded blocks of frames.
+
+    Frames are read a block at a time, a block being the frames of one storage chunk along time for chunked
+    (e.g., HDF5) data, so each chunk is read and decompressed once while it stays in the cache. When the cache
+    would exceed its size, the least recently used blocks are dropped. After each access, the blocks before and
+    after the accessed one are read on a background thread, so that scrubbing through the frames mostly hits the
+    cache.
+
+    Use ``MicroscopySeries.get_cached_frame_reader`` to create one for a microscopy series. Close the reader, or
+    use it as a context manager, to stop its background thread.
+    """
+
+    def __init__(self, data, max_cache_size_in_bytes=DEFAULT_CACHE_SIZE_IN_BYTES, frames_per_block=None, prefetch=True):
+        self.data = data
+        self.number_of_frames = len(data)
+        self.max_cache_size_in_bytes = max_cache_size_in_bytes
+        if frames_per_block is None:
+            storage_chunks = getattr(data, "chunks", None)
+            if storage_chunks:
+                frames_per_block = storage_chunks[0]
+            else:
+                frame_size_in_bytes = int(np.prod(data.shape[1:])) * np.dtype(data.dtype).itemsize
+                frames_per_block = max(1, DEFAULT_BLOCK_SIZE_IN_BYTES // max(1, frame_size_in_bytes))
+        self.frames_per_block = frames_per_block
+        self.number_of_blocks = -(-self.number_of_frames // frames_per_block)
+
+        self.hits, self.misses = 0, 0
+        self._blocks = OrderedDict()
+        self._cache_size_in_bytes = 0
+        self._pending_blocks = dict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1) if prefetch else None
+
+    @property
+    def cache_size_in_bytes(self):
+        """The number of bytes held by the cached blocks."""
+        return self._cache_size_in_bytes
+
+    @property
+    def shape(self):
+        return tuple(self.data.shape)
+
+    def __len__(self):
+        return self.number_of_frames
+
+    def __getitem__(self, key):
+        frames = np.arange(self.number_of_frames)[key]
+        if np.ndim(frames) == 0:
+            return self._get_frame(frame=int(frames))
+        return np.stack([self._get_frame(frame=int(frame)) for frame in frames]) if len(frames) else self.data[0:0]
+
+    def _get_frame(self, frame):
+        block_index, frame_in_block = divmod(frame, self.frames_per_block)
+        return self._get_block(block_index=block_index)[frame_in_block]
+
+    def _read_block(self, block_index):
+        start = block_index * self.frames_per_block
+        return np.asarray(self.data[start : min(start + self.frames_per_block, self.number_of_frames)])
+
+    def _store_block(self, block_index, block):
+        """Add a block to the cache, dropping the least recently used blocks to stay within the cache size."""
+        with self._lock:
+            if block_index in self._blocks or block.nbytes > self.max_cache_size_in_bytes:
+                return
+            self._blocks[block_index] = block
+            self._cache_size_in_bytes += block.nbytes
+            while self._cache_size_in_bytes > self.max_cache_size_in_bytes:
+                _, dropped_block = self._blocks.popitem(last=False)
+                self._cache_size_in_bytes -= dropped_block.nbytes
+
+    def _prefetch_block(self, block_index):
+        block = self._read_block(block_index=block_index)
+        self._store_block(block_index=block_index, block=block)
+        with self._lock:
+            self._pending_blocks.pop(block_index, None)
+        return block
+
+    def _get_block(self, block_index):
+        with self._lock:
+            block = self._blocks.get(block_index)
+            if block is not None:
+                self._blocks.move_to_end(block_index)
+            pending_block = self._pending_blocks.get(block_index) if block is None else None
+
+        if block is not None or pending_block is not None:
+            self.hits += 1
+            block = block if block is not None else pending_block.result()
+        else:
+            self.misses += 1
+            block = self._read_block(block_index=block_index)
+            self._store_block(block_index=block_index, block=block)
+
+        if self._executor is not None:
+            for adjacent_block_index in (block_index + 1, block_index - 1):
+                self._submit_prefetch(block_index=adjacent_block_index)
+        return block
+
+    def _submit_prefetch(self, block_index):
+        if not 0 <= block_index < self.number_of_blocks:
+            return
+        with self._lock:
+            if block_index in self._blocks or block_index in self._pending_blocks:
+                return
+            self._pending_blocks[block_index] = self._executor.submit(self._prefetch_block, block_index)
+
+    def _wait_for_prefetches(self):
+        with self._lock:
+            pending_blocks = list(self._pending_blocks.values())
+        for pending_block in pending_blocks:
+            pending_block.result()
+
+    def clear(self):
+        """Drop all cached blocks and reset the hit and miss counters."""
+        self._wait_for_prefetches()
+        with self._lock:
+            self._blocks.clear()
+            self._cache_size_in_bytes = 0
+        self.hits, self.misses = 0, 0
+
+    def close(self):
+        """Stop the background prefetching thread."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,264 @@
+"""Rigid motion correction of planar microscopy series."""
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple, Union
+
+import numpy as np
+import scipy.fft
+from pynwb import TimeSeries
+
+import ndx_microscopy
+from ndx_microscopy.streaming import _get_frames_per_chunk, _get_frames_per_storage_chunk, stream_microscopy_frames
+
+# Approximate size of the block of frames corrected at once; the Fourier transforms of a block take a few times more
+_READ_BLOCK_SIZE_IN_BYTES = 16 * 1024**2
+
+# Fraction of a pixel below which a shift is not considered to move pixels in from outside the frame, so that the
+# subpixel estimate of an integer shift does not blank one more row or column
+_WRAPPED_PIXEL_TOLERANCE = 0.01
+
+
+def _get_search_mask(frame_shape, max_shift):
+    """Get the mask of the circular correlation lags of at most max_shift pixels along each axis."""
+    lags = [np.minimum(np.arange(length), length - np.arange(length)) for length in frame_shape]
+    return (lags[0][:, np.newaxis] <= max_shift[0]) & (lags[1][np.newaxis, :] <= max_shift[1])
+
+
+def _refine_peak(correlation, peak, axis):
+    """Refine the position of a correlation peak along an axis by fitting a parabola to it and its two neighbours."""
+    length = correlation.shape[axis]
+    neighbours = []
+    for step in (-1, 1):
+        neighbour = list(peak)
+        neighbour[axis] = (peak[axis] + step) % length
+        neighbours.append(correlation[tuple(neighbour)])
+    previous_value, peak_value, next_value = neighbours[0], correlation[tuple(peak)], neighbours[1]
+    curvature = previous_value - 2 * peak_value + next_value
+    if not np.isfinite(curvature) or curvature >= 0:
+        return 0.0
+    return float(np.clip((previous_value - next_value) / (2 * curvature), -0.5, 0.5))
+
+
+def _estimate_shifts(frames, reference_fft, search_mask):
+    """Estimate the shift of each frame relative to the reference by phase correlation.
+
+    Returns the (x, y) shift of each frame, along its first and second axes, such that the frame is the reference
+    moved by that shift.
+    """
+    frames = np.asarray(frames, dtype=np.float32)
+    frame_shape = frames.shape[1:]
+    cross_power = scipy.fft.rfft2(frames) * reference_fft
+    cross_power[:, 0, 0] = 0.0
+    cross_power /= np.abs(cross_power) + np.finfo(np.float32).tiny
+    correlations = scipy.fft.irfft2(cross_power, s=frame_shape)
+    correlations[:, ~search_mask] = -np.inf
+
+    shifts = np.empty((len(frames), 2), dtype=np.float64)
+    for frame_index, correlation in enumerate(correlations):
+        peak = np.unravel_index(np.argmax(correlation), frame_shape)
+        for axis, length in enumerate(frame_shape):
+            lag = peak[axis] if peak[axis] <= length // 2 else peak[axis] - length
+            shifts[frame_index, axis] = lag + _refine_peak(correlation=correlation, peak=peak, axis=axis)
+    return shifts
+
+
+def _apply_shifts(frames, shifts, dtype):
+    """Move each frame back by its (x, y) shift, blanking the pixels moved in from outside the frame."""
+    frames = np.asarray(frames, dtype=np.float32)
+    frame_shape = frames.shape[1:]
+    frame_ffts = scipy.fft.rfft2(frames)
+
+    # Move each frame in the Fourier domain, with the product of a phase ramp along each axis, then blank the pixels
+    # wrapped around the edges
+    frequencies = (scipy.fft.fftfreq(frame_shape[0]), scipy.fft.rfftfreq(frame_shape[1]))
+    phase_ramps = [
+        np.exp(2j * np.pi * shifts[:, axis, np.newaxis] * axis_frequencies).astype(np.complex64)
+        for axis, axis_frequencies in enumerate(frequencies)
+    ]
+    frame_ffts *= phase_ramps[0][:, :, np.newaxis]
+    frame_ffts *= phase_ramps[1][:, np.newaxis, :]
+    corrected_frames = scipy.fft.irfft2(frame_ffts, s=frame_shape)
+    for corrected_frame, shift in zip(corrected_frames, shifts):
+        for axis, (length, axis_shift) in enumerate(zip(frame_shape, shift)):
+            wrapped_length = min(int(np.ceil(abs(axis_shift) - _WRAPPED_PIXEL_TOLERANCE)), length)
+            if wrapped_length == 0:
+                continue
+            wrapped = slice(length - wrapped_length, None) if axis_shift > 0 else slice(None, wrapped_length)
+            corrected_frame[(slice(None),) * axis + (wrapped,)] = 0.0
+
+    if np.issubdtype(dtype, np.integer):
+        dtype_info = np.iinfo(dtype)
+        corrected_frames = np.clip(np.round(corrected_frames), dtype_info.min, dtype_info.max)
+    return corrected_frames.astype(dtype)
+
+
+def _map_blocks(data, function, frames_per_chunk, max_workers):
+    """Read blocks of frames in the calling thread and map function(frames, start) over them in a pool of threads.
+
+    The results are yielded in order, with at most two blocks per thread in memory.
+    """
+    number_of_frames = data.shape[0]
+    pending_blocks = deque()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for start in range(0, number_of_frames, frames_per_chunk):
+            frames = np.asarray(data[start : min(start + frames_per_chunk, number_of_frames)])
+            pending_blocks.append(executor.submit(function, frames, start))
+            if len(pending_blocks) >= 2 * max_workers:
+                yield pending_blocks.popleft().result()
+        while pending_blocks:
+            yield pending_blocks.popleft().result()
+
+
+def _iter_corrected_frames(data, shifts, frames_per_chunk, max_workers):
+    """Iterate over the frames of data moved back by their shifts, correcting blocks of frames in a pool."""
+
+    def correct_block(frames, start):
+        return _apply_shifts(frames=frames, shifts=shifts[start : start + len(frames)], dtype=data.dtype)
+
+    for corrected_frames in _map_blocks(
+        data=data, function=correct_block, frames_per_chunk=frames_per_chunk, max_workers=max_workers
+    ):
+        yield from corrected_frames
+
+
+def correct_rigid_motion(
+    *,
+    planar_microscopy_series: ndx_microscopy.PlanarMicroscopySeries,
+    reference_image: Union[ndx_microscopy.SummaryImage, np.ndarray],
+    max_shift: Optional[Tuple[int, int]] = None,
+    name: Optional[str] = None,
+    shifts_name: Optional[str] = None,
+    frames_per_chunk: Optional[int] = None,
+    max_workers: int = 1,
+    compression: Optional[str] = "gzip",
+    compression_opts: Optional[int] = 4,
+) -> Tuple[ndx_microscopy.PlanarMicroscopySeries, TimeSeries]:
+    """Correct the rigid motion of a PlanarMicroscopySeries against a reference image.
+
+    The shift of each frame is estimated with subpixel precision by phase correlation with the reference image,
+    computed with batched FFTs over blocks of frames, and the frame is moved back by it in the Fourier domain.
+    Pixels moved in from outside the frame are 0.
+
+    Correcting a series costs two full reads of its data, in blocks of frames. Calling this function reads the
+    whole series once to estimate the shift of every frame, which are returned in memory. The corrected frames are
+    only computed when the corrected series is written, which reads the series a second time and streams them into
+    its dataset. The memory used is bounded by a few blocks of frames, whatever the order in which the returned
+    series are written.
+
+    The blocks are processed across a pool of threads, as the FFTs release the GIL. The pool used to estimate the
+    shifts is shut down before this function returns; the pool correcting the frames is only started when the
+    corrected series is written, and shut down once all its frames are written.
+
+    Parameters
+    ----------
+    planar_microscopy_series : PlanarMicroscopySeries
+        The series to correct.
+    reference_image : SummaryImage or numpy.ndarray
+        The image the frames are aligned to, of the same (height, width) as the frames, e.g., the "mean" summary
+        image from ``compute_summary_images``.
+    max_shift : tuple of int, optional
+        Largest shift, in pixels, searched along each axis of the frames. Defaults to half the frame.
+    name : str, optional
+        Name of the corrected series. Defaults to the name of the series followed by "MotionCorrected".
+    shifts_name : str, optional
+        Name of the series of shifts. Defaults to the name of the series followed by "MotionShifts".
+    frames_per_chunk : int, optional
+        Number of frames processed at once. Defaults to blocks of about 16 MB, aligned to the storage chunks of the
+        data.
+    max_workers : int, default: 1
+        Number of threads across which the blocks of frames are processed. At most two blocks per thread are in
+        memory at any time.
+    compression : str, default: "gzip"
+        HDF5 compression filter of the corrected data; None to disable compression.
+    compression_opts : int, default: 4
+        Options of the compression filter, e.g., the gzip level.
+
+    Returns
+    -------
+    PlanarMicroscopySeries
+        The corrected series, with the imaging space, devices, light paths, timing and data type of the series.
+    TimeSeries
+        The (x, y) shift of each frame in pixels, along the first (height) and second (width) axes of the frame as
+        in ``pixel_mask``, with the timing of the series: the frame is the reference image moved by this shift.
+
+    Raises
+    ------
+    ValueError
+        If the reference image does not have the shape of the frames.
+    """
+    data = planar_microscopy_series.data
+    if not hasattr(data, "shape"):
+        data = np.asarray(data)
+    frame_shape = tuple(data.shape[1:])
+    reference_image = (
+        reference_image.data if isinstance(reference_image, ndx_microscopy.SummaryImage) else reference_image
+    )
+    reference_image = np.asarray(reference_image, dtype=np.float32)
+    if reference_image.shape != frame_shape:
+        raise ValueError(
+            f"'reference_image' must have the shape of the frames {frame_shape}, got {reference_image.shape}."
+        )
+
+    max_shift = max_shift or (frame_shape[0] // 2, frame_shape[1] // 2)
+    reference_fft = np.conj(scipy.fft.rfft2(reference_image - reference_image.mean()))
+    frames_per_chunk = frames_per_chunk or _get_frames_per_chunk(
+        data=data, chunk_size_in_bytes=_READ_BLOCK_SIZE_IN_BYTES
+    )
+    search_mask = _get_search_mask(frame_shape=frame_shape, max_shift=max_shift)
+
+    def estimate_block_shifts(frames, start):
+        return _estimate_shifts(frames=frames, reference_fft=reference_fft, search_mask=search_mask)
+
+    shifts = np.concatenate(
+        list(
+            _map_blocks(
+                data=data, function=estimate_block_shifts, frames_per_chunk=frames_per_chunk, max_workers=max_workers
+            )
+        )
+    )
+
+    number_of_frames = data.shape[0]
+    frames_per_storage_chunk = min(
+        _get_frames_per_storage_chunk(frame_shape=frame_shape, dtype=data.dtype), number_of_frames
+    )
+    source = planar_microscopy_series
+    if source.timestamps is not None:
+        timing = dict(timestamps=np.asarray(source.timestamps[:]))
+    else:
+        timing = dict(starting_time=source.starting_time, rate=source.rate)
+
+    corrected_series = ndx_microscopy.PlanarMicroscopySeries(
+        name=name or f"{source.name}MotionCorrected",
+        description=f"'{source.name}' corrected for rigid motion: {source.description}",
+        microscope=source.microscope,
+        excitation_light_path=source.excitation_light_path,
+        emission_light_path=source.emission_light_path,
+        planar_imaging_space=source.planar_imaging_space,
+        data=stream_microscopy_frames(
+            _iter_corrected_frames(
+                data=data, shifts=shifts, frames_per_chunk=frames_per_chunk, max_workers=max_workers
+            ),
+            number_of_frames=number_of_frames,
+            frame_shape=frame_shape,
+            dtype=data.dtype,
+            frames_per_chunk=frames_per_storage_chunk,
+            compression=compression,
+            compression_opts=compression_opts,
+        ),
+        unit=source.unit,
+        conversion=source.conversion,
+        offset=source.offset,
+        **timing,
+    )
+    shifts_series = TimeSeries(
+        name=shifts_name or f"{source.name}MotionShifts",
+        description=(
+            f"Rigid (x, y) shift in pixels of each frame of '{source.name}' relative to the reference image, along "
+            "the first and second axes of the frames; the corrected frames are moved back by this shift."
+        ),
+        data=shifts,
+        unit="pixels",
+        **timing,
+    )
+    return corrected_series, shifts_series
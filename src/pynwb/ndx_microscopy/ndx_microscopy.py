@@ -1,65 +1,33 @@
+import os
+
+import h5py
+from hdmf.data_utils import DataIO
+from hdmf.query import HDMFDataset
 from hdmf.utils import docval, popargs
 from pynwb import get_class, register_class
 from pynwb.core import MultiContainerInterface
 from ndx_ophys_devices import ExcitationSource, Photodetector, Indicator
 import numpy as np
 
-extension_name = "ndx-microscopy"
+from .frame_cache import DEFAULT_CACHE_SIZE_IN_BYTES, CachedFrameReader
+from .segmentation import (
+    PIXEL_MASK_DTYPE,
+    VOXEL_MASK_DTYPE,
+    _add_segmentation_methods,
+    _create_annulus_masks,
+    _get_image_shape,
+    _get_roi_plane_index,
+    _image_masks_to_mask_array,
+    _read_masks,
+)
+from .time_index import FrameTimeIndex
 
+extension_name = "ndx-microscopy"
 
 # Segmentation2D API functions
 
 Segmentation2D = get_class("Segmentation2D", extension_name)
-
-
-@docval(
-    {
-        "name": "pixel_mask",
-        "type": "array_data",
-        "default": None,
-        "doc": "pixel mask for 2D ROIs: [(x1, y1, weight1), (x2, y2, weight2), ...]",
-        "shape": (None, 3),
-    },
-    {
-        "name": "image_mask",
-        "type": "array_data",
-        "default": None,
-        "doc": "image with the same size of image where positive values mark this ROI",
-        "shape": [[None] * 2],
-    },
-    {"name": "id", "type": int, "doc": "the ID for the ROI", "default": None},
-    allow_extra=True,
-)
-def add_roi(self, **kwargs):
-    """Add a Region Of Interest (ROI) data to this Segmentation2D.
-
-    Parameters
-    ----------
-    pixel_mask : array_data, optional
-        Pixel mask for 2D ROIs in format [(x1, y1, weight1), (x2, y2, weight2), ...].
-        Each row contains x,y coordinates and weight value for a pixel.
-    image_mask : array_data, optional
-        2D image where positive values mark this ROI.
-    id : int, optional
-        The ID for the ROI. If not provided, will be auto-generated.
-    **kwargs : dict
-        Additional keyword arguments passed to add_row.
-
-    Raises
-    ------
-    ValueError
-        If neither pixel_mask nor image_mask is provided.
-    """
-    pixel_mask, image_mask = popargs("pixel_mask", "image_mask", kwargs)
-    if image_mask is None and pixel_mask is None:
-        raise ValueError("Must provide 'image_mask' and/or 'pixel_mask'")
-    rkwargs = dict(kwargs)
-    if image_mask is not None:
-        rkwargs["image_mask"] = image_mask
-        # TODO: should we check that image_masks shape matches the shape of the FOV in the imaging space?
-    if pixel_mask is not None:
-        rkwargs["pixel_mask"] = pixel_mask
-    return super(Segmentation2D, self).add_row(**rkwargs)
+_add_segmentation_methods(segmentation_class=Segmentation2D, mask_name="pixel_mask", mask_dtype=PIXEL_MASK_DTYPE)
 
 
 @staticmethod
@@ -125,21 +93,134 @@ def image_to_pixel(image_mask):
     """
     if len(image_mask.shape) != 2:
         raise ValueError("image_mask must be 2D (height, width)")
-    pixel_mask = []
-    it = np.nditer(image_mask, flags=["multi_index"])
-    while not it.finished:
-        weight = it[0][()]
-        if weight > 0:
-            x = it.multi_index[0]
-            y = it.multi_index[1]
-            pixel_mask.append([x, y, weight])
-        it.iternext()
-    return pixel_mask
-
-
-Segmentation2D.add_roi = add_roi
+    x_coords, y_coords = np.nonzero(image_mask > 0)
+    weights = image_mask[x_coords, y_coords]
+    return [list(pixel) for pixel in zip(x_coords.tolist(), y_coords.tolist(), weights.tolist())]
+
+
+@staticmethod
+def image_masks_to_pixel_mask(image_masks):
+    """Convert one or many 2D image_masks into a concatenated pixel_mask.
+
+    Parameters
+    ----------
+    image_masks : array-like
+        Either a single 2D image mask of shape (height, width) or a stack of image masks of shape
+        (number of ROIs, height, width). Positive values mark the pixels of each ROI.
+
+    Returns
+    -------
+    pixel_mask : numpy.ndarray
+        Structured array with the ``PIXEL_MASK_DTYPE`` compound dtype (fields 'x', 'y' and 'weight')
+        containing the pixels of all ROIs concatenated in order.
+    pixel_mask_index : numpy.ndarray
+        End offset of each ROI in ``pixel_mask``, following the convention of a VectorIndex.
+
+    Raises
+    ------
+    ValueError
+        If image_masks is neither 2D nor 3D.
+    """
+    image_masks = np.asarray(image_masks)
+    if image_masks.ndim not in (2, 3):
+        raise ValueError("image_masks must be 2D (height, width) or 3D (number of ROIs, height, width)")
+    return _image_masks_to_mask_array(image_masks=image_masks, mask_dtype=PIXEL_MASK_DTYPE)
+
+
+@docval(
+    {"name": "name", "type": str, "doc": "name of the neuropil Segmentation2D", "default": None},
+    {
+        "name": "description",
+        "type": str,
+        "doc": "description of the neuropil Segmentation2D",
+        "default": "Neuropil annulus masks around the ROIs of a segmentation, excluding the pixels of every ROI.",
+    },
+    {"name": "inner_radius", "type": (int, float), "doc": "inner radius of the annuli, in pixels", "default": 3.0},
+    {"name": "outer_radius", "type": (int, float), "doc": "outer radius of the annuli, in pixels", "default": 15.0},
+    {
+        "name": "image_shape",
+        "type": (list, tuple),
+        "doc": "shape (height, width) of the imaging field of view; inferred from the segmentation if not provided",
+        "default": None,
+    },
+    {
+        "name": "mask_type",
+        "type": str,
+        "doc": "the mask column to read, either 'pixel_mask' or 'image_mask'; defaults to pixel_mask if present",
+        "default": None,
+    },
+)
+def create_neuropil_segmentation(self, **kwargs):
+    """Create a companion Segmentation2D with a neuropil annulus mask for every ROI of this segmentation.
+
+    The annulus of each ROI holds the pixels whose distance to the weighted centroid of the ROI is between
+    inner_radius and outer_radius, excluding the pixels that belong to any ROI of this segmentation. The annuli
+    of all ROIs are generated in one batched pass instead of one dilation per ROI.
+
+    Parameters
+    ----------
+    name : str, optional
+        Name of the neuropil segmentation. Defaults to the name of this segmentation followed by 'Neuropil'.
+    description : str, optional
+        Description of the neuropil segmentation.
+    inner_radius : float, default: 3.0
+        Inner radius of the annuli, in pixels.
+    outer_radius : float, default: 15.0
+        Outer radius of the annuli, in pixels.
+    image_shape : tuple, optional
+        Shape (height, width) of the imaging field of view, to which the annuli are clipped. If not provided, it is
+        inferred as in ``get_sparse_mask_matrix``.
+    mask_type : str, optional
+        The mask column to read, either 'pixel_mask' or 'image_mask'. Defaults to 'pixel_mask' if this
+        segmentation has one.
+
+    Returns
+    -------
+    Segmentation2D
+        The neuropil segmentation, with the same PlanarImagingSpace and ROI IDs as this segmentation and its
+        annuli stored as pixel masks with unit weights. If this segmentation is in a SegmentationContainer, the
+        neuropil segmentation is added to the same container.
+
+    Raises
+    ------
+    ValueError
+        If outer_radius is smaller than inner_radius.
+    """
+    name, description, inner_radius, outer_radius, image_shape, mask_type = popargs(
+        "name", "description", "inner_radius", "outer_radius", "image_shape", "mask_type", kwargs
+    )
+    if outer_radius < inner_radius:
+        raise ValueError(f"'outer_radius' ({outer_radius}) must not be smaller than 'inner_radius' ({inner_radius}).")
+    mask_array, mask_index = _read_masks(
+        table=self, mask_name="pixel_mask", mask_dtype=PIXEL_MASK_DTYPE, mask_type=mask_type
+    )
+    if image_shape is None:
+        image_shape = _get_image_shape(table=self, number_of_spatial_dims=2, mask_array=mask_array)
+    annulus_mask_array, annulus_mask_index = _create_annulus_masks(
+        mask_array=mask_array,
+        mask_index=mask_index,
+        image_shape=tuple(image_shape),
+        inner_radius=inner_radius,
+        outer_radius=outer_radius,
+    )
+
+    neuropil_segmentation = Segmentation2D(
+        name=f"{self.name}Neuropil" if name is None else name,
+        description=description,
+        planar_imaging_space=self.planar_imaging_space,
+    )
+    neuropil_segmentation.add_rois(
+        pixel_mask=annulus_mask_array, pixel_mask_index=annulus_mask_index, id=np.asarray(self.id.data[:])
+    )
+    if isinstance(self.parent, SegmentationContainer):
+        self.parent.add_segmentation(segmentations=neuropil_segmentation)
+    return neuropil_segmentation
+
+
 Segmentation2D.pixel_to_image = pixel_to_image
 Segmentation2D.image_to_pixel = image_to_pixel
+Segmentation2D.image_masks_to_pixel_mask = image_masks_to_pixel_mask
+Segmentation2D.create_neuropil_segmentation = create_neuropil_segmentation
 
 
 @docval(
@@ -173,60 +254,42 @@ Segmentation2D.create_roi_table_region = create_roi_table_region
 # Segmentation3D API functions
 
 Segmentation3D = get_class("Segmentation3D", extension_name)
+PlanarImagingSpace = get_class("PlanarImagingSpace", extension_name)
+_add_segmentation_methods(segmentation_class=Segmentation3D, mask_name="voxel_mask", mask_dtype=VOXEL_MASK_DTYPE)
 
+# Number of micrometers in each supported unit of the origin coordinates of an imaging space
+_MICROMETERS_PER_ORIGIN_COORDINATES_UNIT = dict(micrometers=1.0, um=1.0, millimeters=1e3, mm=1e3, meters=1e6, m=1e6)
 
-@docval(
-    {
-        "name": "voxel_mask",
-        "type": "array_data",
-        "default": None,
-        "doc": "voxel mask for 3D ROIs: [(x1, y1, z1, weight1), (x2, y2, z2, weight2), ...]",
-        "shape": (None, 4),
-    },
-    {
-        "name": "image_mask",
-        "type": "array_data",
-        "default": None,
-        "doc": "image with the same size of image where positive values mark this ROI",
-        "shape": [[None] * 3],
-    },
-    {"name": "id", "type": int, "doc": "the ID for the ROI", "default": None},
-    allow_extra=True,
-)
-def add_roi(self, **kwargs):
-    """Add a Region Of Interest (ROI) data to this Segmentation3D.
 
-    Parameters
-    ----------
-    voxel_mask : array_data, optional
-        Voxel mask for 3D ROIs in format [(x1, y1, z1, weight1), (x2, y2, z2, weight2), ...].
-        Each row contains x,y,z coordinates and weight value for a voxel.
-    image_mask : array_data, optional
-        3D image where positive values mark this ROI.
-    id : int, optional
-        The ID for the ROI. If not provided, will be auto-generated.
-    **kwargs : dict
-        Additional keyword arguments passed to add_row.
-
-    Returns
-    -------
-    NWBTable.Row
-        Row object representing the added ROI.
+def _get_plane_imaging_space(volumetric_imaging_space, z_start, z_stop):
+    """Create a PlanarImagingSpace describing the planes [z_start, z_stop) of a VolumetricImagingSpace.
 
-    Raises
-    ------
-    ValueError
-        If neither voxel_mask nor image_mask is provided.
+    The origin coordinates are moved along z to the first plane when the voxel size and the unit of the origin
+    coordinates are known.
     """
-    voxel_mask, image_mask = popargs("voxel_mask", "image_mask", kwargs)
-    if image_mask is None and voxel_mask is None:
-        raise ValueError("Must provide 'image_mask' and/or 'voxel_mask'")
-    rkwargs = dict(kwargs)
-    if image_mask is not None:
-        rkwargs["image_mask"] = image_mask
-    if voxel_mask is not None:
-        rkwargs["voxel_mask"] = voxel_mask
-    return super(Segmentation3D, self).add_row(**rkwargs)
+    if z_stop == z_start + 1:
+        name, planes = f"{volumetric_imaging_space.name}Plane{z_start}", f"Plane {z_start}"
+    else:
+        name, planes = f"{volumetric_imaging_space.name}Planes{z_start}To{z_stop - 1}", f"Planes {z_start}-{z_stop - 1}"
+    voxel_size_in_um = volumetric_imaging_space.voxel_size_in_um
+    origin_coordinates = volumetric_imaging_space.origin_coordinates
+    micrometers_per_unit = _MICROMETERS_PER_ORIGIN_COORDINATES_UNIT.get(
+        volumetric_imaging_space.origin_coordinates__unit
+    )
+    if origin_coordinates is not None and voxel_size_in_um is not None and micrometers_per_unit is not None:
+        origin_coordinates = np.array(origin_coordinates, dtype=np.float64)
+        origin_coordinates[2] += z_start * voxel_size_in_um[2] / micrometers_per_unit
+    return PlanarImagingSpace(
+        name=name,
+        description=f"{planes} of '{volumetric_imaging_space.name}': {volumetric_imaging_space.description}",
+        illumination_pattern=volumetric_imaging_space.illumination_pattern,
+        location=volumetric_imaging_space.location,
+        reference_frame=volumetric_imaging_space.reference_frame,
+        orientation=volumetric_imaging_space.orientation,
+        origin_coordinates=origin_coordinates,
+        origin_coordinates__unit=volumetric_imaging_space.origin_coordinates__unit,
+        pixel_size_in_um=None if voxel_size_in_um is None else voxel_size_in_um[:2],
+    )
 
 
 @staticmethod
@@ -293,22 +356,125 @@ def image_to_voxel(image_mask):
     """
     if len(image_mask.shape) != 3:
         raise ValueError("image_mask must be 3D (depth, height, width)")
-    voxel_mask = []
-    it = np.nditer(image_mask, flags=["multi_index"])
-    while not it.finished:
-        weight = it[0][()]
-        if weight > 0:
-            x = it.multi_index[0]
-            y = it.multi_index[1]
-            z = it.multi_index[2]
-            voxel_mask.append([x, y, z, weight])
-        it.iternext()
-    return voxel_mask
-
-
-Segmentation3D.add_roi = add_roi
+    x_coords, y_coords, z_coords = np.nonzero(image_mask > 0)
+    weights = image_mask[x_coords, y_coords, z_coords]
+    return [list(voxel) for voxel in zip(x_coords.tolist(), y_coords.tolist(), z_coords.tolist(), weights.tolist())]
+
+
+@staticmethod
+def image_masks_to_voxel_mask(image_masks):
+    """Convert one or many 3D image_masks into a concatenated voxel_mask.
+
+    Parameters
+    ----------
+    image_masks : array-like
+        Either a single 3D image mask of shape (height, width, depth) or a stack of image masks of shape
+        (number of ROIs, height, width, depth). Positive values mark the voxels of each ROI.
+
+    Returns
+    -------
+    voxel_mask : numpy.ndarray
+        Structured array with the ``VOXEL_MASK_DTYPE`` compound dtype (fields 'x', 'y', 'z' and 'weight')
+        containing the voxels of all ROIs concatenated in order.
+    voxel_mask_index : numpy.ndarray
+        End offset of each ROI in ``voxel_mask``, following the convention of a VectorIndex.
+
+    Raises
+    ------
+    ValueError
+        If image_masks is neither 3D nor 4D.
+    """
+    image_masks = np.asarray(image_masks)
+    if image_masks.ndim not in (3, 4):
+        raise ValueError("image_masks must be 3D (height, width, depth) or 4D (number of ROIs, height, width, depth)")
+    return _image_masks_to_mask_array(image_masks=image_masks, mask_dtype=VOXEL_MASK_DTYPE)
+
+
+@docval(
+    {"name": "z", "type": int, "doc": "the depth plane, or the first depth plane of the range"},
+    {"name": "z_stop", "type": int, "doc": "the end of the range of depth planes, excluded", "default": None},
+    {"name": "as_segmentation", "type": bool, "doc": "whether to return a Segmentation2D", "default": False},
+    {"name": "name", "type": str, "doc": "name of the returned Segmentation2D", "default": None},
+    {
+        "name": "planar_imaging_space",
+        "type": PlanarImagingSpace,
+        "doc": "the imaging space of the returned Segmentation2D; derived from this segmentation if not provided",
+        "default": None,
+    },
+)
+def get_plane_masks(self, **kwargs):
+    """Get the 2D cross-sections of the ROIs intersecting a depth plane or a range of depth planes.
+
+    The first query builds an index of the voxels of all ROIs sorted by depth, which is reused by later queries
+    until ROIs are added, so each query only reads the voxels of the requested planes.
+
+    Parameters
+    ----------
+    z : int
+        The depth plane, or the first depth plane of the range.
+    z_stop : int, optional
+        The end of the range of depth planes, excluded. Defaults to z + 1, i.e., the single plane z.
+    as_segmentation : bool, default: False
+        Whether to return the cross-sections as a Segmentation2D instead of arrays.
+    name : str, optional
+        Name of the returned Segmentation2D. Defaults to the name of this segmentation followed by the planes.
+    planar_imaging_space : PlanarImagingSpace, optional
+        The imaging space of the returned Segmentation2D. Defaults to a new PlanarImagingSpace describing the
+        planes of the VolumetricImagingSpace of this segmentation.
+
+    Returns
+    -------
+    rois : numpy.ndarray
+        Row indices of the ROIs with voxels in the planes, in increasing order.
+    pixel_mask : numpy.ndarray
+        Structured array with the ``PIXEL_MASK_DTYPE`` compound dtype holding the (x, y) cross-section of each of
+        these ROIs, concatenated in order. Over a range of planes, the cross-sections are projected onto x and y,
+        keeping the largest weight of each pixel.
+    pixel_mask_index : numpy.ndarray
+        End offset of each ROI in ``pixel_mask``.
+    Segmentation2D
+        Instead of the arrays if ``as_segmentation`` is True: a segmentation with one ROI per intersecting ROI,
+        carrying its ID.
+
+    Raises
+    ------
+    ValueError
+        If z_stop is not larger than z.
+    """
+    z_start, z_stop, as_segmentation, name, planar_imaging_space = popargs(
+        "z", "z_stop", "as_segmentation", "name", "planar_imaging_space", kwargs
+    )
+    z_stop = z_start + 1 if z_stop is None else z_stop
+    if z_stop <= z_start:
+        raise ValueError(f"'z_stop' ({z_stop}) must be larger than 'z' ({z_start}).")
+    rois, pixel_mask, pixel_mask_index = _get_roi_plane_index(table=self).get_plane_masks(
+        z_start=z_start, z_stop=z_stop
+    )
+    if not as_segmentation:
+        return rois, pixel_mask, pixel_mask_index
+
+    if planar_imaging_space is None:
+        planar_imaging_space = _get_plane_imaging_space(
+            volumetric_imaging_space=self.volumetric_imaging_space, z_start=z_start, z_stop=z_stop
+        )
+    if name is None:
+        name = f"{self.name}Plane{z_start}" if z_stop == z_start + 1 else f"{self.name}Planes{z_start}To{z_stop - 1}"
+    segmentation_2D = Segmentation2D(
+        name=name,
+        description=f"Cross-sections of the ROIs of '{self.name}' in the depth planes [{z_start}, {z_stop}).",
+        planar_imaging_space=planar_imaging_space,
+    )
+    if len(rois) > 0:
+        segmentation_2D.add_rois(
+            pixel_mask=pixel_mask, pixel_mask_index=pixel_mask_index, id=np.asarray(self.id.data[:])[rois]
+        )
+    return segmentation_2D
+
+
 Segmentation3D.voxel_to_image = voxel_to_image
 Segmentation3D.image_to_voxel = image_to_voxel
+Segmentation3D.image_masks_to_voxel_mask = image_masks_to_voxel_mask
+Segmentation3D.get_plane_masks = get_plane_masks
 
 
 @docval(
@@ -435,3 +601,489 @@ def get_indicator_label(self, **kwargs):
 
 
 EmissionLightPath.get_indicator_label = get_indicator_label
+
+
+# MicroscopySeries API functions
+MicroscopySeries = get_class("MicroscopySeries", extension_name)
+
+
+@docval(
+    {
+        "name": "max_cache_size_in_bytes",
+        "type": int,
+        "doc": "Maximum number of bytes held by the cached blocks of frames.",
+        "default": DEFAULT_CACHE_SIZE_IN_BYTES,
+    },
+    {
+        "name": "frames_per_block",
+        "type": int,
+        "doc": "Number of frames read and cached together. Defaults to the storage chunk length along time.",
+        "default": None,
+    },
+    {
+        "name": "prefetch",
+        "type": bool,
+        "doc": "Whether to read the blocks adjacent to each accessed block on a background thread.",
+        "default": True,
+    },
+)
+def get_cached_frame_reader(self, **kwargs):
+    """Get an opt-in accessor to the frames of this series through an LRU cache of decoded blocks of frames.
+
+    Repeated and nearby frame accesses, e.g., scrubbing through the frames in a viewer, are served from memory
+    instead of reading and decompressing the same storage chunks again.
+
+    Parameters
+    ----------
+    max_cache_size_in_bytes : int, default: 256 MB
+        Maximum number of bytes held by the cached blocks of frames. The least recently used blocks are dropped
+        when the cache is full.
+    frames_per_block : int, optional
+        Number of frames read and cached together. Defaults to the length of the storage chunks along time, or
+        about 1 MB of frames if the data is not chunked.
+    prefetch : bool, default: True
+        Whether to read the blocks before and after each accessed block on a background thread.
+
+    Returns
+    -------
+    CachedFrameReader
+        The accessor, indexable like the data along the frames, e.g., ``reader[10]`` or ``reader[10:20]``, with
+        ``hits`` and ``misses`` counters of the block accesses. Close it, or use it as a context manager, to stop
+        its background thread.
+    """
+    if kwargs["max_cache_size_in_bytes"] < 0:
+        raise ValueError("'max_cache_size_in_bytes' must be non-negative.")
+    if kwargs["frames_per_block"] is not None and kwargs["frames_per_block"] < 1:
+        raise ValueError("'frames_per_block' must be positive.")
+    return CachedFrameReader(data=self.data, **kwargs)
+
+
+MicroscopySeries.get_cached_frame_reader = get_cached_frame_reader
+
+
+VolumetricMicroscopySeries = get_class("VolumetricMicroscopySeries", extension_name)
+PlanarMicroscopySeries = get_class("PlanarMicroscopySeries", extension_name)
+
+
+class _PlaneDataset(HDMFDataset):
+    """A lazy view of one depth plane of the (frames, height, width, depths) data of a VolumetricMicroscopySeries.
+
+    Indexing the view, e.g., ``plane_data[10:20]``, reads only the requested frames of the plane from the data.
+    """
+
+    def __init__(self, dataset, depth):
+        super().__init__(dataset=dataset)
+        self.depth = depth
+
+    @property
+    def shape(self):
+        return tuple(self.dataset.shape[:3])
+
+    @property
+    def ndim(self):
+        return 3
+
+    def __getitem__(self, key):
+        key = key if isinstance(key, tuple) else (key,)
+        if any(index is Ellipsis for index in key):
+            ellipsis_position = next(position for position, index in enumerate(key) if index is Ellipsis)
+            missing_slices = (slice(None),) * (4 - len(key))
+            key = key[:ellipsis_position] + missing_slices + key[ellipsis_position + 1 :]
+        if len(key) > 3:
+            raise IndexError(f"Too many indices for the 3-dimensional data of a plane: {len(key)}.")
+        return self.dataset[key + (slice(None),) * (3 - len(key)) + (self.depth,)]
+
+    def __iter__(self):
+        for frame_index in range(len(self)):
+            yield self[frame_index]
+
+    def __array__(self, dtype=None):
+        return np.asarray(self[:], dtype=dtype)
+
+
+@docval(
+    {"name": "depth", "type": int, "doc": "Index of the depth plane along the last axis of the data."},
+    {
+        "name": "name",
+        "type": str,
+        "doc": "Name of the plane series. Defaults to the name of this series followed by 'Plane<depth>'.",
+        "default": None,
+    },
+)
+def get_plane_series(self, **kwargs):
+    """Get a lazy PlanarMicroscopySeries of one depth plane of this series, without copying its data.
+
+    The data of the plane series reads the requested frames of the depth plane from the data of this series on
+    demand, e.g., sliced from its HDF5 dataset, so it can be used with any tool taking a PlanarMicroscopySeries.
+    Its PlanarImagingSpace is derived from the VolumetricImagingSpace of this series, with the pixel size of the
+    voxels and the origin coordinates moved to the depth of the plane. The timing, devices and light paths are
+    those of this series.
+
+    The plane series is not part of any file; adding it to one writes a copy of the plane.
+
+    Parameters
+    ----------
+    depth : int
+        Index of the depth plane along the last axis of the data. Negative indices count from the last plane.
+    name : str, optional
+        Name of the plane series. Defaults to the name of this series followed by 'Plane<depth>'.
+
+    Returns
+    -------
+    PlanarMicroscopySeries
+        The series of the depth plane, with data of shape (frames, height, width).
+
+    Raises
+    ------
+    ValueError
+        If depth is out of range.
+    """
+    depth, name = popargs("depth", "name", kwargs)
+    data = self.data.data if isinstance(self.data, DataIO) else self.data
+    number_of_depths = data.shape[3]
+    if not -number_of_depths <= depth < number_of_depths:
+        raise ValueError(f"'depth' ({depth}) is out of range for {number_of_depths} depth planes.")
+    depth = depth % number_of_depths
+
+    if self.timestamps is not None:
+        timing = dict(timestamps=self.timestamps)
+    else:
+        timing = dict(starting_time=self.starting_time, rate=self.rate)
+    return PlanarMicroscopySeries(
+        name=name or f"{self.name}Plane{depth}",
+        description=f"Depth plane {depth} of '{self.name}': {self.description}",
+        microscope=self.microscope,
+        excitation_light_path=self.excitation_light_path,
+        emission_light_path=self.emission_light_path,
+        planar_imaging_space=_get_plane_imaging_space(
+            volumetric_imaging_space=self.volumetric_imaging_space, z_start=depth, z_stop=depth + 1
+        ),
+        data=_PlaneDataset(dataset=data, depth=depth),
+        unit=self.unit,
+        conversion=self.conversion,
+        offset=self.offset,
+        **timing,
+    )
+
+
+VolumetricMicroscopySeries.get_plane_series = get_plane_series
+
+
+MultiPlaneMicroscopyContainer = get_class("MultiPlaneMicroscopyContainer", extension_name)
+
+
+class _StackedPlanesDataset(HDMFDataset):
+    """A lazy (frames, height, width, depths) view stacking the data of the planes of a MultiPlaneMicroscopyContainer.
+
+    Indexing the view reads only the requested part of the requested planes, one plane dataset at a time.
+    """
+
+    def __init__(self, plane_datasets):
+        super().__init__(dataset=list(plane_datasets))
+
+    @property
+    def shape(self):
+        return tuple(self.dataset[0].shape) + (len(self.dataset),)
+
+    @property
+    def ndim(self):
+        return 4
+
+    @property
+    def dtype(self):
+        return self.dataset[0].dtype
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, key):
+        key = key if isinstance(key, tuple) else (key,)
+        if any(index is Ellipsis for index in key):
+            ellipsis_position = next(position for position, index in enumerate(key) if index is Ellipsis)
+            missing_slices = (slice(None),) * (5 - len(key))
+            key = key[:ellipsis_position] + missing_slices + key[ellipsis_position + 1 :]
+        if len(key) > 4:
+            raise IndexError(f"Too many indices for the 4-dimensional stacked data: {len(key)}.")
+        key = key + (slice(None),) * (4 - len(key))
+        plane_key, depths = key[:3], np.arange(len(self.dataset))[key[3]]
+        if np.ndim(depths) == 0:
+            return np.asarray(self.dataset[depths][plane_key])
+        return np.stack([np.asarray(self.dataset[depth][plane_key]) for depth in depths], axis=-1)
+
+    def __iter__(self):
+        for frame_index in range(len(self)):
+            yield self[frame_index]
+
+    def __array__(self, dtype=None):
+        return np.asarray(self[:], dtype=dtype)
+
+
+def _get_stacked_planes(container, planes):
+    """Get the PlanarMicroscopySeries of the planes to stack, in depth order, checking that they can be stacked."""
+    if planes is not None:
+        planar_microscopy_series = [container.planar_microscopy_series[plane] for plane in planes]
+    else:
+        planar_microscopy_series = list(container.planar_microscopy_series.values())
+        origin_coordinates = [series.planar_imaging_space.origin_coordinates for series in planar_microscopy_series]
+        if all(coordinates is not None for coordinates in origin_coordinates):
+            depths = [coordinates[2] for coordinates in origin_coordinates]
+            planar_microscopy_series = [planar_microscopy_series[index] for index in np.argsort(depths, kind="stable")]
+
+    plane_datasets = [
+        series.data.data if isinstance(series.data, DataIO) else series.data for series in planar_microscopy_series
+    ]
+    plane_datasets = [data if hasattr(data, "shape") else np.asarray(data) for data in plane_datasets]
+    plane_shapes_and_types = [(tuple(data.shape), str(np.dtype(data.dtype))) for data in plane_datasets]
+    if len(set(plane_shapes_and_types)) > 1:
+        raise ValueError(
+            "The planes must all have the same data shape and type to be stacked, got "
+            f"{dict(zip((series.name for series in planar_microscopy_series), plane_shapes_and_types))}."
+        )
+    return planar_microscopy_series, plane_datasets
+
+
+@docval(
+    {
+        "name": "planes",
+        "type": (list, tuple),
+        "doc": "Names of the PlanarMicroscopySeries to stack, in depth order. Defaults to all, see below.",
+        "default": None,
+    },
+)
+def get_stacked_data(self, **kwargs):
+    """Get a lazy (frames, height, width, depths) view of the planes of this container, without copying their data.
+
+    Reads of the view are dispatched to the data of each PlanarMicroscopySeries, so volumetric tools can index it
+    like the data of a VolumetricMicroscopySeries while only the requested part of each plane is read.
+
+    Parameters
+    ----------
+    planes : list of str, optional
+        Names of the PlanarMicroscopySeries to stack, in depth order. By default, all the series of this container,
+        sorted by the z origin coordinate of their PlanarImagingSpace if all have one, otherwise in the order of
+        the container.
+
+    Returns
+    -------
+    HDMFDataset
+        The stacked view, with ``shape``, ``dtype`` and numpy-style indexing, e.g., ``stacked_data[10:20, ..., 2]``.
+
+    Raises
+    ------
+    ValueError
+        If the planes do not all have the same data shape and type.
+    """
+    _, plane_datasets = _get_stacked_planes(container=self, planes=kwargs["planes"])
+    return _StackedPlanesDataset(plane_datasets=plane_datasets)
+
+
+@docval(
+    {"name": "file_path", "type": str, "doc": "Path to the HDF5 file to write the virtual dataset to."},
+    {"name": "dataset_name", "type": str, "doc": "Path of the virtual dataset in the file.", "default": "data"},
+    {
+        "name": "planes",
+        "type": (list, tuple),
+        "doc": "Names of the PlanarMicroscopySeries to stack, in depth order. Defaults to all, see get_stacked_data.",
+        "default": None,
+    },
+)
+def write_virtual_stacked_dataset(self, **kwargs):
+    """Write an HDF5 virtual dataset presenting the planes of this container as a (frames, height, width, depths) array.
+
+    The virtual dataset maps each depth to the dataset of a PlanarMicroscopySeries read from an HDF5 file, so no
+    imaging data is copied; any HDF5 reader, e.g., ``h5py``, reads through it from the NWB file. The source file is
+    referenced relative to the directory of file_path, so keep both files together when moving them.
+
+    Parameters
+    ----------
+    file_path : str
+        Path to the HDF5 file to write the virtual dataset to, created if it does not exist. This should not be the
+        NWB file itself, to keep that file valid against its schema.
+    dataset_name : str, default: "data"
+        Path of the virtual dataset in the file.
+    planes : list of str, optional
+        Names of the PlanarMicroscopySeries to stack, in depth order. Defaults to all, see ``get_stacked_data``.
+
+    Returns
+    -------
+    str
+        The path of the virtual dataset in the file.
+
+    Raises
+    ------
+    ValueError
+        If the planes are not HDF5 datasets read from a file, or do not all have the same data shape and type.
+    """
+    file_path, dataset_name, planes = popargs("file_path", "dataset_name", "planes", kwargs)
+    planar_microscopy_series, plane_datasets = _get_stacked_planes(container=self, planes=planes)
+    if not all(isinstance(data, h5py.Dataset) for data in plane_datasets):
+        raise ValueError("The data of every plane must be an HDF5 dataset read from a file to write a virtual dataset.")
+
+    stacked_shape = tuple(plane_datasets[0].shape) + (len(plane_datasets),)
+    layout = h5py.VirtualLayout(shape=stacked_shape, dtype=plane_datasets[0].dtype)
+    virtual_file_directory = os.path.dirname(os.path.abspath(file_path))
+    for depth, data in enumerate(plane_datasets):
+        source_file_path = os.path.relpath(os.path.abspath(data.file.filename), start=virtual_file_directory)
+        layout[..., depth] = h5py.VirtualSource(
+            source_file_path, name=data.name, shape=tuple(data.shape), dtype=data.dtype
+        )
+    with h5py.File(file_path, mode="a") as file:
+        file.create_virtual_dataset(dataset_name, layout)
+        file[dataset_name].attrs["planes"] = [series.name for series in planar_microscopy_series]
+    return dataset_name
+
+
+MultiPlaneMicroscopyContainer.get_stacked_data = get_stacked_data
+MultiPlaneMicroscopyContainer.write_virtual_stacked_dataset = write_virtual_stacked_dataset
+
+
+MicroscopyResponseSeries = get_class("MicroscopyResponseSeries", extension_name)
+MicroscopyResponseSeriesContainer = get_class("MicroscopyResponseSeriesContainer", extension_name)
+
+
+def get_frame_time_index(self):
+    """Get the time index of the frames of this series, built on first use and cached.
+
+    Returns
+    -------
+    FrameTimeIndex
+        The index, looking up the frames of this series arithmetically from its ``starting_time`` and ``rate``, or
+        by binary search of its ``timestamps``, read once.
+    """
+    number_of_frames = self.num_samples
+    if number_of_frames is None:
+        raise ValueError(f"The number of frames of '{self.name}' is unknown, so its frames cannot be indexed by time.")
+    frame_time_index = getattr(self, "_frame_time_index", None)
+    if frame_time_index is None or frame_time_index.number_of_frames != number_of_frames:
+        frame_time_index = FrameTimeIndex(
+            number_of_frames=number_of_frames,
+            timestamps=self.timestamps,
+            starting_time=self.starting_time,
+            rate=self.rate,
+        )
+        self._frame_time_index = frame_time_index
+    return frame_time_index
+
+
+@docval(
+    {"name": "times", "type": "array_data", "doc": "Times, in seconds, to look up the frames of."},
+    {
+        "name": "method",
+        "type": str,
+        "doc": "'nearest' for the frame closest in time, 'floor' for the last frame at or before each time.",
+        "default": "nearest",
+    },
+)
+def get_frame_indices(self, **kwargs):
+    """Get the index of the frame of this series at each of many times at once, using the cached time index.
+
+    Parameters
+    ----------
+    times : array_like of float
+        Times, in seconds, in the same time base as the series, e.g., the times of behavioral events.
+    method : str, default: "nearest"
+        - "nearest": the frame closest in time, clipped to the frames of the series; ties go to the earlier frame.
+        - "floor": the last frame at or before each time; -1 for times before the first frame.
+
+    Returns
+    -------
+    numpy.ndarray
+        The frame indices, as int64, with the shape of times.
+    """
+    return self.get_frame_time_index().get_frame_indices(times=kwargs["times"], method=kwargs["method"])
+
+
+@docval(
+    {"name": "start_times", "type": "array_data", "doc": "Start time of each window, in seconds."},
+    {"name": "stop_times", "type": "array_data", "doc": "Stop time of each window, in seconds, excluded."},
+)
+def get_frame_windows(self, **kwargs):
+    """Get the range of frames of this series within each of many time windows at once, using the cached time index.
+
+    Parameters
+    ----------
+    start_times : array_like of float
+        Start time of each window, in seconds.
+    stop_times : array_like of float
+        Stop time of each window, in seconds, excluded from the window.
+
+    Returns
+    -------
+    start_frame_indices, stop_frame_indices : numpy.ndarray
+        The frames of each window are ``range(start, stop)``, empty if no frame is within the window.
+    """
+    return self.get_frame_time_index().get_frame_windows(
+        start_times=kwargs["start_times"], stop_times=kwargs["stop_times"]
+    )
+
+
+for series_type in (MicroscopySeries, MicroscopyResponseSeries):
+    series_type.get_frame_time_index = get_frame_time_index
+    series_type.get_frame_indices = get_frame_indices
+    series_type.get_frame_windows = get_frame_windows
+
+
+@docval(
+    {"name": "times", "type": "array_data", "doc": "Times, in seconds, to look up the frames of."},
+    {
+        "name": "method",
+        "type": str,
+        "doc": "'nearest' for the frame closest in time, 'floor' for the last frame at or before each time.",
+        "default": "nearest",
+    },
+)
+def get_series_frame_indices(self, **kwargs):
+    """Get the index of the frame of each series of this container at each of many times, in one call.
+
+    Each series is looked up with its own cached time index, so each plane or response series keeps its own
+    time offset.
+
+    Parameters
+    ----------
+    times : array_like of float
+        Times, in seconds, e.g., the times of behavioral events.
+    method : str, default: "nearest"
+        "nearest" or "floor", see ``MicroscopySeries.get_frame_indices``.
+
+    Returns
+    -------
+    dict
+        The frame indices of each series, keyed by the name of the series.
+    """
+    times = np.asarray(kwargs["times"], dtype=np.float64)
+    return {
+        name: series.get_frame_indices(times=times, method=kwargs["method"])
+        for name, series in getattr(self, self.__clsconf__[0]["attr"]).items()
+    }
+
+
+@docval(
+    {"name": "start_times", "type": "array_data", "doc": "Start time of each window, in seconds."},
+    {"name": "stop_times", "type": "array_data", "doc": "Stop time of each window, in seconds, excluded."},
+)
+def get_series_frame_windows(self, **kwargs):
+    """Get the range of frames of each series of this container within each of many time windows, in one call.
+
+    Parameters
+    ----------
+    start_times : array_like of float
+        Start time of each window, in seconds.
+    stop_times : array_like of float
+        Stop time of each window, in seconds, excluded from the window.
+
+    Returns
+    -------
+    dict
+        The (start_frame_indices, stop_frame_indices) of each series, keyed by the name of the series.
+    """
+    start_times = np.asarray(kwargs["start_times"], dtype=np.float64)
+    stop_times = np.asarray(kwargs["stop_times"], dtype=np.float64)
+    return {
+        name: series.get_frame_windows(start_times=start_times, stop_times=stop_times)
+        for name, series in getattr(self, self.__clsconf__[0]["attr"]).items()
+    }
+
+
+for container_type in (MultiPlaneMicroscopyContainer, MicroscopyResponseSeriesContainer):
+    container_type.get_frame_indices = get_series_frame_indices
+    container_type.get_frame_windows = get_series_frame_windows
@@ -0,0 +1,430 @@
+"""Multi-resolution pyramids of planar microscopy series."""
+
+import itertools
+import re
+import tempfile
+from collections import deque
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from hdmf.backends.hdf5 import H5DataIO
+
+import ndx_microscopy
+from ndx_microscopy.streaming import (
+    DEFAULT_STORAGE_CHUNK_SIZE_IN_BYTES,
+    _get_frames_per_chunk,
+    _get_frames_per_storage_chunk,
+    stream_microscopy_frames,
+)
+
+DEFAULT_DOWNSAMPLING_FACTORS = (2, 4, 8)
+
+
+def _get_downsampled_shape(frame_shape, factor):
+    return tuple(-(-length // factor) for length in frame_shape)
+
+
+def _sum_blocks(image, factor):
+    """Sum the pixels of an image in factor x factor blocks, padding its edges with zeros to whole blocks."""
+    height, width = _get_downsampled_shape(frame_shape=image.shape, factor=factor)
+    if image.shape != (height * factor, width * factor):
+        padded_image = np.zeros((height * factor, width * factor), dtype=image.dtype)
+        padded_image[: image.shape[0], : image.shape[1]] = image
+        image = padded_image
+    row_sums = image.reshape(height, factor, width * factor).sum(axis=1, dtype=np.float64)
+    return row_sums.reshape(height, width, factor).sum(axis=2)
+
+
+def _downsample_frame(frame, downsampling_factors):
+    """Average the pixels of a frame in factor x factor blocks for each factor.
+
+    The block sums of each factor are computed from those of the largest smaller factor dividing it, e.g., 8 from
+    4 from 2, so the frame is only summed once at full resolution. Blocks at the edges average the pixels they have.
+    """
+    block_sums = {1: frame}
+    for factor in sorted(set(downsampling_factors) - {1}):
+        base_factor = max(smaller_factor for smaller_factor in block_sums if factor % smaller_factor == 0)
+        block_sums[factor] = _sum_blocks(image=block_sums[base_factor], factor=factor // base_factor)
+
+    downsampled_frames = list()
+    for factor in downsampling_factors:
+        if factor == 1:
+            downsampled_frames.append(frame)
+            continue
+        block_sizes = [np.minimum(factor, length - np.arange(0, length, factor)) for length in frame.shape]
+        downsampled_frame = block_sums[factor] / np.outer(*block_sizes)
+        if np.issubdtype(frame.dtype, np.integer):
+            downsampled_frame = np.round(downsampled_frame)
+        downsampled_frames.append(downsampled_frame.astype(frame.dtype))
+    return downsampled_frames
+
+
+class _FrameSpool:
+    """A first-in first-out queue of frames that spills the frames beyond max_frames_in_memory to a temporary file.
+
+    Frames are only kept in memory while no frame is waiting in the file, so the frames in memory are always the
+    oldest ones. The file is emptied whenever all its frames have been read, and deleted when the spool is closed.
+    """
+
+    def __init__(self, max_frames_in_memory):
+        self.max_frames_in_memory = max_frames_in_memory
+        self.number_of_spilled_frames = 0
+        self._frames = deque()
+        self._file = None
+        self._frame_shape, self._dtype, self._frame_size_in_bytes = None, None, None
+        self._read_position, self._write_position = 0, 0
+
+    @property
+    def number_of_frames_in_memory(self):
+        return len(self._frames)
+
+    @property
+    def _number_of_frames_in_file(self):
+        if self._file is None:
+            return 0
+        return (self._write_position - self._read_position) // self._frame_size_in_bytes
+
+    def __len__(self):
+        return len(self._frames) + self._number_of_frames_in_file
+
+    def append(self, frame):
+        if self._number_of_frames_in_file == 0 and len(self._frames) < self.max_frames_in_memory:
+            self._frames.append(frame)
+            return
+        if self._file is None:
+            self._file = tempfile.TemporaryFile()
+            self._frame_shape, self._dtype, self._frame_size_in_bytes = frame.shape, frame.dtype, frame.nbytes
+        self._file.seek(self._write_position)
+        self._file.write(np.ascontiguousarray(frame).tobytes())
+        self._write_position += self._frame_size_in_bytes
+        self.number_of_spilled_frames += 1
+
+    def popleft(self):
+        if self._frames:
+            return self._frames.popleft()
+        self._file.seek(self._read_position)
+        frame_bytes = self._file.read(self._frame_size_in_bytes)
+        self._read_position += self._frame_size_in_bytes
+        if self._read_position == self._write_position:
+            self._file.seek(0)
+            self._file.truncate()
+            self._read_position, self._write_position = 0, 0
+        return np.frombuffer(frame_bytes, dtype=self._dtype).reshape(self._frame_shape)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class _PyramidFrames:
+    """Downsample each frame of an iterator once for all levels, queueing the frames of each level until consumed.
+
+    The levels share a single pass over the frames, in whatever order their datasets are written. When hdmf writes
+    one chunk of each level at a time, with ``io.write(nwbfile, exhaust_dci=False)``, each queue holds about one
+    chunk of frames. When it writes the levels one after the other, as by default, the frames of the levels still
+    waiting beyond ``max_frames_in_memory`` are spilled to a temporary file rather than held in memory.
+    """
+
+    def __init__(self, frames, downsampling_factors, include_full_resolution, max_frames_in_memory):
+        self._frames = iter(frames)
+        self._downsampling_factors = list(downsampling_factors)
+        if include_full_resolution:
+            self._downsampling_factors.insert(0, 1)
+        self._queues = [_FrameSpool(max_frames_in_memory=max_frames_in_memory) for _ in self._downsampling_factors]
+        self.max_queue_length = 0
+
+    @property
+    def number_of_spilled_frames(self):
+        return sum(queue.number_of_spilled_frames for queue in self._queues)
+
+    def _read_next_frame(self):
+        frame = next(self._frames, None)
+        if frame is None:
+            return False
+        frame = np.asarray(frame)
+        downsampled_frames = _downsample_frame(frame=frame, downsampling_factors=self._downsampling_factors)
+        for queue, downsampled_frame in zip(self._queues, downsampled_frames):
+            queue.append(downsampled_frame)
+        self.max_queue_length = max(
+            self.max_queue_length, max(queue.number_of_frames_in_memory for queue in self._queues)
+        )
+        return True
+
+    def iter_level(self, level):
+        queue = self._queues[level]
+        try:
+            while len(queue) > 0 or self._read_next_frame():
+                yield queue.popleft()
+        finally:
+            queue.close()
+
+
+def _iter_frames(data, frames_per_chunk):
+    """Iterate over the frames of an array or dataset, reading them in blocks of frames."""
+    for start in range(0, data.shape[0], frames_per_chunk):
+        yield from np.asarray(data[start : start + frames_per_chunk])
+
+
+def stream_microscopy_pyramid(
+    frames: Iterable[np.ndarray],
+    *,
+    downsampling_factors: Sequence[int] = DEFAULT_DOWNSAMPLING_FACTORS,
+    number_of_frames: Optional[int] = None,
+    frames_per_chunk: Optional[int] = None,
+    chunk_size_in_bytes: int = DEFAULT_STORAGE_CHUNK_SIZE_IN_BYTES,
+    compression: Optional[str] = "gzip",
+    compression_opts: Optional[int] = 4,
+) -> List[H5DataIO]:
+    """Wrap an iterator of frames so that they are written at full resolution and at each downsampled level.
+
+    Like ``stream_microscopy_frames``, but each frame is also averaged in 2x2, 4x4, ... blocks of pixels as it
+    arrives, so that all the levels of the pyramid are written in a single pass over the frames. Pass the first
+    result as the ``data`` of a ``PlanarMicroscopySeries`` and the others as the ``level_data`` of
+    ``create_pyramid_microscopy_series``.
+
+    All the results must be written to the same file in the same call, in any order. At most two chunks of frames
+    of each level wait in memory for their dataset to be written; the frames beyond are spilled to a temporary
+    file. The default ``io.write(nwbfile)`` writes the datasets one after the other, so the downsampled levels,
+    about a third of the size of the full resolution data for the default factors, go through a temporary file.
+    ``io.write(nwbfile, exhaust_dci=False)`` writes one chunk of each level at a time instead, which keeps all the
+    frames in memory.
+
+    Parameters
+    ----------
+    frames : iterable of numpy.ndarray
+        Frames of shape (height, width), all of the same shape and data type.
+    downsampling_factors : sequence of int, default: (2, 4, 8)
+        The downsampling factor of each level.
+    number_of_frames : int, optional
+        The number of frames, if known in advance. By default, the time axis of the datasets is unlimited.
+    frames_per_chunk : int, optional
+        Number of frames per storage chunk of every level, so that the levels are read and written in step.
+        Defaults to as many full resolution frames as fit in ``chunk_size_in_bytes``.
+    chunk_size_in_bytes : int, default: 1 MB
+        Target size of each full resolution storage chunk when ``frames_per_chunk`` is not given.
+    compression : str, default: "gzip"
+        HDF5 compression filter of the datasets; None to disable compression.
+    compression_opts : int, default: 4
+        Options of the compression filter, e.g., the gzip level.
+
+    Returns
+    -------
+    list of H5DataIO
+        The wrapped frames at full resolution, followed by the wrapped frames of each level.
+
+    Raises
+    ------
+    ValueError
+        If frames is empty or a downsampling factor is less than 2.
+    """
+    _check_downsampling_factors(downsampling_factors=downsampling_factors)
+    frames = iter(frames)
+    first_frame = next(frames, None)
+    if first_frame is None:
+        raise ValueError("'frames' must contain at least one frame.")
+    first_frame = np.asarray(first_frame)
+    if frames_per_chunk is None:
+        frames_per_chunk = _get_frames_per_storage_chunk(
+            frame_shape=first_frame.shape, dtype=first_frame.dtype, chunk_size_in_bytes=chunk_size_in_bytes
+        )
+
+    pyramid_frames = _PyramidFrames(
+        frames=itertools.chain([first_frame], frames),
+        downsampling_factors=downsampling_factors,
+        include_full_resolution=True,
+        max_frames_in_memory=2 * frames_per_chunk,
+    )
+    return [
+        stream_microscopy_frames(
+            pyramid_frames.iter_level(level=level),
+            number_of_frames=number_of_frames,
+            frame_shape=_get_downsampled_shape(frame_shape=first_frame.shape, factor=factor),
+            dtype=first_frame.dtype,
+            frames_per_chunk=frames_per_chunk,
+            compression=compression,
+            compression_opts=compression_opts,
+        )
+        for level, factor in enumerate([1] + list(downsampling_factors))
+    ]
+
+
+def _check_downsampling_factors(downsampling_factors):
+    if len(downsampling_factors) == 0 or any(factor < 2 for factor in downsampling_factors):
+        raise ValueError(f"'downsampling_factors' must be integers of at least 2, got {list(downsampling_factors)}.")
+
+
+def _get_downsampled_imaging_space(planar_imaging_space, factor):
+    """Create a PlanarImagingSpace of the same region as planar_imaging_space with pixels factor times larger."""
+    pixel_size_in_um = planar_imaging_space.pixel_size_in_um
+    return ndx_microscopy.PlanarImagingSpace(
+        name=f"{planar_imaging_space.name}Downsampled{factor}",
+        description=f"'{planar_imaging_space.name}' downsampled by {factor}: {planar_imaging_space.description}",
+        illumination_pattern=planar_imaging_space.illumination_pattern,
+        location=planar_imaging_space.location,
+        reference_frame=planar_imaging_space.reference_frame,
+        orientation=planar_imaging_space.orientation,
+        origin_coordinates=planar_imaging_space.origin_coordinates,
+        origin_coordinates__unit=planar_imaging_space.origin_coordinates__unit,
+        pixel_size_in_um=None if pixel_size_in_um is None else np.asarray(pixel_size_in_um, dtype=np.float64) * factor,
+    )
+
+
+def create_pyramid_microscopy_series(
+    *,
+    planar_microscopy_series: ndx_microscopy.PlanarMicroscopySeries,
+    downsampling_factors: Sequence[int] = DEFAULT_DOWNSAMPLING_FACTORS,
+    level_data: Optional[Sequence[H5DataIO]] = None,
+    frames_per_chunk: Optional[int] = None,
+    compression: Optional[str] = "gzip",
+    compression_opts: Optional[int] = 4,
+) -> List[ndx_microscopy.PlanarMicroscopySeries]:
+    """Create the spatially downsampled levels of a PlanarMicroscopySeries, to be added alongside it.
+
+    Each level is a ``PlanarMicroscopySeries`` named after the series and its downsampling factor, e.g.,
+    "PlanarMicroscopySeriesDownsampled4", with the same timing, devices and light paths, and a copy of the
+    ``PlanarImagingSpace`` of the series with a ``pixel_size_in_um`` scaled by the factor. Each pixel of a level
+    is the mean of a block of factor x factor pixels of the series.
+
+    Parameters
+    ----------
+    planar_microscopy_series : PlanarMicroscopySeries
+        The full resolution series.
+    downsampling_factors : sequence of int, default: (2, 4, 8)
+        The downsampling factor of each level.
+    level_data : sequence of H5DataIO, optional
+        The data of each level, from ``stream_microscopy_pyramid`` when the series is itself being streamed. By
+        default, the data of the series is read once, in blocks of frames, when the file is written, and every
+        level is computed from that single pass; the frames of the levels waiting to be written are spilled to a
+        temporary file, see ``stream_microscopy_pyramid``.
+    frames_per_chunk : int, optional
+        Number of frames per storage chunk of every level. Defaults to the number of frames of a 1 MB storage
+        chunk of the series. Ignored if level_data is given.
+    compression : str, default: "gzip"
+        HDF5 compression filter of the levels; None to disable compression. Ignored if level_data is given.
+    compression_opts : int, default: 4
+        Options of the compression filter, e.g., the gzip level. Ignored if level_data is given.
+
+    Returns
+    -------
+    list of PlanarMicroscopySeries
+        The levels, in the order of downsampling_factors. Add all of them to the same NWB file as the series, e.g.,
+        with ``nwbfile.add_acquisition``, so that ``select_pyramid_level`` finds them.
+
+    Raises
+    ------
+    ValueError
+        If a downsampling factor is less than 2, or level_data does not have one entry per factor.
+    """
+    _check_downsampling_factors(downsampling_factors=downsampling_factors)
+    if level_data is None:
+        data = planar_microscopy_series.data
+        if not hasattr(data, "shape"):
+            data = np.asarray(data)
+        if frames_per_chunk is None:
+            frames_per_chunk = _get_frames_per_storage_chunk(frame_shape=data.shape[1:], dtype=data.dtype)
+        pyramid_frames = _PyramidFrames(
+            frames=_iter_frames(data=data, frames_per_chunk=_get_frames_per_chunk(data=data)),
+            downsampling_factors=downsampling_factors,
+            include_full_resolution=False,
+            max_frames_in_memory=2 * frames_per_chunk,
+        )
+        level_data = [
+            stream_microscopy_frames(
+                pyramid_frames.iter_level(level=level),
+                number_of_frames=data.shape[0],
+                frame_shape=_get_downsampled_shape(frame_shape=data.shape[1:], factor=factor),
+                dtype=data.dtype,
+                frames_per_chunk=frames_per_chunk,
+                compression=compression,
+                compression_opts=compression_opts,
+            )
+            for level, factor in enumerate(downsampling_factors)
+        ]
+    elif len(level_data) != len(downsampling_factors):
+        raise ValueError(
+            f"'level_data' must have one entry per downsampling factor ({len(downsampling_factors)}), "
+            f"got {len(level_data)}."
+        )
+
+    source = planar_microscopy_series
+    if source.timestamps is not None:
+        timing = dict(timestamps=np.asarray(source.timestamps[:]))
+    else:
+        timing = dict(starting_time=source.starting_time, rate=source.rate)
+    return [
+        ndx_microscopy.PlanarMicroscopySeries(
+            name=f"{source.name}Downsampled{factor}",
+            description=f"'{source.name}' downsampled by {factor} in each spatial dimension: {source.description}",
+            microscope=source.microscope,
+            excitation_light_path=source.excitation_light_path,
+            emission_light_path=source.emission_light_path,
+            planar_imaging_space=_get_downsampled_imaging_space(
+                planar_imaging_space=source.planar_imaging_space, factor=factor
+            ),
+            data=level,
+            unit=source.unit,
+            conversion=source.conversion,
+            offset=source.offset,
+            **timing,
+        )
+        for factor, level in zip(downsampling_factors, level_data)
+    ]
+
+
+def get_pyramid_levels(
+    planar_microscopy_series: ndx_microscopy.PlanarMicroscopySeries,
+) -> List[Tuple[int, ndx_microscopy.PlanarMicroscopySeries]]:
+    """Find the downsampled levels stored alongside a PlanarMicroscopySeries.
+
+    Parameters
+    ----------
+    planar_microscopy_series : PlanarMicroscopySeries
+        The full resolution series, e.g., read from an NWB file.
+
+    Returns
+    -------
+    list of (int, PlanarMicroscopySeries)
+        The downsampling factor and series of each level in the same container as the series, from the finest to
+        the coarsest, starting with (1, planar_microscopy_series).
+    """
+    pyramid_levels = [(1, planar_microscopy_series)]
+    parent = planar_microscopy_series.parent
+    if parent is not None:
+        level_name_pattern = re.compile(rf"^{re.escape(planar_microscopy_series.name)}Downsampled(\d+)$")
+        for child in parent.children:
+            match = level_name_pattern.match(child.name)
+            if match is not None and isinstance(child, ndx_microscopy.PlanarMicroscopySeries):
+                pyramid_levels.append((int(match.group(1)), child))
+    return sorted(pyramid_levels, key=lambda pyramid_level: pyramid_level[0])
+
+
+def select_pyramid_level(
+    planar_microscopy_series: ndx_microscopy.PlanarMicroscopySeries,
+    screen_shape: Tuple[int, int],
+    region_shape: Optional[Tuple[int, int]] = None,
+) -> Tuple[int, ndx_microscopy.PlanarMicroscopySeries]:
+    """Select the coarsest pyramid level that still shows a region with at least the requested on-screen resolution.
+
+    Parameters
+    ----------
+    planar_microscopy_series : PlanarMicroscopySeries
+        The full resolution series, with the levels found by ``get_pyramid_levels``.
+    screen_shape : tuple of int
+        The (height, width) in screen pixels at which the region is displayed.
+    region_shape : tuple of int, optional
+        The (height, width) of the displayed region in full resolution pixels. Defaults to the whole frame.
+
+    Returns
+    -------
+    (int, PlanarMicroscopySeries)
+        The downsampling factor and series of the selected level; full resolution coordinates are divided by the
+        factor to index the level. The full resolution series if no level has enough pixels.
+    """
+    region_shape = region_shape or tuple(planar_microscopy_series.data.shape[1:3])
+    selected_level = (1, planar_microscopy_series)
+    for factor, level_series in get_pyramid_levels(planar_microscopy_series=planar_microscopy_series):
+        level_region_shape = _get_downsampled_shape(frame_shape=region_shape, factor=factor)
+        if all(length >= screen_length for length, screen_length in zip(level_region_shape, screen_shape)):
+            selected_level = (factor, level_series)
+    return selected_level
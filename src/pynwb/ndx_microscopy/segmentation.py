@@ -0,0 +1,1575 @@
+"""Shared implementation of the ROI masks of Segmentation2D and Segmentation3D.
+
+The helpers operate on the concatenated structured mask arrays of a segmentation and its index, whatever the
+number of spatial dimensions, and ``_add_segmentation_methods`` binds the ROI methods built from them to each
+segmentation class, for its 'pixel_mask' or 'voxel_mask' column.
+"""
+
+import numpy as np
+import scipy.sparse as sps
+from hdmf.common.table import VectorIndex
+from hdmf.utils import docval, popargs
+
+# NumPy equivalents of the compound dtypes of the 'pixel_mask' and 'voxel_mask' columns in the spec
+PIXEL_MASK_DTYPE = np.dtype([("x", np.uint32), ("y", np.uint32), ("weight", np.float32)])
+VOXEL_MASK_DTYPE = np.dtype([("x", np.uint32), ("y", np.uint32), ("z", np.uint32), ("weight", np.float32)])
+
+
+def _image_masks_to_mask_array(image_masks, mask_dtype):
+    """Convert a stack of image masks into a concatenated structured mask array and its end offsets.
+
+    The elements of each ROI are ordered as a C-order scan of its image mask, i.e., the same order
+    returned by ``image_to_pixel`` and ``image_to_voxel``.
+    """
+    number_of_spatial_dims = len(mask_dtype.names) - 1
+    image_masks = np.asarray(image_masks)
+    if image_masks.ndim == number_of_spatial_dims:
+        image_masks = image_masks[np.newaxis]
+
+    positions = np.nonzero(image_masks > 0)
+    roi_indices, coordinates = positions[0], positions[1:]
+
+    mask_array = np.empty(len(roi_indices), dtype=mask_dtype)
+    for field_name, field_values in zip(mask_dtype.names[:-1], coordinates):
+        mask_array[field_name] = field_values
+    mask_array["weight"] = image_masks[positions]
+
+    mask_index = np.cumsum(np.bincount(roi_indices, minlength=image_masks.shape[0]))
+    return mask_array, mask_index
+
+
+def _as_mask_array(mask, mask_dtype):
+    """Cast a structured mask array or a numeric (N, number of fields) mask array to the compound mask dtype."""
+    mask = np.asarray(mask)
+    if mask.dtype.names is not None:
+        return mask.astype(mask_dtype, copy=False)
+
+    number_of_fields = len(mask_dtype.names)
+    mask = mask.reshape(-1, number_of_fields)
+    mask_array = np.empty(mask.shape[0], dtype=mask_dtype)
+    for field_index, field_name in enumerate(mask_dtype.names):
+        mask_array[field_name] = mask[:, field_index]
+    return mask_array
+
+
+def _extend_data(container, values):
+    """Append values along the first axis of the data of a VectorData, VectorIndex or ElementIdentifiers."""
+    if isinstance(container.data, list):
+        # Keep the element types produced by add_row: scalars or tuples for 1D values, arrays for image masks
+        container.data.extend(values.tolist() if values.ndim == 1 else list(values))
+    elif isinstance(container.data, np.ndarray) and container.data.ndim == 1:
+        # hdmf's extend_data stacks numpy arrays vertically, which would add a new axis to 1D data
+        container.transform(lambda data: np.concatenate((data, values)))
+    else:
+        container.extend(values)
+
+
+def _select_rois(mask_array, mask_index, rois):
+    """Gather the elements of a subset of ROIs from a concatenated structured mask array and its end offsets."""
+    mask_index = np.asarray(mask_index, dtype=np.int64)
+    rois = np.asarray(rois, dtype=np.int64)
+    starts = np.concatenate(([0], mask_index[:-1]))[rois]
+    counts = mask_index[rois] - starts
+    new_mask_index = np.cumsum(counts)
+    element_indices = np.repeat(starts - new_mask_index + counts, counts) + np.arange(new_mask_index[-1:].sum())
+    return mask_array[element_indices], new_mask_index
+
+
+def _rasterize_masks(mask_array, mask_index, image_shape=None, dtype=np.float32, out=None, labels=None):
+    """Render the concatenated structured masks of many ROIs into an array.
+
+    Without labels, ROI i is written to out[i] with its weights, or with weight > 0 if out is boolean. With
+    labels, all ROIs are written to the single image out as their label; where ROIs overlap, the pixel takes
+    the label of the ROI with the largest weight there. If out is not given, it is allocated with image_shape
+    and dtype; otherwise it is cleared and filled in place.
+    """
+    mask_index = np.asarray(mask_index, dtype=np.int64)
+    number_of_rois = len(mask_index)
+    if out is None:
+        shape = tuple(image_shape) if labels is not None else (number_of_rois,) + tuple(image_shape)
+        out = np.zeros(shape, dtype=dtype)
+    else:
+        out[...] = 0
+
+    roi_indices = np.repeat(np.arange(number_of_rois), np.diff(np.concatenate(([0], mask_index))))
+    coordinates = tuple(mask_array[field_name].astype(np.intp) for field_name in mask_array.dtype.names[:-1])
+    weights = mask_array["weight"]
+    if labels is None:
+        out[(roi_indices,) + coordinates] = weights > 0 if out.dtype == bool else weights
+        return out
+
+    is_positive = weights > 0
+    roi_indices, weights = roi_indices[is_positive], weights[is_positive]
+    coordinates = tuple(coordinate[is_positive] for coordinate in coordinates)
+    if roi_indices.size == 0:
+        return out
+    # Sort by pixel, then by weight, so that the last element of each pixel belongs to the ROI with the largest weight
+    linear_indices = np.ravel_multi_index(coordinates, dims=out.shape)
+    order = np.lexsort((weights, linear_indices))
+    is_last = np.append(linear_indices[order][1:] != linear_indices[order][:-1], True)
+    winners = order[is_last]
+    out[tuple(coordinate[winners] for coordinate in coordinates)] = np.asarray(labels)[roi_indices[winners]]
+    return out
+
+
+def _label_image_to_mask_array(label_image, mask_dtype, background):
+    """Convert an integer label image into the concatenated structured masks of its labels, with unit weights.
+
+    A single sort of the labelled pixels groups them by label, so the conversion is O(N log N) in the number of
+    labelled pixels, independently of the number of labels. Returns the mask array, its end offsets and the
+    sorted unique labels.
+    """
+    label_image = np.asarray(label_image)
+    if not (np.issubdtype(label_image.dtype, np.integer) or label_image.dtype == bool):
+        raise ValueError(f"'label_image' must have an integer data type, got {label_image.dtype}.")
+    flat_label_image = label_image.ravel()
+    linear_indices = np.flatnonzero(flat_label_image != background)
+    pixel_labels = flat_label_image[linear_indices]
+    order = np.argsort(pixel_labels, kind="stable")
+    pixel_labels, linear_indices = pixel_labels[order], linear_indices[order]
+
+    is_first = np.ones(len(pixel_labels), dtype=bool)
+    is_first[1:] = pixel_labels[1:] != pixel_labels[:-1]
+    labels = pixel_labels[is_first]
+    mask_index = np.append(np.flatnonzero(is_first)[1:], len(pixel_labels)) if len(labels) else np.empty(0, np.int64)
+
+    mask_array = np.empty(len(linear_indices), dtype=mask_dtype)
+    coordinates = np.unravel_index(linear_indices, label_image.shape)
+    for field_name, field_values in zip(mask_dtype.names[:-1], coordinates):
+        mask_array[field_name] = field_values
+    mask_array["weight"] = 1.0
+    return mask_array, mask_index, labels
+
+
+def _rasterize_rois(table, mask_name, mask_dtype, rois, out, image_shape, dtype, label_image, labels, mask_type):
+    """Rasterize the masks of the selected ROIs of a segmentation, validating the requested output."""
+    mask_array, mask_index = _read_masks(table=table, mask_name=mask_name, mask_dtype=mask_dtype, mask_type=mask_type)
+    rois = np.arange(len(mask_index)) if rois is None else np.asarray(rois, dtype=np.int64)
+    mask_array, mask_index = _select_rois(mask_array=mask_array, mask_index=mask_index, rois=rois)
+
+    number_of_spatial_dims = len(mask_dtype.names) - 1
+    if image_shape is None:
+        if out is not None:
+            image_shape = out.shape[-number_of_spatial_dims:]
+        else:
+            image_shape = _get_image_shape(
+                table=table, number_of_spatial_dims=number_of_spatial_dims, mask_array=mask_array
+            )
+    image_shape = tuple(image_shape)
+
+    if label_image:
+        labels = rois + 1 if labels is None else np.asarray(labels)
+        if len(labels) != len(rois):
+            raise ValueError(f"'labels' must have one entry per ROI ({len(rois)}), got {len(labels)}.")
+        if out is not None:
+            dtype = out.dtype
+        elif dtype is None:
+            dtype = np.uint16 if len(labels) == 0 or labels.max() <= np.iinfo(np.uint16).max else np.uint32
+        if np.issubdtype(dtype, np.integer) and len(labels) > 0 and labels.max() > np.iinfo(dtype).max:
+            raise ValueError(f"The labels of the ROIs do not fit in {np.dtype(dtype).name}.")
+        expected_shape = image_shape
+    else:
+        labels = None
+        dtype = np.float32 if dtype is None else dtype
+        expected_shape = (len(rois),) + image_shape
+    if out is not None and out.shape != expected_shape:
+        raise ValueError(f"'out' must have shape {expected_shape}, got {out.shape}.")
+
+    return _rasterize_masks(
+        mask_array=mask_array, mask_index=mask_index, image_shape=image_shape, dtype=dtype, out=out, labels=labels
+    )
+
+
+def _apply_mask_storage(table, mask_name, mask_dtype, mask_storage, mask_array, mask_index, image_mask):
+    """Convert the masks of new ROIs to the mask column(s) selected by a storage policy.
+
+    With 'auto', a table that already holds masks keeps filling the same column(s), since every ROI must have
+    a value in every column; otherwise the sparse mask is stored whenever it takes fewer bytes than the image
+    masks. Returns the mask array, its index and the image masks to store, with None for the unused column(s).
+    """
+    if mask_storage == "auto":
+        stored_columns = [column_name for column_name in (mask_name, "image_mask") if column_name in table.colnames]
+        if stored_columns:
+            columns = stored_columns
+        elif image_mask is None and len(mask_array) == 0:
+            columns = [mask_name]
+        else:
+            number_of_rois = len(mask_index) if mask_array is not None else image_mask.shape[0]
+            if mask_array is not None:
+                number_of_elements = len(mask_array)
+            else:
+                number_of_elements = int(np.count_nonzero(image_mask > 0))
+            sparse_size_in_bytes = number_of_elements * mask_dtype.itemsize + number_of_rois * 8
+            if image_mask is not None:
+                dense_size_in_bytes = image_mask.nbytes
+            else:
+                image_shape = _get_image_shape(
+                    table=table, number_of_spatial_dims=len(mask_dtype.names) - 1, mask_array=mask_array
+                )
+                dense_size_in_bytes = number_of_rois * int(np.prod(image_shape)) * np.dtype(np.float32).itemsize
+            columns = [mask_name] if sparse_size_in_bytes < dense_size_in_bytes else ["image_mask"]
+    elif mask_storage in (mask_name, "image_mask"):
+        columns = [mask_storage]
+    else:
+        raise ValueError(f"'mask_storage' must be 'auto', '{mask_name}' or 'image_mask', got '{mask_storage}'.")
+
+    if mask_name in columns and mask_array is None:
+        mask_array, mask_index = _image_masks_to_mask_array(image_masks=image_mask, mask_dtype=mask_dtype)
+    if "image_mask" in columns and image_mask is None:
+        image_shape = _get_image_shape(
+            table=table, number_of_spatial_dims=len(mask_dtype.names) - 1, mask_array=mask_array
+        )
+        image_mask = _rasterize_masks(mask_array=mask_array, mask_index=mask_index, image_shape=image_shape)
+    if mask_name not in columns:
+        mask_array, mask_index = None, None
+    if "image_mask" not in columns:
+        image_mask = None
+    return mask_array, mask_index, image_mask
+
+
+def _add_rois(table, mask_name, mask_dtype, mask, mask_counts, mask_index, image_mask, ids, columns, mask_storage):
+    """Add many ROIs to a Segmentation2D or Segmentation3D table at once.
+
+    The ragged mask column, its VectorIndex, the image_mask column, the ids and any other columns are each
+    extended by a single operation instead of one ``add_row`` call per ROI.
+    """
+    if mask is None and image_mask is None:
+        raise ValueError(f"Must provide 'image_mask' and/or '{mask_name}'")
+
+    mask_array = None
+    if mask is not None:
+        if (mask_counts is None) == (mask_index is None):
+            raise ValueError(f"Must provide exactly one of '{mask_name}_counts' or '{mask_name}_index'")
+        mask_array = _as_mask_array(mask=mask, mask_dtype=mask_dtype)
+        if mask_index is None:
+            mask_index = np.cumsum(np.asarray(mask_counts, dtype=np.uint64), dtype=np.uint64)
+        mask_index = np.asarray(mask_index, dtype=np.uint64)
+        if len(mask_index) > 0 and (
+            mask_index[-1] != len(mask_array) or np.any(np.diff(mask_index.astype(np.int64)) < 0)
+        ):
+            raise ValueError(f"'{mask_name}_index' must be non-decreasing and end at the length of '{mask_name}'")
+    if image_mask is not None:
+        image_mask = np.asarray(image_mask)
+        if mask_array is not None and image_mask.shape[0] != len(mask_index):
+            raise ValueError(f"'image_mask' and '{mask_name}' must describe the same number of ROIs")
+    if mask_storage is not None:
+        mask_array, mask_index, image_mask = _apply_mask_storage(
+            table=table,
+            mask_name=mask_name,
+            mask_dtype=mask_dtype,
+            mask_storage=mask_storage,
+            mask_array=mask_array,
+            mask_index=mask_index,
+            image_mask=image_mask,
+        )
+
+    new_columns = dict()
+    if mask_array is not None:
+        mask_index = np.asarray(mask_index, dtype=np.uint64)
+        number_of_rois = len(mask_index)
+        new_columns[mask_name] = mask_array
+    if image_mask is not None:
+        number_of_rois = image_mask.shape[0]
+        new_columns["image_mask"] = image_mask
+
+    if ids is None:
+        ids = np.arange(len(table.id), len(table.id) + number_of_rois)
+    ids = np.asarray(ids, dtype=np.int64)
+    if len(ids) != number_of_rois:
+        raise ValueError(f"'id' must have one entry per ROI ({number_of_rois}), got {len(ids)}")
+
+    for column_name, column_values in columns.items():
+        if column_name not in table.colnames:
+            raise ValueError(f"Column '{column_name}' is not in {table.name}; add it with 'add_column' first")
+        if isinstance(table.get(column_name), VectorIndex):
+            raise ValueError(f"Bulk insertion into the ragged column '{column_name}' is not supported")
+        column_values = np.asarray(column_values)
+        if len(column_values) != number_of_rois:
+            raise ValueError(f"Column '{column_name}' must have one entry per ROI ({number_of_rois})")
+        new_columns[column_name] = column_values
+
+    missing_columns = set(table.colnames) - set(new_columns)
+    if missing_columns:
+        raise ValueError(f"Values for the existing column(s) {sorted(missing_columns)} must also be provided")
+
+    _invalidate_roi_caches(table=table)
+    for column_name, column_values in new_columns.items():
+        is_ragged = column_name == mask_name
+        if column_name not in table.colnames:
+            # Predefined optional columns are only created once they receive data; start them empty
+            column_spec = next(column for column in table.__columns__ if column["name"] == column_name)
+            table.add_column(
+                name=column_name,
+                description=column_spec["description"],
+                data=np.empty((0,) + column_values.shape[1:], dtype=column_values.dtype),
+                index=is_ragged,
+            )
+
+        column = table.get(column_name)
+        if is_ragged:
+            _extend_data(container=column, values=mask_index + np.uint64(len(column.target.data)))
+            column = column.target
+        _extend_data(container=column, values=column_values)
+
+    _extend_data(container=table.id, values=ids)
+
+
+def _read_mask_column(table, mask_name, mask_dtype):
+    """Read the concatenated pixel_mask or voxel_mask of a table and its end offsets, or None if it is not set."""
+    mask_index_column = table.get(mask_name)
+    if mask_index_column is None:
+        return None
+    mask_array = _as_mask_array(mask=mask_index_column.target.data[:], mask_dtype=mask_dtype)
+    mask_index = np.asarray(mask_index_column.data[:], dtype=np.int64)
+    return mask_array, mask_index
+
+
+def _read_image_mask_column(table, mask_dtype, rois_per_read=256):
+    """Read the image_mask column of a table as a concatenated structured mask array and its end offsets.
+
+    The image masks are read a block of ROIs at a time so that only the non-zero elements of the whole
+    column are held in memory.
+    """
+    image_mask_data = table.image_mask.data
+    mask_arrays, mask_indices = list(), list()
+    number_of_elements = 0
+    for start in range(0, len(image_mask_data), rois_per_read):
+        mask_array, mask_index = _image_masks_to_mask_array(
+            image_masks=np.asarray(image_mask_data[start : start + rois_per_read]), mask_dtype=mask_dtype
+        )
+        mask_arrays.append(mask_array)
+        mask_indices.append(mask_index + number_of_elements)
+        number_of_elements += len(mask_array)
+    if not mask_arrays:
+        return np.empty(0, dtype=mask_dtype), np.empty(0, dtype=np.int64)
+    return np.concatenate(mask_arrays), np.concatenate(mask_indices)
+
+
+def _read_masks(table, mask_name, mask_dtype, mask_type=None):
+    """Read the masks of all ROIs of a table as a concatenated structured mask array and its end offsets.
+
+    mask_type selects the column to read, either mask_name ('pixel_mask' or 'voxel_mask') or 'image_mask';
+    by default mask_name is used if the table has it.
+    """
+    if mask_type is None:
+        mask_type = mask_name if table.get(mask_name) is not None else "image_mask"
+    if mask_type == mask_name:
+        masks = _read_mask_column(table=table, mask_name=mask_name, mask_dtype=mask_dtype)
+    elif mask_type == "image_mask":
+        masks = None if table.image_mask is None else _read_image_mask_column(table=table, mask_dtype=mask_dtype)
+    else:
+        raise ValueError(f"'mask_type' must be either '{mask_name}' or 'image_mask', got '{mask_type}'.")
+    if masks is None:
+        raise ValueError(f"'{table.name}' has no '{mask_type}' column.")
+    return masks
+
+
+def _get_bounding_boxes(mask_array, mask_index):
+    """Compute the inclusive bounding box of each ROI from its concatenated structured mask array.
+
+    Returns the (number of ROIs, number of spatial dims) arrays of minimum and maximum coordinates. ROIs with
+    no elements get a minimum larger than their maximum, so they never intersect anything.
+    """
+    coordinates = np.stack([mask_array[field_name] for field_name in mask_array.dtype.names[:-1]], axis=1)
+    coordinates = coordinates.astype(np.int64)
+    number_of_rois, number_of_spatial_dims = len(mask_index), coordinates.shape[1]
+
+    starts = np.concatenate(([0], mask_index[:-1])).astype(np.int64)
+    is_non_empty = np.asarray(mask_index, dtype=np.int64) > starts
+    min_coordinates = np.full((number_of_rois, number_of_spatial_dims), np.iinfo(np.int64).max)
+    max_coordinates = np.full((number_of_rois, number_of_spatial_dims), -1)
+    if np.any(is_non_empty):
+        min_coordinates[is_non_empty] = np.minimum.reduceat(coordinates, starts[is_non_empty], axis=0)
+        max_coordinates[is_non_empty] = np.maximum.reduceat(coordinates, starts[is_non_empty], axis=0)
+    return min_coordinates, max_coordinates
+
+
+class _ROISpatialIndex:
+    """Uniform grid over the bounding boxes of the ROIs of a segmentation.
+
+    Each ROI is registered in every grid cell its bounding box overlaps, so a query only inspects the ROIs
+    registered in the cells it touches instead of every ROI. The cell size is the median bounding box extent,
+    which keeps the number of ROIs per cell small for typical segmentations.
+    """
+
+    def __init__(self, mask_array, mask_index):
+        self.mask_array = mask_array
+        self.mask_index = np.asarray(mask_index, dtype=np.int64)
+        self.number_of_rois = len(self.mask_index)
+        self.min_coordinates, self.max_coordinates = _get_bounding_boxes(mask_array, self.mask_index)
+
+        is_non_empty = np.all(self.min_coordinates <= self.max_coordinates, axis=1)
+        rois = np.flatnonzero(is_non_empty)
+        if len(rois) == 0:
+            self.cell_size = np.ones(self.min_coordinates.shape[1], dtype=np.int64)
+            self.grid_shape = tuple(np.ones_like(self.cell_size))
+            self.cell_offsets = np.zeros(2, dtype=np.int64)
+            self.cell_rois = np.empty(0, dtype=np.int64)
+            return
+        extents = self.max_coordinates[rois] - self.min_coordinates[rois] + 1
+        self.cell_size = np.maximum(1, np.median(extents, axis=0)).astype(np.int64)
+        min_cells = self.min_coordinates[rois] // self.cell_size
+        max_cells = self.max_coordinates[rois] // self.cell_size
+        self.grid_shape = tuple(np.max(max_cells, axis=0) + 1)
+
+        # Enumerate every (cell, ROI) pair without a Python loop over ROIs
+        cell_spans = max_cells - min_cells + 1
+        cells_per_roi = np.prod(cell_spans, axis=1)
+        pair_rois = np.repeat(np.arange(len(rois)), cells_per_roi)
+        local_offsets = np.arange(len(pair_rois)) - np.repeat(np.cumsum(cells_per_roi) - cells_per_roi, cells_per_roi)
+        pair_cells = np.empty((len(pair_rois), len(self.grid_shape)), dtype=np.int64)
+        for dim in reversed(range(len(self.grid_shape))):
+            pair_cells[:, dim] = min_cells[pair_rois, dim] + local_offsets % cell_spans[pair_rois, dim]
+            local_offsets = local_offsets // cell_spans[pair_rois, dim]
+        pair_cell_ids = np.ravel_multi_index(tuple(pair_cells.T), dims=self.grid_shape)
+
+        order = np.argsort(pair_cell_ids, kind="stable")
+        self.cell_rois = rois[pair_rois[order]]
+        self.cell_offsets = np.searchsorted(pair_cell_ids[order], np.arange(int(np.prod(self.grid_shape)) + 1))
+
+    def _get_candidate_rois(self, min_corner, max_corner):
+        """Get the unique ROIs registered in the grid cells overlapping the inclusive box [min_corner, max_corner]."""
+        grid_shape = np.asarray(self.grid_shape)
+        min_cell = np.maximum(np.asarray(min_corner) // self.cell_size, 0)
+        max_cell = np.minimum(np.asarray(max_corner) // self.cell_size, grid_shape - 1)
+        if np.any(min_cell > max_cell):
+            return np.empty(0, dtype=np.int64)
+        cell_ranges = [np.arange(start, stop + 1) for start, stop in zip(min_cell, max_cell)]
+        cell_ids = np.ravel_multi_index(tuple(np.meshgrid(*cell_ranges, indexing="ij")), dims=self.grid_shape).ravel()
+        candidate_rois = [
+            self.cell_rois[self.cell_offsets[cell_id] : self.cell_offsets[cell_id + 1]] for cell_id in cell_ids
+        ]
+        return np.unique(np.concatenate(candidate_rois))
+
+    def rois_intersecting(self, min_corner, max_corner):
+        """Get the indices of the ROIs whose bounding box intersects the inclusive box [min_corner, max_corner]."""
+        candidate_rois = self._get_candidate_rois(min_corner=min_corner, max_corner=max_corner)
+        intersects = np.all(self.min_coordinates[candidate_rois] <= np.asarray(max_corner), axis=1) & np.all(
+            self.max_coordinates[candidate_rois] >= np.asarray(min_corner), axis=1
+        )
+        return candidate_rois[intersects]
+
+    def rois_containing(self, point):
+        """Get the indices of the ROIs whose mask contains the pixel or voxel at point."""
+        point = np.asarray(point, dtype=np.int64)
+        rois_containing_point = list()
+        for roi in self.rois_intersecting(min_corner=point, max_corner=point):
+            start = self.mask_index[roi - 1] if roi > 0 else 0
+            roi_mask = self.mask_array[start : self.mask_index[roi]]
+            is_point = np.ones(len(roi_mask), dtype=bool)
+            for field_name, coordinate in zip(self.mask_array.dtype.names[:-1], point):
+                is_point &= roi_mask[field_name] == coordinate
+            if np.any(is_point & (roi_mask["weight"] > 0)):
+                rois_containing_point.append(roi)
+        return np.asarray(rois_containing_point, dtype=np.int64)
+
+
+def _compute_centroids(mask_array, mask_index):
+    """Compute the weighted centroid of every ROI of a concatenated structured mask array (NaN for an empty ROI).
+
+    The weighted sums are segment reductions (np.add.reduceat) over the concatenated masks, with no loop over ROIs.
+    """
+    mask_index = np.asarray(mask_index, dtype=np.int64)
+    starts = np.concatenate(([0], mask_index[:-1])).astype(np.int64)
+    is_non_empty = mask_index > starts
+    coordinates = np.stack([mask_array[field_name] for field_name in mask_array.dtype.names[:-1]], axis=1)
+    weights = mask_array["weight"].astype(np.float64)
+
+    centroids = np.full((len(mask_index), coordinates.shape[1]), np.nan)
+    if np.any(is_non_empty):
+        weighted_sums = np.add.reduceat(coordinates * weights[:, np.newaxis], starts[is_non_empty], axis=0)
+        total_weights = np.add.reduceat(weights, starts[is_non_empty])
+        with np.errstate(invalid="ignore", divide="ignore"):
+            centroids[is_non_empty] = weighted_sums / total_weights[:, np.newaxis]
+    return centroids
+
+
+def _compute_roi_geometry(table, mask_name, mask_dtype, count_name, add_columns):
+    """Compute the weighted centroid, element count and bounding box of every ROI of a table.
+
+    All quantities are segment reductions (np.add.reduceat, np.minimum.reduceat, ...) over the concatenated
+    masks, with no loop over ROIs.
+    """
+    mask_array, mask_index = _read_masks(table=table, mask_name=mask_name, mask_dtype=mask_dtype)
+    mask_index = np.asarray(mask_index, dtype=np.int64)
+    counts = np.diff(mask_index, prepend=0)
+
+    min_coordinates, max_coordinates = _get_bounding_boxes(mask_array=mask_array, mask_index=mask_index)
+    min_coordinates[counts == 0] = -1
+
+    roi_geometry = {
+        "centroid": _compute_centroids(mask_array=mask_array, mask_index=mask_index),
+        count_name: counts,
+        "bounding_box_min": min_coordinates,
+        "bounding_box_max": max_coordinates,
+    }
+    if add_columns:
+        element_name = count_name.replace("number_of_", "")
+        descriptions = {
+            "centroid": f"Weighted centroid of the ROI, in {element_name}.",
+            count_name: f"Number of {element_name} in the ROI.",
+            "bounding_box_min": f"Smallest {element_name[:-1]} coordinates of the ROI (-1 for an empty ROI).",
+            "bounding_box_max": f"Largest {element_name[:-1]} coordinates of the ROI (-1 for an empty ROI).",
+        }
+        for column_name, column_values in roi_geometry.items():
+            table.add_column(name=column_name, description=descriptions[column_name], data=column_values)
+    return roi_geometry
+
+
+def _get_roi_spatial_index(table, mask_name, mask_dtype):
+    """Get the spatial index of a table, building it on first use or after ROIs were added."""
+    spatial_index = getattr(table, "_roi_spatial_index", None)
+    if spatial_index is None or spatial_index.number_of_rois != len(table):
+        mask_array, mask_index = _read_masks(table=table, mask_name=mask_name, mask_dtype=mask_dtype)
+        spatial_index = _ROISpatialIndex(mask_array=mask_array, mask_index=mask_index)
+        table._roi_spatial_index = spatial_index
+    return spatial_index
+
+
+def _invalidate_roi_caches(table):
+    """Drop the lookup structures derived from the ROIs of a table, e.g., after ROIs were added."""
+    table._roi_spatial_index = None
+    table._roi_plane_index = None
+
+
+def _get_imaging_space_frame_shape(table, number_of_spatial_dims):
+    """Get the frame shape of a microscopy series that shares the imaging space of a segmentation, if any.
+
+    The series are looked up among all objects of the file (or other root container) holding the segmentation.
+    """
+    imaging_space_name = "planar_imaging_space" if number_of_spatial_dims == 2 else "volumetric_imaging_space"
+    imaging_space = getattr(table, imaging_space_name, None)
+    root = table
+    while root.parent is not None:
+        root = root.parent
+    if imaging_space is None or root is table:
+        return None
+    for container in root.all_children():
+        if container is table or getattr(container, imaging_space_name, None) is not imaging_space:
+            continue
+        data_shape = getattr(getattr(container, "data", None), "shape", None)
+        if data_shape is not None and len(data_shape) > number_of_spatial_dims:
+            return tuple(int(length) for length in data_shape[1 : number_of_spatial_dims + 1])
+    return None
+
+
+def _get_image_shape(table, number_of_spatial_dims, mask_array=None):
+    """Infer the shape of the field of view of a segmentation.
+
+    The shape is taken from the image_mask column if present, then from the summary images, then from the
+    frames of a microscopy series recorded from the same imaging space in the same file, and finally from the
+    extent of the coordinates in mask_array.
+    """
+    if table.image_mask is not None and len(table.image_mask.data) > 0:
+        image_mask_data = table.image_mask.data
+        if hasattr(image_mask_data, "shape"):
+            return tuple(image_mask_data.shape[1:])
+        return tuple(np.shape(image_mask_data[0]))
+    for summary_image in table.summary_images.values():
+        summary_image_shape = np.shape(summary_image.data)
+        if len(summary_image_shape) == number_of_spatial_dims:
+            return tuple(summary_image_shape)
+    frame_shape = _get_imaging_space_frame_shape(table=table, number_of_spatial_dims=number_of_spatial_dims)
+    if frame_shape is not None:
+        return frame_shape
+    if mask_array is not None and len(mask_array) > 0:
+        return tuple(int(mask_array[field_name].max()) + 1 for field_name in mask_array.dtype.names[:-1])
+    raise ValueError(f"Unable to infer the image shape of '{table.name}'; please specify 'image_shape'.")
+
+
+def _get_sparse_mask_matrix(table, mask_name, mask_dtype, mask_type, image_shape):
+    """Build a (number of ROIs, number of pixels or voxels) CSR matrix of ROI weights from a segmentation."""
+    mask_array, mask_index = _read_masks(table=table, mask_name=mask_name, mask_dtype=mask_dtype, mask_type=mask_type)
+
+    number_of_spatial_dims = len(mask_dtype.names) - 1
+    if image_shape is None:
+        image_shape = _get_image_shape(
+            table=table, number_of_spatial_dims=number_of_spatial_dims, mask_array=mask_array
+        )
+    coordinates = tuple(mask_array[field_name].astype(np.intp) for field_name in mask_dtype.names[:-1])
+    linear_indices = np.ravel_multi_index(coordinates, dims=image_shape)
+
+    sparse_mask_matrix = sps.csr_matrix(
+        (mask_array["weight"], linear_indices, np.concatenate(([0], mask_index))),
+        shape=(len(mask_index), int(np.prod(image_shape))),
+    )
+    sparse_mask_matrix.sum_duplicates()
+    return sparse_mask_matrix
+
+
+def _compute_roi_overlaps(table, other, mask_name, mask_dtype, metric, mask_type, image_shape):
+    """Compute a sparse (ROIs of table, ROIs of other) overlap matrix from the sparse mask matrices of both tables.
+
+    Rows of the CSR mask matrices hold the sorted linear pixel indices of each ROI, so their product only visits
+    the pixels shared by pairs of ROIs and never forms dense masks.
+    """
+    if metric not in ("intersection", "iou", "weighted"):
+        raise ValueError(f"'metric' must be 'intersection', 'iou' or 'weighted', got '{metric}'.")
+    if image_shape is None:
+        number_of_spatial_dims = len(mask_dtype.names) - 1
+        image_shape = _get_image_shape(
+            table=table,
+            number_of_spatial_dims=number_of_spatial_dims,
+            mask_array=_read_masks(table=table, mask_name=mask_name, mask_dtype=mask_dtype, mask_type=mask_type)[0],
+        )
+    mask_matrices = [
+        _get_sparse_mask_matrix(
+            table=segmentation,
+            mask_name=mask_name,
+            mask_dtype=mask_dtype,
+            mask_type=mask_type,
+            image_shape=image_shape,
+        ).astype(np.float64)
+        for segmentation in (table, other)
+    ]
+    for mask_matrix in mask_matrices:
+        mask_matrix.eliminate_zeros()
+
+    if metric == "weighted":
+        overlaps = (mask_matrices[0] @ mask_matrices[1].T).tocsr()
+        norms = [
+            np.sqrt(np.asarray(mask_matrix.multiply(mask_matrix).sum(axis=1)).ravel()) for mask_matrix in mask_matrices
+        ]
+    else:
+        for mask_matrix in mask_matrices:
+            mask_matrix.data = (mask_matrix.data > 0).astype(np.float64)
+            mask_matrix.eliminate_zeros()
+        overlaps = (mask_matrices[0] @ mask_matrices[1].T).tocsr()
+        if metric == "intersection":
+            return overlaps.astype(np.int64)
+        norms = [np.asarray(mask_matrix.sum(axis=1)).ravel() for mask_matrix in mask_matrices]
+
+    # Normalize each stored pair without densifying: rows are ROIs of table, columns are ROIs of other
+    rows = np.repeat(np.arange(overlaps.shape[0]), np.diff(overlaps.indptr))
+    columns = overlaps.indices
+    if metric == "weighted":
+        overlaps.data = overlaps.data / (norms[0][rows] * norms[1][columns])
+    else:
+        overlaps.data = overlaps.data / (norms[0][rows] + norms[1][columns] - overlaps.data)
+    return overlaps
+
+
+def _create_annulus_masks(mask_array, mask_index, image_shape, inner_radius, outer_radius, rois_per_block=1024):
+    """Create the neuropil annulus pixel masks of all ROIs of a concatenated structured pixel mask array.
+
+    The annulus of a ROI holds the pixels whose distance to the weighted centroid of the ROI is within
+    [inner_radius, outer_radius], excluding the pixels of every ROI. All ROIs of a block are processed at once
+    by offsetting a shared disk of candidate pixels to each centroid. ROIs with no pixels get empty annuli.
+    Returns the annulus pixel masks, with unit weights, and their end offsets.
+    """
+    mask_index = np.asarray(mask_index, dtype=np.int64)
+    centroids = _compute_centroids(mask_array=mask_array, mask_index=mask_index)
+
+    is_in_any_roi = np.zeros(image_shape, dtype=bool)
+    is_positive = mask_array["weight"] > 0
+    is_in_any_roi[mask_array["x"][is_positive].astype(np.intp), mask_array["y"][is_positive].astype(np.intp)] = True
+
+    radius = int(np.ceil(outer_radius)) + 1
+    offset_range = np.arange(-radius, radius + 1)
+    offsets = np.stack(np.meshgrid(offset_range, offset_range, indexing="ij"), axis=-1).reshape(-1, 2)
+
+    annulus_pixels, annulus_counts = list(), np.zeros(len(mask_index), dtype=np.int64)
+    for start in range(0, len(mask_index), rois_per_block):
+        block_centroids = centroids[start : start + rois_per_block]
+        is_valid = ~np.isnan(block_centroids[:, 0])
+        block_centroids = block_centroids[is_valid]
+        # (ROIs of the block, candidate pixels, 2) pixel coordinates around each rounded centroid
+        candidates = np.round(block_centroids).astype(np.int64)[:, np.newaxis, :] + offsets[np.newaxis]
+        distances = np.linalg.norm(candidates - block_centroids[:, np.newaxis, :], axis=-1)
+        is_annulus = (distances >= inner_radius) & (distances <= outer_radius)
+        is_annulus &= np.all((candidates >= 0) & (candidates < np.asarray(image_shape)), axis=-1)
+        clipped_candidates = np.clip(candidates, 0, np.asarray(image_shape) - 1)
+        is_annulus &= ~is_in_any_roi[clipped_candidates[..., 0], clipped_candidates[..., 1]]
+
+        annulus_pixels.append(candidates[is_annulus])
+        annulus_counts[start : start + rois_per_block][is_valid] = np.count_nonzero(is_annulus, axis=1)
+
+    annulus_pixels = np.concatenate(annulus_pixels) if annulus_pixels else np.empty((0, 2), dtype=np.int64)
+    annulus_mask_array = np.empty(len(annulus_pixels), dtype=mask_array.dtype)
+    annulus_mask_array["x"], annulus_mask_array["y"] = annulus_pixels[:, 0], annulus_pixels[:, 1]
+    annulus_mask_array["weight"] = 1.0
+    return annulus_mask_array, np.cumsum(annulus_counts)
+
+
+def _add_roi_as_bulk(table, mask_name, mask_dtype, row, mask_storage=None):
+    """Add a single ROI through the bulk insertion path used by ``add_rois``."""
+    row = dict(row)
+    mask = row.pop(mask_name, None)
+    if mask is not None:
+        mask = _as_mask_array(mask=mask, mask_dtype=mask_dtype)
+    image_mask = row.pop("image_mask", None)
+    roi_id = row.pop("id", None)
+    _add_rois(
+        table=table,
+        mask_name=mask_name,
+        mask_dtype=mask_dtype,
+        mask=mask,
+        mask_counts=None if mask is None else [len(mask)],
+        mask_index=None,
+        image_mask=None if image_mask is None else [image_mask],
+        ids=None if roi_id is None else [roi_id],
+        columns={column_name: [value] for column_name, value in row.items()},
+        mask_storage=mask_storage,
+    )
+
+
+class _LazyImageMasks:
+    """Read-only array-like view of the image masks of the ROIs of a segmentation.
+
+    If the segmentation has an image_mask column, indexing reads from it. Otherwise, the image mask of each
+    requested ROI is densified on access from its pixel_mask or voxel_mask, reading only the elements of that
+    ROI, so the dense masks never need to be stored or held in memory all at once.
+    """
+
+    def __init__(self, table, mask_name, mask_dtype, image_shape=None):
+        self.mask_dtype = mask_dtype
+        self.image_mask_data = None if table.image_mask is None else table.image_mask.data
+        self.mask_data, self.mask_index = None, None
+        if self.image_mask_data is not None:
+            self.number_of_rois = len(self.image_mask_data)
+            if self.number_of_rois > 0:
+                self.dtype = np.asarray(self.image_mask_data[0]).dtype
+            else:
+                self.dtype = np.dtype(np.float32)
+        else:
+            mask_index_column = table.get(mask_name)
+            if mask_index_column is None:
+                raise ValueError(f"'{table.name}' has no '{mask_name}' or 'image_mask' column.")
+            self.mask_data = mask_index_column.target.data
+            if isinstance(self.mask_data, list):
+                self.mask_data = _as_mask_array(mask=self.mask_data, mask_dtype=mask_dtype)
+            self.mask_index = np.asarray(mask_index_column.data[:], dtype=np.int64)
+            self.number_of_rois = len(self.mask_index)
+            self.dtype = np.dtype(np.float32)
+        if image_shape is None:
+            image_shape = _get_image_shape(
+                table=table, number_of_spatial_dims=len(mask_dtype.names) - 1, mask_array=self.mask_data
+            )
+        self.image_shape = tuple(image_shape)
+
+    @property
+    def shape(self):
+        return (self.number_of_rois,) + self.image_shape
+
+    def __len__(self):
+        return self.number_of_rois
+
+    def __getitem__(self, key):
+        rois = np.arange(self.number_of_rois)[key]
+        if np.ndim(rois) == 0:
+            return self._get_image_mask(roi=int(rois))
+        image_masks = np.empty((len(rois),) + self.image_shape, dtype=self.dtype)
+        for position, roi in enumerate(rois):
+            image_masks[position] = self._get_image_mask(roi=int(roi))
+        return image_masks
+
+    def __array__(self, dtype=None):
+        return np.asarray(self[:], dtype=dtype)
+
+    def _get_image_mask(self, roi):
+        if self.image_mask_data is not None:
+            return np.asarray(self.image_mask_data[roi])
+        start = self.mask_index[roi - 1] if roi > 0 else 0
+        roi_mask = _as_mask_array(mask=self.mask_data[start : self.mask_index[roi]], mask_dtype=self.mask_dtype)
+        return _rasterize_masks(mask_array=roi_mask, mask_index=[len(roi_mask)], image_shape=self.image_shape)[0]
+
+
+class _ROIPlaneIndex:
+    """Voxels of the ROIs of a Segmentation3D sorted by depth plane.
+
+    The voxels of each plane are contiguous in the sorted order, so the voxels of a range of planes are a single
+    slice found from the plane offsets, without scanning the voxels of other planes.
+    """
+
+    def __init__(self, mask_array, mask_index):
+        mask_index = np.asarray(mask_index, dtype=np.int64)
+        self.number_of_rois = len(mask_index)
+        voxel_rois = np.repeat(np.arange(self.number_of_rois), np.diff(np.concatenate(([0], mask_index))))
+        is_positive = mask_array["weight"] > 0
+        mask_array, voxel_rois = mask_array[is_positive], voxel_rois[is_positive]
+
+        order = np.argsort(mask_array["z"], kind="stable")
+        self.mask_array, self.voxel_rois = mask_array[order], voxel_rois[order]
+        number_of_planes = int(self.mask_array["z"].max()) + 1 if len(self.mask_array) > 0 else 0
+        self.plane_offsets = np.searchsorted(self.mask_array["z"], np.arange(number_of_planes + 1))
+
+    def get_plane_masks(self, z_start, z_stop):
+        """Get the ROIs with voxels in the planes [z_start, z_stop) and their pixel masks projected onto x and y.
+
+        Where a ROI has voxels at the same (x, y) in several planes, the largest weight is kept.
+        """
+        number_of_planes = len(self.plane_offsets) - 1
+        start = self.plane_offsets[min(max(z_start, 0), number_of_planes)]
+        stop = self.plane_offsets[min(max(z_stop, 0), number_of_planes)]
+        plane_voxels, plane_voxel_rois = self.mask_array[start:stop], self.voxel_rois[start:stop]
+
+        # Group by ROI and pixel, with the largest weight last within each group
+        order = np.lexsort((plane_voxels["weight"], plane_voxels["y"], plane_voxels["x"], plane_voxel_rois))
+        plane_voxels, plane_voxel_rois = plane_voxels[order], plane_voxel_rois[order]
+        is_last = np.ones(len(order), dtype=bool)
+        is_last[:-1] = (
+            (plane_voxel_rois[1:] != plane_voxel_rois[:-1])
+            | (plane_voxels["x"][1:] != plane_voxels["x"][:-1])
+            | (plane_voxels["y"][1:] != plane_voxels["y"][:-1])
+        )
+        plane_voxels, plane_voxel_rois = plane_voxels[is_last], plane_voxel_rois[is_last]
+
+        pixel_mask = np.empty(len(plane_voxels), dtype=PIXEL_MASK_DTYPE)
+        for field_name in PIXEL_MASK_DTYPE.names:
+            pixel_mask[field_name] = plane_voxels[field_name]
+        rois, pixel_counts = np.unique(plane_voxel_rois, return_counts=True)
+        return rois, pixel_mask, np.cumsum(pixel_counts)
+
+
+def _get_roi_plane_index(table):
+    """Get the plane index of a Segmentation3D, building it on first use or after ROIs were added."""
+    plane_index = getattr(table, "_roi_plane_index", None)
+    if plane_index is None or plane_index.number_of_rois != len(table):
+        mask_array, mask_index = _read_masks(table=table, mask_name="voxel_mask", mask_dtype=VOXEL_MASK_DTYPE)
+        plane_index = _ROIPlaneIndex(mask_array=mask_array, mask_index=mask_index)
+        table._roi_plane_index = plane_index
+    return plane_index
+
+
+# Methods shared by Segmentation2D and Segmentation3D, built once per class for its sparse mask column
+
+
+class _MaskFormat:
+    """Names describing the sparse mask column of a segmentation class, used to build and document its methods."""
+
+    def __init__(self, segmentation_class, mask_name, mask_dtype):
+        self.segmentation_class = segmentation_class
+        self.name = mask_name
+        self.dtype = mask_dtype
+        self.dtype_name = f"{mask_name.upper()}_DTYPE"
+        self.element = mask_name[: -len("_mask")]
+        self.number_of_spatial_dims = len(mask_dtype.names) - 1
+        self.coordinates = "(" + ", ".join(mask_dtype.names[:-1]) + ")"
+        self.fields = "(" + ", ".join(mask_dtype.names) + ")"
+        self.example = ", ".join("(" + ", ".join(f"{name}{row}" for name in mask_dtype.names) + ")" for row in (1, 2))
+        self.image_shape = "(" + ", ".join(("height", "width", "depth")[: self.number_of_spatial_dims]) + ")"
+        self.image_size = " * ".join(("height", "width", "depth")[: self.number_of_spatial_dims])
+        if self.number_of_spatial_dims == 2:
+            self.linear_index, self.region = "x * width + y", "rectangle"
+        else:
+            self.linear_index, self.region = "(x * width + y) * depth + z", "box"
+
+
+def _make_add_roi(mask):
+    @docval(
+        {
+            "name": mask.name,
+            "type": "array_data",
+            "default": None,
+            "doc": f"{mask.element} mask for {mask.number_of_spatial_dims}D ROIs: [{mask.example}, ...]",
+            "shape": (None, len(mask.dtype.names)),
+        },
+        {
+            "name": "image_mask",
+            "type": "array_data",
+            "default": None,
+            "doc": "image with the same size of image where positive values mark this ROI",
+            "shape": [[None] * mask.number_of_spatial_dims],
+        },
+        {
+            "name": "mask_storage",
+            "type": str,
+            "doc": f"how to store the masks: 'auto', '{mask.name}' or 'image_mask'; stored as given by default",
+            "default": None,
+        },
+        {"name": "id", "type": int, "doc": "the ID for the ROI", "default": None},
+        allow_extra=True,
+        func_name="add_roi",
+        doc=f"""Add a Region Of Interest (ROI) data to this {mask.segmentation_class.__name__}.
+
+    Parameters
+    ----------
+    {mask.name} : array_data, optional
+        {mask.element.capitalize()} mask for {mask.number_of_spatial_dims}D ROIs in format [{mask.example}, ...].
+        Each row contains {mask.coordinates} coordinates and weight value for a {mask.element}.
+    image_mask : array_data, optional
+        {mask.number_of_spatial_dims}D image where positive values mark this ROI.
+    mask_storage : str, optional
+        How to store the mask of the ROI: 'image_mask', '{mask.name}', or 'auto' to store whichever of the two takes
+        fewer bytes (keeping the mask columns this segmentation already has). The given mask is converted as
+        needed. By default, the masks are stored as given.
+    id : int, optional
+        The ID for the ROI. If not provided, will be auto-generated.
+    **kwargs : dict
+        Additional keyword arguments passed to add_row.
+
+    Raises
+    ------
+    ValueError
+        If neither {mask.name} nor image_mask is provided.
+    """,
+    )
+    def add_roi(self, **kwargs):
+        sparse_mask, image_mask, mask_storage = popargs(mask.name, "image_mask", "mask_storage", kwargs)
+        _invalidate_roi_caches(table=self)
+        if image_mask is None and sparse_mask is None:
+            raise ValueError(f"Must provide 'image_mask' and/or '{mask.name}'")
+        rkwargs = dict(kwargs)
+        if mask_storage is not None:
+            rkwargs.update({mask.name: sparse_mask, "image_mask": image_mask})
+            return _add_roi_as_bulk(
+                table=self, mask_name=mask.name, mask_dtype=mask.dtype, row=rkwargs, mask_storage=mask_storage
+            )
+        if image_mask is not None:
+            rkwargs["image_mask"] = image_mask
+            # TODO: should we check that image_masks shape matches the shape of the FOV in the imaging space?
+        if sparse_mask is not None:
+            rkwargs[mask.name] = sparse_mask
+            mask_column = getattr(self, mask.name)
+            if mask_column is not None and isinstance(mask_column.data, np.ndarray):
+                # Columns filled by add_rois hold a structured array, which add_row cannot append to
+                return _add_roi_as_bulk(table=self, mask_name=mask.name, mask_dtype=mask.dtype, row=rkwargs)
+        return super(mask.segmentation_class, self).add_row(**rkwargs)
+
+    return add_roi
+
+
+def _make_add_rois(mask):
+    @docval(
+        {
+            "name": mask.name,
+            "type": "array_data",
+            "default": None,
+            "doc": (
+                f"concatenated {mask.element} masks of all ROIs, as an (N, {len(mask.dtype.names)}) array or a "
+                f"structured array of {mask.dtype_name}"
+            ),
+            "shape": ((None,), (None, len(mask.dtype.names))),
+        },
+        {
+            "name": f"{mask.name}_counts",
+            "type": "array_data",
+            "default": None,
+            "doc": f"number of {mask.element}s of each ROI in {mask.name}",
+        },
+        {
+            "name": f"{mask.name}_index",
+            "type": "array_data",
+            "default": None,
+            "doc": f"end offset of each ROI in {mask.name}, e.g., as returned by image_masks_to_{mask.name}",
+        },
+        {
+            "name": "image_mask",
+            "type": "array_data",
+            "default": None,
+            "doc": "stack of images with the same size of image where positive values mark each ROI",
+            "shape": (None,) * (mask.number_of_spatial_dims + 1),
+        },
+        {
+            "name": "mask_storage",
+            "type": str,
+            "doc": f"how to store the masks: 'auto', '{mask.name}' or 'image_mask'; stored as given by default",
+            "default": None,
+        },
+        {"name": "id", "type": "array_data", "doc": "the IDs for the ROIs", "default": None},
+        allow_extra=True,
+        func_name="add_rois",
+        doc=f"""Add many Regions Of Interest (ROIs) to this {mask.segmentation_class.__name__} at once.
+
+    Parameters
+    ----------
+    {mask.name} : array_data, optional
+        {mask.element.capitalize()} masks of all ROIs concatenated in order, either as an (N, {len(mask.dtype.names)})
+        array of {mask.fields} rows or as a structured array with the ``{mask.dtype_name}`` compound dtype.
+    {mask.name}_counts : array_data, optional
+        Number of {mask.element}s belonging to each ROI. Required with {mask.name} unless {mask.name}_index is given.
+    {mask.name}_index : array_data, optional
+        End offset of each ROI in {mask.name}, following the convention of a VectorIndex.
+    image_mask : array_data, optional
+        Stack of {mask.number_of_spatial_dims}D images of shape (number of ROIs, {mask.image_shape[1:-1]}) where
+        positive values mark each ROI.
+    mask_storage : str, optional
+        How to store the masks: 'image_mask', '{mask.name}', or 'auto' to store whichever of the two takes fewer
+        bytes. A segmentation that already has mask columns keeps filling them under 'auto', since every ROI
+        must have a value in each column. The given masks are converted as needed; dense image masks are
+        rasterized with the shape of the field of view inferred from the segmentation. By default, the masks
+        are stored as given.
+    id : array_data, optional
+        The IDs for the ROIs. If not provided, will be auto-generated.
+    **kwargs : dict
+        Values for the other columns of this table, with one entry per ROI.
+
+    Raises
+    ------
+    ValueError
+        If neither {mask.name} nor image_mask is provided, or if the inputs disagree on the number of ROIs.
+    """,
+    )
+    def add_rois(self, **kwargs):
+        sparse_mask, mask_counts, mask_index, image_mask, mask_storage, ids = popargs(
+            mask.name, f"{mask.name}_counts", f"{mask.name}_index", "image_mask", "mask_storage", "id", kwargs
+        )
+        _add_rois(
+            table=self,
+            mask_name=mask.name,
+            mask_dtype=mask.dtype,
+            mask=sparse_mask,
+            mask_counts=mask_counts,
+            mask_index=mask_index,
+            image_mask=image_mask,
+            ids=ids,
+            columns=kwargs,
+            mask_storage=mask_storage,
+        )
+
+    return add_rois
+
+
+def _make_get_sparse_mask_matrix(mask):
+    @docval(
+        {
+            "name": "mask_type",
+            "type": str,
+            "doc": f"the mask column to read, either '{mask.name}' or 'image_mask'; defaults to {mask.name} if present",
+            "default": None,
+        },
+        {
+            "name": "image_shape",
+            "type": (list, tuple),
+            "doc": f"shape {mask.image_shape} of the imaging field of view; inferred from the segmentation if omitted",
+            "default": None,
+        },
+        func_name="get_sparse_mask_matrix",
+        doc=f"""Get the masks of all ROIs as a single sparse matrix.
+
+    Row i holds the weights of ROI i over the {mask.element}s of the field of view, flattened in C order, so that
+    {mask.element} {mask.coordinates} is column ``{mask.linear_index}``. The matrix is built directly from the
+    concatenated mask data and its index, without creating per-ROI objects.
+
+    Parameters
+    ----------
+    mask_type : str, optional
+        The mask column to read, either '{mask.name}' or 'image_mask'. Defaults to '{mask.name}' if this
+        segmentation has one, otherwise 'image_mask'.
+    image_shape : tuple, optional
+        Shape {mask.image_shape} of the imaging field of view. If not provided, it is taken from the image_mask
+        column, the summary images, the microscopy series recorded from the same imaging space, or the extent of
+        the {mask.name} coordinates, in that order.
+
+    Returns
+    -------
+    scipy.sparse.csr_matrix
+        Matrix of shape (number of ROIs, {mask.image_size}) with the ROI weights as values.
+
+    Raises
+    ------
+    ValueError
+        If the requested mask column does not exist.
+    """,
+    )
+    def get_sparse_mask_matrix(self, **kwargs):
+        mask_type, image_shape = popargs("mask_type", "image_shape", kwargs)
+        return _get_sparse_mask_matrix(
+            table=self, mask_name=mask.name, mask_dtype=mask.dtype, mask_type=mask_type, image_shape=image_shape
+        )
+
+    return get_sparse_mask_matrix
+
+
+def _make_find_rois_containing(mask):
+    @docval(
+        {
+            "name": "point",
+            "type": "array_data",
+            "doc": f"the {mask.coordinates} coordinates of the {mask.element}",
+            "shape": (mask.number_of_spatial_dims,),
+        },
+        func_name="find_rois_containing",
+        doc=f"""Find the ROIs whose mask contains a {mask.element}.
+
+    The first query builds a spatial index over the bounding boxes of the ROIs, which is reused by later
+    queries until ROIs are added, so each query only inspects the few ROIs near the {mask.element}.
+
+    Parameters
+    ----------
+    point : array_data
+        The {mask.coordinates} coordinates of the {mask.element}.
+
+    Returns
+    -------
+    numpy.ndarray
+        Row indices of the ROIs with a positive weight at the {mask.element}, in increasing order.
+    """,
+    )
+    def find_rois_containing(self, **kwargs):
+        point = popargs("point", kwargs)
+        spatial_index = _get_roi_spatial_index(table=self, mask_name=mask.name, mask_dtype=mask.dtype)
+        return spatial_index.rois_containing(point=point)
+
+    return find_rois_containing
+
+
+def _make_find_rois_intersecting(mask):
+    @docval(
+        {
+            "name": "min_corner",
+            "type": "array_data",
+            "doc": f"the {mask.coordinates} coordinates of the first corner",
+            "shape": (mask.number_of_spatial_dims,),
+        },
+        {
+            "name": "max_corner",
+            "type": "array_data",
+            "doc": f"the {mask.coordinates} coordinates of the last corner",
+            "shape": (mask.number_of_spatial_dims,),
+        },
+        func_name="find_rois_intersecting",
+        doc=f"""Find the ROIs whose bounding box intersects a {mask.region}.
+
+    Parameters
+    ----------
+    min_corner : array_data
+        The {mask.coordinates} coordinates of the first corner of the {mask.region}, included.
+    max_corner : array_data
+        The {mask.coordinates} coordinates of the last corner of the {mask.region}, included.
+
+    Returns
+    -------
+    numpy.ndarray
+        Row indices of the ROIs whose bounding box intersects the {mask.region}, in increasing order.
+    """,
+    )
+    def find_rois_intersecting(self, **kwargs):
+        min_corner, max_corner = popargs("min_corner", "max_corner", kwargs)
+        spatial_index = _get_roi_spatial_index(table=self, mask_name=mask.name, mask_dtype=mask.dtype)
+        return spatial_index.rois_intersecting(min_corner=min_corner, max_corner=max_corner)
+
+    return find_rois_intersecting
+
+
+def _make_compute_roi_geometry(mask):
+    count_name = f"number_of_{mask.element}s"
+
+    @docval(
+        {
+            "name": "add_columns",
+            "type": bool,
+            "doc": "whether to also store the geometry of the ROIs as columns of this table",
+            "default": False,
+        },
+        func_name="compute_roi_geometry",
+        doc=f"""Compute the weighted centroid, {mask.element} count and bounding box of every ROI in one pass.
+
+    Parameters
+    ----------
+    add_columns : bool, default: False
+        Whether to also store the results as the 'centroid', '{count_name}', 'bounding_box_min' and
+        'bounding_box_max' columns of this table, so that readers do not need to recompute them. Since every
+        ROI added afterwards must then provide these columns, this is best done once all ROIs are added.
+
+    Returns
+    -------
+    dict
+        Arrays with one entry per ROI: 'centroid' (number of ROIs, {mask.number_of_spatial_dims}) of weighted
+        {mask.coordinates} centroids, '{count_name}' (number of ROIs,), and 'bounding_box_min' and
+        'bounding_box_max' (number of ROIs, {mask.number_of_spatial_dims}) of inclusive {mask.coordinates} bounds.
+        ROIs with no {mask.element}s have a NaN centroid and bounds of -1.
+    """,
+    )
+    def compute_roi_geometry(self, **kwargs):
+        add_columns = popargs("add_columns", kwargs)
+        return _compute_roi_geometry(
+            table=self, mask_name=mask.name, mask_dtype=mask.dtype, count_name=count_name, add_columns=add_columns
+        )
+
+    return compute_roi_geometry
+
+
+def _make_get_image_masks(mask):
+    @docval(
+        {
+            "name": "image_shape",
+            "type": (list, tuple),
+            "doc": f"shape {mask.image_shape} of the imaging field of view; inferred from the segmentation if omitted",
+            "default": None,
+        },
+        func_name="get_image_masks",
+        doc=f"""Get a lazy, array-like view of the image masks of all ROIs.
+
+    The view can be indexed like an image_mask column of shape (number of ROIs, {mask.image_shape[1:-1]}), e.g.,
+    with an integer, a slice or a list of ROI indices. If this segmentation only stores the sparse {mask.name}, the
+    image mask of each requested ROI is rendered on access from its {mask.name} alone.
+
+    Parameters
+    ----------
+    image_shape : tuple, optional
+        Shape {mask.image_shape} of the imaging field of view. If not provided, it is taken from the image_mask
+        column, the summary images, the microscopy series recorded from the same imaging space, or the extent of
+        the {mask.name} coordinates, in that order.
+
+    Returns
+    -------
+    array-like
+        Read-only view with ``shape``, ``dtype`` and ``len``, returning numpy arrays when indexed. Masks
+        densified from the {mask.name} are float32.
+
+    Raises
+    ------
+    ValueError
+        If this segmentation has neither an image_mask nor a {mask.name} column.
+    """,
+    )
+    def get_image_masks(self, **kwargs):
+        image_shape = popargs("image_shape", kwargs)
+        return _LazyImageMasks(table=self, mask_name=mask.name, mask_dtype=mask.dtype, image_shape=image_shape)
+
+    return get_image_masks
+
+
+def _make_rasterize_masks(mask):
+    @docval(
+        {
+            "name": "rois",
+            "type": "array_data",
+            "doc": "indices of the ROIs to rasterize; all ROIs by default",
+            "default": None,
+        },
+        {
+            "name": "out",
+            "type": np.ndarray,
+            "doc": "array to write the result into instead of a new one",
+            "default": None,
+        },
+        {
+            "name": "image_shape",
+            "type": (list, tuple),
+            "doc": f"shape {mask.image_shape} of the field of view; inferred if neither this nor out is provided",
+            "default": None,
+        },
+        {
+            "name": "dtype",
+            "type": (type, np.dtype, str),
+            "doc": "data type of a newly allocated output",
+            "default": None,
+        },
+        {
+            "name": "label_image",
+            "type": bool,
+            "doc": "whether to render all ROIs into one label image",
+            "default": False,
+        },
+        {"name": "labels", "type": "array_data", "doc": "label of each ROI in the label image", "default": None},
+        {
+            "name": "mask_type",
+            "type": str,
+            "doc": f"the mask column to read, either '{mask.name}' or 'image_mask'; defaults to {mask.name} if present",
+            "default": None,
+        },
+        func_name="rasterize_masks",
+        doc=f"""Render the masks of many ROIs at once, optionally into a reusable output array.
+
+    Unlike ``{mask.element}_to_image``, which allocates a new float64 image for each ROI, all selected ROIs are
+    written in one vectorized assignment. Passing the same ``out`` array across calls avoids allocating any new
+    frames.
+
+    Parameters
+    ----------
+    rois : array_data, optional
+        Indices of the ROIs to rasterize, in the order of the output. Defaults to all ROIs.
+    out : numpy.ndarray, optional
+        Array to write into, of shape (number of ROIs, {mask.image_shape[1:-1]}), or {mask.image_shape} with
+        ``label_image``. It is cleared first and its dtype is used for the result.
+    image_shape : tuple, optional
+        Shape {mask.image_shape} of the imaging field of view. If neither this nor ``out`` is provided, it is
+        taken from the image_mask column, the summary images, the microscopy series recorded from the same
+        imaging space, or the extent of the {mask.name} coordinates, in that order.
+    dtype : numpy.dtype, optional
+        Data type of a newly allocated output: e.g., float32 (the default) for the weights, bool for binary masks,
+        or uint16 (the default with ``label_image``) for labels.
+    label_image : bool, default: False
+        If True, render all selected ROIs into a single image where each {mask.element} holds the label of its ROI
+        and the background is 0. Where ROIs overlap, the ROI with the largest weight wins.
+    labels : array_data, optional
+        Label of each selected ROI with ``label_image``. Defaults to the ROI index plus one.
+    mask_type : str, optional
+        The mask column to read, either '{mask.name}' or 'image_mask'. Defaults to '{mask.name}' if this
+        segmentation has one.
+
+    Returns
+    -------
+    numpy.ndarray
+        The rendered masks of shape (number of ROIs, {mask.image_shape[1:-1]}), or the label image of shape
+        {mask.image_shape}. This is ``out`` if it was provided.
+
+    Raises
+    ------
+    ValueError
+        If ``out`` does not have the expected shape, or if the labels do not fit in its data type.
+    """,
+    )
+    def rasterize_masks(self, **kwargs):
+        rois, out, image_shape, dtype, label_image, labels, mask_type = popargs(
+            "rois", "out", "image_shape", "dtype", "label_image", "labels", "mask_type", kwargs
+        )
+        return _rasterize_rois(
+            table=self,
+            mask_name=mask.name,
+            mask_dtype=mask.dtype,
+            rois=rois,
+            out=out,
+            image_shape=image_shape,
+            dtype=dtype,
+            label_image=label_image,
+            labels=labels,
+            mask_type=mask_type,
+        )
+
+    return rasterize_masks
+
+
+def _make_from_label_image(mask):
+    @docval(
+        {
+            "name": "label_image",
+            "type": "array_data",
+            "doc": f"integer image {mask.image_shape} where each ROI is marked by its label",
+            "shape": (None,) * mask.number_of_spatial_dims,
+        },
+        {
+            "name": "background",
+            "type": int,
+            "doc": f"the label of the {mask.element}s outside of any ROI",
+            "default": 0,
+        },
+        {
+            "name": "labels_as_ids",
+            "type": bool,
+            "doc": "whether to use the labels as the IDs of the ROIs",
+            "default": False,
+        },
+        {
+            "name": "mask_storage",
+            "type": str,
+            "doc": (
+                f"how to store the masks: 'auto', '{mask.name}' or 'image_mask'; stored as a {mask.name} by default"
+            ),
+            "default": mask.name,
+        },
+        allow_extra=True,
+        func_name="from_label_image",
+        doc=f"""Add one ROI per label of an integer label image, as produced by many segmentation tools.
+
+    All labels are converted at once with a single sort of the labelled {mask.element}s, instead of one ``add_roi``
+    call per ROI. The ROIs are added in increasing order of their labels, with a weight of 1.
+
+    Parameters
+    ----------
+    label_image : array_data
+        Integer image of shape {mask.image_shape} where the {mask.element}s of each ROI hold its label.
+    background : int, default: 0
+        The label of the {mask.element}s that do not belong to any ROI.
+    labels_as_ids : bool, default: False
+        Whether to use the labels as the IDs of the new ROIs instead of auto-generated ones.
+    mask_storage : str, default: '{mask.name}'
+        How to store the masks, see ``add_rois``.
+    **kwargs : dict
+        Values for the other columns of this table, with one entry per label.
+
+    Returns
+    -------
+    numpy.ndarray
+        The labels of the added ROIs, in the order they were added.
+
+    Raises
+    ------
+    ValueError
+        If label_image does not have an integer data type.
+    """,
+    )
+    def from_label_image(self, **kwargs):
+        label_image, background, labels_as_ids, mask_storage = popargs(
+            "label_image", "background", "labels_as_ids", "mask_storage", kwargs
+        )
+        mask_array, mask_index, labels = _label_image_to_mask_array(
+            label_image=label_image, mask_dtype=mask.dtype, background=background
+        )
+        _add_rois(
+            table=self,
+            mask_name=mask.name,
+            mask_dtype=mask.dtype,
+            mask=mask_array,
+            mask_counts=None,
+            mask_index=mask_index,
+            image_mask=None,
+            ids=labels if labels_as_ids else None,
+            columns=kwargs,
+            mask_storage=mask_storage,
+        )
+        return labels
+
+    return from_label_image
+
+
+def _make_to_label_image(mask):
+    @docval(
+        {
+            "name": "rois",
+            "type": "array_data",
+            "doc": "indices of the ROIs to include; all ROIs by default",
+            "default": None,
+        },
+        {
+            "name": "labels",
+            "type": "array_data",
+            "doc": "label of each ROI; the ROI index plus one by default",
+            "default": None,
+        },
+        {"name": "out", "type": np.ndarray, "doc": "array to write the label image into", "default": None},
+        {
+            "name": "image_shape",
+            "type": (list, tuple),
+            "doc": f"shape {mask.image_shape} of the field of view; inferred if neither this nor out is provided",
+            "default": None,
+        },
+        {
+            "name": "dtype",
+            "type": (type, np.dtype, str),
+            "doc": "data type of a newly allocated label image",
+            "default": None,
+        },
+        func_name="to_label_image",
+        doc=f"""Render ROIs into a single integer label image, the inverse of ``from_label_image``.
+
+    Parameters
+    ----------
+    rois : array_data, optional
+        Indices of the ROIs to include. Defaults to all ROIs.
+    labels : array_data, optional
+        Label of each included ROI, e.g., the labels returned by ``from_label_image`` or ``self.id[:]``.
+        Defaults to the ROI index plus one.
+    out : numpy.ndarray, optional
+        Array of shape {mask.image_shape} to write the label image into. It is cleared first.
+    image_shape : tuple, optional
+        Shape {mask.image_shape} of the field of view, see ``rasterize_masks``.
+    dtype : numpy.dtype, optional
+        Data type of a newly allocated label image. Defaults to uint16, or uint32 if the labels do not fit.
+
+    Returns
+    -------
+    numpy.ndarray
+        Label image where the background is 0 and each {mask.element} holds the label of its ROI; where ROIs
+        overlap, the ROI with the largest weight wins.
+    """,
+    )
+    def to_label_image(self, **kwargs):
+        rois, labels, out, image_shape, dtype = popargs("rois", "labels", "out", "image_shape", "dtype", kwargs)
+        return _rasterize_rois(
+            table=self,
+            mask_name=mask.name,
+            mask_dtype=mask.dtype,
+            rois=rois,
+            out=out,
+            image_shape=image_shape,
+            dtype=dtype,
+            label_image=True,
+            labels=labels,
+            mask_type=None,
+        )
+
+    return to_label_image
+
+
+def _make_compute_roi_overlaps(mask):
+    segmentation_class_name = mask.segmentation_class.__name__
+
+    @docval(
+        {
+            "name": "other",
+            "type": mask.segmentation_class,
+            "doc": "the segmentation to compare the ROIs of this segmentation with",
+        },
+        {
+            "name": "metric",
+            "type": str,
+            "doc": "the overlap to compute: 'intersection', 'iou' or 'weighted'",
+            "default": "iou",
+        },
+        {
+            "name": "mask_type",
+            "type": str,
+            "doc": f"the mask column to read, either '{mask.name}' or 'image_mask'; defaults to {mask.name} if present",
+            "default": None,
+        },
+        {
+            "name": "image_shape",
+            "type": (list, tuple),
+            "doc": f"shape {mask.image_shape} of the field of view of both segmentations; inferred if not provided",
+            "default": None,
+        },
+        func_name="compute_roi_overlaps",
+        doc=f"""Compute the pairwise overlap between the ROIs of this segmentation and those of another one.
+
+    The overlaps are computed from the sparse mask matrices of both segmentations (see
+    ``get_sparse_mask_matrix``), whose rows hold the sorted linear indices of the {mask.element}s of each ROI. Only
+    the pairs of ROIs that share {mask.element}s are visited, e.g., for matching ROIs across sessions or algorithms.
+
+    Parameters
+    ----------
+    other : {segmentation_class_name}
+        The segmentation to compare with, on the same field of view.
+    metric : str, default: 'iou'
+        'intersection' for the number of {mask.element}s with a positive weight in both ROIs, 'iou' for the
+        intersection over the union of these {mask.element}s, or 'weighted' for the cosine similarity of the
+        weights of both ROIs.
+    mask_type : str, optional
+        The mask column to read from both segmentations, either '{mask.name}' or 'image_mask'. Defaults to
+        '{mask.name}' for each segmentation that has one.
+    image_shape : tuple, optional
+        Shape {mask.image_shape} of the field of view. If not provided, it is inferred from this segmentation
+        as in ``get_sparse_mask_matrix``.
+
+    Returns
+    -------
+    scipy.sparse.csr_matrix
+        Matrix of shape (number of ROIs of this segmentation, number of ROIs of other) where only the pairs of
+        overlapping ROIs are stored.
+
+    Raises
+    ------
+    ValueError
+        If metric is not one of the supported values.
+    """,
+    )
+    def compute_roi_overlaps(self, **kwargs):
+        other, metric, mask_type, image_shape = popargs("other", "metric", "mask_type", "image_shape", kwargs)
+        return _compute_roi_overlaps(
+            table=self,
+            other=other,
+            mask_name=mask.name,
+            mask_dtype=mask.dtype,
+            metric=metric,
+            mask_type=mask_type,
+            image_shape=image_shape,
+        )
+
+    return compute_roi_overlaps
+
+
+def _add_segmentation_methods(segmentation_class, mask_name, mask_dtype):
+    """Bind the shared ROI methods to Segmentation2D or Segmentation3D, for its 'pixel_mask' or 'voxel_mask' column.
+
+    Each method is built from a single implementation, with the names, shapes and documentation of the mask column
+    and of the dimensionality of the segmentation class.
+    """
+    mask = _MaskFormat(segmentation_class=segmentation_class, mask_name=mask_name, mask_dtype=mask_dtype)
+    setattr(segmentation_class, f"{mask_name}_dtype", mask_dtype)
+    for make_method in (
+        _make_add_roi,
+        _make_add_rois,
+        _make_get_sparse_mask_matrix,
+        _make_find_rois_containing,
+        _make_find_rois_intersecting,
+        _make_compute_roi_geometry,
+        _make_get_image_masks,
+        _make_rasterize_masks,
+        _make_from_label_image,
+        _make_to_label_image,
+        _make_compute_roi_overlaps,
+    ):
+        method = make_method(mask)
+        setattr(segmentation_class, method.__name__, method)
@@ -0,0 +1,119 @@
+"""Streaming of frames from any iterator into the data of microscopy series."""
+
+import itertools
+from typing import Iterable, Optional, Tuple
+
+import numpy as np
+from hdmf.backends.hdf5 import H5DataIO
+from hdmf.data_utils import DataChunkIterator
+
+from ndx_microscopy.chunking import DEFAULT_CHUNK_SIZE_IN_BYTES
+
+# Approximate size of each storage chunk of streamed data, the chunk size recommended for frame access, so that a
+# frame is read by decompressing a chunk that fits in the default HDF5 chunk cache
+DEFAULT_STORAGE_CHUNK_SIZE_IN_BYTES = DEFAULT_CHUNK_SIZE_IN_BYTES
+
+# Approximate size of the block of frames read from a microscopy series at once when no frames_per_chunk is given
+DEFAULT_READ_CHUNK_SIZE_IN_BYTES = 64 * 1024**2
+
+
+def _get_frames_per_storage_chunk(frame_shape, dtype, chunk_size_in_bytes=DEFAULT_STORAGE_CHUNK_SIZE_IN_BYTES):
+    """Choose how many whole frames make up a storage chunk of about chunk_size_in_bytes, with at least one."""
+    frame_size_in_bytes = int(np.prod(frame_shape)) * np.dtype(dtype).itemsize
+    return max(1, chunk_size_in_bytes // max(1, frame_size_in_bytes))
+
+
+def _get_frames_per_chunk(data, chunk_size_in_bytes=DEFAULT_READ_CHUNK_SIZE_IN_BYTES):
+    """Choose how many frames to read at once so that each read is about chunk_size_in_bytes.
+
+    If the data is a chunked dataset (e.g., HDF5), the number of frames is aligned to its chunking along time
+    so that no storage chunk is read twice.
+    """
+    frame_size_in_bytes = int(np.prod(data.shape[1:])) * np.dtype(data.dtype).itemsize
+    frames_per_chunk = max(1, chunk_size_in_bytes // max(1, frame_size_in_bytes))
+
+    storage_chunks = getattr(data, "chunks", None)
+    if storage_chunks:
+        frames_per_storage_chunk = storage_chunks[0]
+        frames_per_chunk = max(1, frames_per_chunk // frames_per_storage_chunk) * frames_per_storage_chunk
+    return frames_per_chunk
+
+
+def stream_microscopy_frames(
+    frames: Iterable[np.ndarray],
+    *,
+    number_of_frames: Optional[int] = None,
+    frame_shape: Optional[Tuple[int, ...]] = None,
+    dtype: Optional[np.dtype] = None,
+    frames_per_chunk: Optional[int] = None,
+    chunk_size_in_bytes: int = DEFAULT_STORAGE_CHUNK_SIZE_IN_BYTES,
+    compression: Optional[str] = "gzip",
+    compression_opts: Optional[int] = 4,
+) -> H5DataIO:
+    """Wrap an iterator of frames so that they are written as the data of a microscopy series as they arrive.
+
+    The frames are buffered one storage chunk at a time by a ``DataChunkIterator`` and written to a dataset
+    whose time axis grows with each chunk, so a recording of any length is written with the memory of a
+    single chunk. Each storage chunk holds whole frames, so reading a frame never touches more than one chunk.
+
+    Pass the result as the ``data`` of a ``PlanarMicroscopySeries`` (frames of shape (height, width)) or of a
+    ``VolumetricMicroscopySeries`` (volumes of shape (height, width, depth)). Unless ``frame_shape`` and
+    ``dtype`` are given, the first frame is read when this function is called, to find them; the other frames are
+    only consumed when the NWB file is written.
+
+    Parameters
+    ----------
+    frames : iterable of numpy.ndarray
+        Frames, or volumes, all of the same shape and data type, e.g., from a generator reading an acquisition.
+    number_of_frames : int, optional
+        The number of frames, if known in advance. By default, the time axis of the dataset is unlimited.
+    frame_shape : tuple of int, optional
+        Shape of each frame. Given with ``dtype``, no frame is read before the NWB file is written.
+    dtype : numpy.dtype, optional
+        Data type of the frames. Given with ``frame_shape``, no frame is read before the NWB file is written.
+    frames_per_chunk : int, optional
+        Number of frames per storage chunk. Defaults to as many whole frames as fit in ``chunk_size_in_bytes``.
+    chunk_size_in_bytes : int, default: 1 MB
+        Target size of each storage chunk when ``frames_per_chunk`` is not given.
+    compression : str, default: "gzip"
+        HDF5 compression filter of the dataset; None to disable compression.
+    compression_opts : int, default: 4
+        Options of the compression filter, e.g., the gzip level.
+
+    Returns
+    -------
+    H5DataIO
+        The wrapped frames, with chunking and compression settings for writing.
+
+    Raises
+    ------
+    ValueError
+        If frames is empty, when frame_shape or dtype is not given.
+    """
+    frames = iter(frames)
+    if frame_shape is None or dtype is None:
+        first_frame = next(frames, None)
+        if first_frame is None:
+            raise ValueError("'frames' must contain at least one frame.")
+        first_frame = np.asarray(first_frame)
+        frame_shape, dtype = first_frame.shape, first_frame.dtype
+        frames = itertools.chain([first_frame], frames)
+    frame_shape, dtype = tuple(int(length) for length in frame_shape), np.dtype(dtype)
+
+    if frames_per_chunk is None:
+        frames_per_chunk = _get_frames_per_storage_chunk(
+            frame_shape=frame_shape, dtype=dtype, chunk_size_in_bytes=chunk_size_in_bytes
+        )
+    if number_of_frames is not None:
+        frames_per_chunk = max(1, min(frames_per_chunk, number_of_frames))
+
+    data_chunk_iterator = DataChunkIterator(
+        data=frames,
+        maxshape=(number_of_frames,) + frame_shape,
+        dtype=dtype,
+        buffer_size=frames_per_chunk,
+    )
+    compression_kwargs = dict() if compression is None else dict(compression=compression)
+    if compression is not None and compression_opts is not None:
+        compression_kwargs.update(compression_opts=compression_opts)
+    return H5DataIO(data=data_chunk_iterator, chunks=(frames_per_chunk,) + frame_shape, **compression_kwargs)
@@ -0,0 +1,215 @@
+"""Computation of summary images from microscopy series in a single pass over the frames."""
+
+import itertools
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+import ndx_microscopy
+from ndx_microscopy.streaming import _get_frames_per_chunk
+
+SUMMARY_IMAGE_STATISTICS = ("mean", "max", "std", "correlation")
+
+_SUMMARY_IMAGE_DESCRIPTIONS = dict(
+    mean="Mean over time of each pixel of '{}'.",
+    max="Maximum over time of each pixel of '{}'.",
+    std="Standard deviation over time of each pixel of '{}'.",
+    correlation="Mean correlation over time between each pixel of '{}' and its adjacent pixels.",
+)
+
+
+def _get_neighbour_offsets(number_of_dimensions):
+    """Get one offset of each pair of opposite offsets to the adjacent pixels (or voxels), including diagonals."""
+    return [
+        offset
+        for offset in itertools.product((-1, 0, 1), repeat=number_of_dimensions)
+        if offset > (0,) * number_of_dimensions
+    ]
+
+
+def _get_neighbour_slices(offset):
+    """Get the slices selecting each pixel and its neighbour at offset, over the pixels having that neighbour."""
+    pixel_slices = tuple(
+        slice(None, -1) if step == 1 else slice(1, None) if step == -1 else slice(None) for step in offset
+    )
+    neighbour_slices = tuple(
+        slice(1, None) if step == 1 else slice(None, -1) if step == -1 else slice(None) for step in offset
+    )
+    return pixel_slices, neighbour_slices
+
+
+def _compute_block_statistics(frames, neighbour_offsets):
+    """Compute the count, mean, max, sum of squared deviations and neighbour co-deviations of a block of frames."""
+    frames = np.asarray(frames)
+    block_max = frames.max(axis=0)
+    frames = frames.astype(np.float64)
+    block_mean = frames.mean(axis=0)
+    deviations = frames - block_mean
+    block_squared_deviations = np.einsum("t...,t...->...", deviations, deviations)
+    block_codeviations = list()
+    for offset in neighbour_offsets:
+        pixel_slices, neighbour_slices = _get_neighbour_slices(offset=offset)
+        block_codeviations.append(
+            np.einsum(
+                "t...,t...->...",
+                deviations[(slice(None),) + pixel_slices],
+                deviations[(slice(None),) + neighbour_slices],
+            )
+        )
+    return dict(
+        count=frames.shape[0],
+        mean=block_mean,
+        max=block_max,
+        squared_deviations=block_squared_deviations,
+        codeviations=block_codeviations,
+    )
+
+
+def _merge_statistics(statistics, block_statistics, neighbour_offsets):
+    """Merge the statistics of a block of frames into the running statistics (Chan et al. parallel update)."""
+    if statistics is None:
+        return block_statistics
+
+    count = statistics["count"] + block_statistics["count"]
+    mean_difference = block_statistics["mean"] - statistics["mean"]
+    weight = statistics["count"] * block_statistics["count"] / count
+
+    statistics["squared_deviations"] += block_statistics["squared_deviations"] + mean_difference**2 * weight
+    for offset, codeviations, block_codeviations in zip(
+        neighbour_offsets, statistics["codeviations"], block_statistics["codeviations"]
+    ):
+        pixel_slices, neighbour_slices = _get_neighbour_slices(offset=offset)
+        codeviations += block_codeviations + mean_difference[pixel_slices] * mean_difference[neighbour_slices] * weight
+    statistics["mean"] += mean_difference * (block_statistics["count"] / count)
+    np.maximum(statistics["max"], block_statistics["max"], out=statistics["max"])
+    statistics["count"] = count
+    return statistics
+
+
+def _get_correlation_image(statistics, neighbour_offsets):
+    """Average the correlations of each pixel with its adjacent pixels; pixels that never vary correlate as 0."""
+    squared_deviations = statistics["squared_deviations"]
+    correlation_sums = np.zeros_like(squared_deviations)
+    number_of_neighbours = np.zeros_like(squared_deviations)
+    for offset, codeviations in zip(neighbour_offsets, statistics["codeviations"]):
+        pixel_slices, neighbour_slices = _get_neighbour_slices(offset=offset)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            correlations = codeviations / np.sqrt(
+                squared_deviations[pixel_slices] * squared_deviations[neighbour_slices]
+            )
+        correlations[~np.isfinite(correlations)] = 0.0
+        for slices in (pixel_slices, neighbour_slices):
+            correlation_sums[slices] += correlations
+            number_of_neighbours[slices] += 1
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(number_of_neighbours > 0, correlation_sums / number_of_neighbours, 0.0)
+
+
+def compute_summary_images(
+    *,
+    microscopy_series: ndx_microscopy.MicroscopySeries,
+    statistics: Sequence[str] = SUMMARY_IMAGE_STATISTICS,
+    frames_per_chunk: Optional[int] = None,
+    max_workers: int = 1,
+    dtype: np.dtype = np.float32,
+) -> List[ndx_microscopy.SummaryImage]:
+    """Compute the mean, max, standard deviation and local correlation images of a microscopy series in one pass.
+
+    The data of the microscopy series is read once, in blocks of frames, so that the whole movie never needs to
+    fit in memory. The statistics of each block are merged into running statistics with the parallel form of
+    Welford's algorithm, which keeps the standard deviation and correlations numerically stable.
+
+    Parameters
+    ----------
+    microscopy_series : PlanarMicroscopySeries or VolumetricMicroscopySeries
+        The imaging data to summarize.
+    statistics : sequence of str, default: ("mean", "max", "std", "correlation")
+        The summary images to compute, any of:
+
+        - "mean": the mean over time of each pixel.
+        - "max": the maximum over time of each pixel.
+        - "std": the (population) standard deviation over time of each pixel.
+        - "correlation": the mean correlation over time between each pixel and its 8 adjacent pixels, or each
+          voxel and its 26 adjacent voxels, as used to find active cells.
+    frames_per_chunk : int, optional
+        Number of frames read at once. Defaults to blocks of about 64 MB, aligned to the storage chunks of the data.
+    max_workers : int, default: 1
+        Number of threads across which the blocks of frames are summarized. At most two blocks per thread are
+        in memory at any time. The result is identical to the serial one up to floating-point rounding.
+    dtype : numpy.dtype, default: numpy.float32
+        Data type of the mean, std and correlation images. The max image keeps the data type of the series.
+
+    Returns
+    -------
+    list of SummaryImage
+        The summary images, in the order of ``statistics`` and named after them, e.g., to pass as the
+        ``summary_images`` of a ``Segmentation2D`` or ``Segmentation3D``.
+
+    Raises
+    ------
+    ValueError
+        If the microscopy series is not planar or volumetric, has no frames, or a statistic is not supported.
+    """
+    if not isinstance(
+        microscopy_series, (ndx_microscopy.PlanarMicroscopySeries, ndx_microscopy.VolumetricMicroscopySeries)
+    ):
+        raise ValueError(
+            "microscopy_series must be a PlanarMicroscopySeries or a VolumetricMicroscopySeries, "
+            f"got {type(microscopy_series).__name__}."
+        )
+    unsupported_statistics = [statistic for statistic in statistics if statistic not in SUMMARY_IMAGE_STATISTICS]
+    if unsupported_statistics:
+        raise ValueError(
+            f"'statistics' must be among {SUMMARY_IMAGE_STATISTICS}, got unsupported {unsupported_statistics}."
+        )
+
+    data = microscopy_series.data
+    if not hasattr(data, "shape"):
+        data = np.asarray(data)
+    number_of_frames = data.shape[0]
+    if number_of_frames == 0:
+        raise ValueError(f"'{microscopy_series.name}' has no frames to summarize.")
+    frames_per_chunk = frames_per_chunk or _get_frames_per_chunk(data=data)
+    neighbour_offsets = (
+        _get_neighbour_offsets(number_of_dimensions=data.ndim - 1) if "correlation" in statistics else []
+    )
+
+    running_statistics = None
+    if max_workers > 1:
+        pending_blocks = deque()
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for start in range(0, number_of_frames, frames_per_chunk):
+                frames = data[start : min(start + frames_per_chunk, number_of_frames)]
+                pending_blocks.append(executor.submit(_compute_block_statistics, frames, neighbour_offsets))
+                if len(pending_blocks) >= 2 * max_workers:
+                    running_statistics = _merge_statistics(
+                        running_statistics, pending_blocks.popleft().result(), neighbour_offsets
+                    )
+            while pending_blocks:
+                running_statistics = _merge_statistics(
+                    running_statistics, pending_blocks.popleft().result(), neighbour_offsets
+                )
+    else:
+        for start in range(0, number_of_frames, frames_per_chunk):
+            frames = data[start : min(start + frames_per_chunk, number_of_frames)]
+            block_statistics = _compute_block_statistics(frames=frames, neighbour_offsets=neighbour_offsets)
+            running_statistics = _merge_statistics(running_statistics, block_statistics, neighbour_offsets)
+
+    summary_image_data = dict(
+        mean=lambda: running_statistics["mean"].astype(dtype),
+        max=lambda: running_statistics["max"],
+        std=lambda: np.sqrt(running_statistics["squared_deviations"] / running_statistics["count"]).astype(dtype),
+        correlation=lambda: _get_correlation_image(
+            statistics=running_statistics, neighbour_offsets=neighbour_offsets
+        ).astype(dtype),
+    )
+    return [
+        ndx_microscopy.SummaryImage(
+            name=statistic,
+            description=_SUMMARY_IMAGE_DESCRIPTIONS[statistic].format(microscopy_series.name),
+            data=summary_image_data[statistic](),
+        )
+        for statistic in statistics
+    ]
@@ -2,6 +2,7 @@ from ._mock import (
     mock_EmissionLightPath,
     mock_ExcitationLightPath,
     mock_Microscope,
+    mock_microscope_and_light_paths,
     mock_Segmentation,
     mock_Segmentation2D,
     mock_Segmentation3D,
@@ -23,6 +24,7 @@ __all__ = [
     "mock_Microscope",
     "mock_ExcitationLightPath",
     "mock_EmissionLightPath",
+    "mock_microscope_and_light_paths",
     "mock_PlanarImagingSpace",
     "mock_VolumetricImagingSpace",
     "mock_Segmentation2D",
@@ -72,6 +72,33 @@ def mock_EmissionLightPath(
     return emission_light_path
 
 
+def mock_microscope_and_light_paths(*, nwbfile: pynwb.NWBFile) -> dict:
+    """Add a mock Microscope and light paths sharing a dichroic mirror, with their devices, to an NWB file.
+
+    Returns them as the ``microscope``, ``excitation_light_path`` and ``emission_light_path`` keyword arguments of
+    a microscopy series, so that the series can be written to the file.
+    """
+    microscope = mock_Microscope(name="Microscope")
+    nwbfile.add_device(devices=microscope)
+    excitation_light_path = mock_ExcitationLightPath(name="ExcitationLightPath")
+    for device in (
+        excitation_light_path.excitation_source,
+        excitation_light_path.excitation_filter,
+        excitation_light_path.dichroic_mirror,
+    ):
+        nwbfile.add_device(devices=device)
+    nwbfile.add_lab_meta_data(lab_meta_data=excitation_light_path)
+    emission_light_path = mock_EmissionLightPath(
+        name="EmissionLightPath", dichroic_mirror=excitation_light_path.dichroic_mirror
+    )
+    for device in (emission_light_path.photodetector, emission_light_path.emission_filter):
+        nwbfile.add_device(devices=device)
+    nwbfile.add_lab_meta_data(lab_meta_data=emission_light_path)
+    return dict(
+        microscope=microscope, excitation_light_path=excitation_light_path, emission_light_path=emission_light_path
+    )
+
+
 def mock_IlluminationPattern(
     *,
     name: Optional[str] = None,
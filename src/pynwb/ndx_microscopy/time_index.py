@@ -0,0 +1,105 @@
+"""Mapping of times to the frames of microscopy series and response series."""
+
+import numpy as np
+
+TIME_LOOKUP_METHODS = ("nearest", "floor")
+
+# Tolerance, in frames, of the arithmetic lookups of regularly sampled series, so that the time of a frame computed
+# from the starting time and rate maps to that frame despite rounding errors
+_FRAME_TOLERANCE = 1e-9
+
+
+class FrameTimeIndex:
+    """Batch lookup of the frames of a series at given times.
+
+    A regularly sampled series (``starting_time`` and ``rate``) is looked up arithmetically; a series with
+    ``timestamps`` is looked up by binary search of the timestamps, read once when the index is created. The
+    timestamps are assumed to be sorted in increasing order.
+
+    Use ``get_frame_time_index`` of a ``MicroscopySeries`` or ``MicroscopyResponseSeries`` to get the cached index
+    of that series.
+    """
+
+    def __init__(self, number_of_frames, timestamps=None, starting_time=None, rate=None):
+        self.number_of_frames = int(number_of_frames)
+        self.timestamps = None if timestamps is None else np.asarray(timestamps[:], dtype=np.float64)
+        self.starting_time = 0.0 if starting_time is None else float(starting_time)
+        self.rate = None if rate is None else float(rate)
+        if self.timestamps is None and self.rate is None:
+            raise ValueError("A FrameTimeIndex requires either timestamps or a rate.")
+
+    def _get_frame_positions(self, times):
+        """Get the position of each time in units of frames since the first frame, for a regularly sampled series."""
+        return (times - self.starting_time) * self.rate
+
+    def get_frame_indices(self, times, method="nearest"):
+        """Get the index of the frame at each time.
+
+        Parameters
+        ----------
+        times : array_like of float
+            Times, in seconds, in the same time base as the series.
+        method : str, default: "nearest"
+            - "nearest": the frame closest in time, clipped to the frames of the series; ties go to the earlier frame.
+            - "floor": the last frame at or before each time; -1 for times before the first frame.
+
+        Returns
+        -------
+        numpy.ndarray
+            The frame indices, as int64, with the shape of times.
+
+        Raises
+        ------
+        ValueError
+            If method is not supported.
+        """
+        if method not in TIME_LOOKUP_METHODS:
+            raise ValueError(f"'method' must be one of {TIME_LOOKUP_METHODS}, got '{method}'.")
+        times = np.asarray(times, dtype=np.float64)
+        if self.number_of_frames == 0:
+            return np.full(times.shape, -1, dtype=np.int64)
+
+        if self.timestamps is None:
+            frame_positions = self._get_frame_positions(times=times)
+            if method == "floor":
+                frame_indices = np.floor(frame_positions + _FRAME_TOLERANCE)
+                return np.clip(frame_indices, -1, self.number_of_frames - 1).astype(np.int64)
+            frame_indices = np.ceil(frame_positions - 0.5 - _FRAME_TOLERANCE)
+            return np.clip(frame_indices, 0, self.number_of_frames - 1).astype(np.int64)
+
+        next_frame_indices = np.searchsorted(self.timestamps, times, side="right")
+        if method == "floor":
+            return (next_frame_indices - 1).astype(np.int64)
+        previous_frame_indices = np.clip(next_frame_indices - 1, 0, self.number_of_frames - 1)
+        next_frame_indices = np.clip(next_frame_indices, 0, self.number_of_frames - 1)
+        is_next_closer = (self.timestamps[next_frame_indices] - times) < (
+            times - self.timestamps[previous_frame_indices]
+        )
+        return np.where(is_next_closer, next_frame_indices, previous_frame_indices).astype(np.int64)
+
+    def get_frame_windows(self, start_times, stop_times):
+        """Get the range of frames within each time window [start time, stop time).
+
+        Parameters
+        ----------
+        start_times : array_like of float
+            Start time of each window, in seconds.
+        stop_times : array_like of float
+            Stop time of each window, in seconds, excluded from the window.
+
+        Returns
+        -------
+        start_frame_indices, stop_frame_indices : numpy.ndarray
+            The frames of each window are ``range(start, stop)``, empty if no frame is within the window.
+        """
+        window_bounds = list()
+        for times in (start_times, stop_times):
+            times = np.asarray(times, dtype=np.float64)
+            if self.timestamps is None:
+                frame_indices = np.ceil(self._get_frame_positions(times=times) - _FRAME_TOLERANCE)
+                frame_indices = np.clip(frame_indices, 0, self.number_of_frames)
+            else:
+                frame_indices = np.searchsorted(self.timestamps, times, side="left")
+            window_bounds.append(frame_indices.astype(np.int64))
+        start_frame_indices, stop_frame_indices = window_bounds
+        return start_frame_indices, np.maximum(stop_frame_indices, start_frame_indices)
@@ -2,6 +2,7 @@
 
 import numpy as np
 import pytest
+from pynwb.testing.mock.file import mock_NWBFile
 
 from ndx_microscopy.testing import (
     mock_PlanarImagingSpace,
@@ -12,7 +13,12 @@ from ndx_microscopy.testing import (
     mock_Segmentation,
     mock_EmissionLightPath,
     mock_ExcitationLightPath,
+    mock_Microscope,
+    mock_PlanarMicroscopySeries,
+    mock_VolumetricMicroscopySeries,
+    mock_MultiPlaneMicroscopyContainer,
 )
+from ndx_microscopy.extraction import extract_microscopy_response_series
 from ndx_microscopy import (
     Segmentation2D,
     Segmentation3D,
@@ -81,6 +87,59 @@ def test_volumetric_image_to_voxel_conversion():
     np.testing.assert_allclose(voxel_mask, expected_voxel_mask)
 
 
+def test_planar_image_masks_to_pixel_mask_conversion():
+    """Test vectorized conversion from a stack of image_masks to a structured pixel_mask for 2D."""
+    planar_imaging_space = mock_PlanarImagingSpace()
+    segmentation = mock_Segmentation2D(planar_imaging_space=planar_imaging_space)
+
+    image_masks = np.zeros((3, 4, 4))
+    image_masks[0, 0, 1] = 1.0
+    image_masks[0, 2, 3] = 0.5
+    image_masks[2, 3, 0] = 2.0
+
+    pixel_mask, pixel_mask_index = segmentation.image_masks_to_pixel_mask(image_masks)
+
+    assert pixel_mask.dtype == segmentation.pixel_mask_dtype
+    np.testing.assert_array_equal(pixel_mask["x"], [0, 2, 3])
+    np.testing.assert_array_equal(pixel_mask["y"], [1, 3, 0])
+    np.testing.assert_allclose(pixel_mask["weight"], [1.0, 0.5, 2.0])
+    np.testing.assert_array_equal(pixel_mask_index, [2, 2, 3])
+
+    # A single image mask matches the per-ROI conversion
+    single_pixel_mask, single_pixel_mask_index = segmentation.image_masks_to_pixel_mask(image_masks[0])
+    np.testing.assert_allclose(single_pixel_mask.tolist(), segmentation.image_to_pixel(image_masks[0]))
+    np.testing.assert_array_equal(single_pixel_mask_index, [2])
+
+
+def test_volumetric_image_masks_to_voxel_mask_conversion():
+    """Test vectorized conversion from a stack of image_masks to a structured voxel_mask for 3D."""
+    volumetric_imaging_space = mock_VolumetricImagingSpace()
+    segmentation = mock_Segmentation3D(volumetric_imaging_space=volumetric_imaging_space)
+
+    image_masks = np.zeros((2, 3, 3, 3), dtype=bool)
+    image_masks[0, 1, 2, 0] = True
+    image_masks[1, 0, 0, 2] = True
+    image_masks[1, 2, 1, 1] = True
+
+    voxel_mask, voxel_mask_index = segmentation.image_masks_to_voxel_mask(image_masks)
+
+    assert voxel_mask.dtype == segmentation.voxel_mask_dtype
+    np.testing.assert_array_equal(voxel_mask["x"], [1, 0, 2])
+    np.testing.assert_array_equal(voxel_mask["y"], [2, 0, 1])
+    np.testing.assert_array_equal(voxel_mask["z"], [0, 2, 1])
+    np.testing.assert_allclose(voxel_mask["weight"], [1.0, 1.0, 1.0])
+    np.testing.assert_array_equal(voxel_mask_index, [1, 3])
+
+
+def test_image_masks_to_pixel_mask_value_error():
+    """Test ValueError for image_masks_to_pixel_mask with wrong dimensions."""
+    planar_imaging_space = mock_PlanarImagingSpace()
+    segmentation_2d = mock_Segmentation2D(planar_imaging_space=planar_imaging_space)
+
+    with pytest.raises(ValueError, match="image_masks must be 2D \\(height, width\\) or 3D"):
+        segmentation_2d.image_masks_to_pixel_mask(np.ones((3,)))
+
+
 def test_pixel_to_image_value_error():
     """Test ValueError for pixel_to_image with invalid pixel mask shape."""
     planar_imaging_space = mock_PlanarImagingSpace()
@@ -207,6 +266,590 @@ def test_volumetric_add_roi_with_image_mask():
     assert np.array_equal(segmentation_3D.image_mask[0], image_mask)
 
 
+def test_planar_add_rois_with_pixel_mask_and_counts():
+    """Test bulk adding ROIs from a concatenated pixel_mask and per-ROI counts."""
+    planar_imaging_space = mock_PlanarImagingSpace()
+    planar_seg = Segmentation2D(name="Segmentation2D", description="", planar_imaging_space=planar_imaging_space)
+
+    planar_seg.add_roi(pixel_mask=[[0, 0, 1.0]])
+    pixel_mask = [[1, 2, 1.0], [3, 4, 1.0], [5, 6, 0.5], [7, 8, 2.0]]
+    planar_seg.add_rois(pixel_mask=pixel_mask, pixel_mask_counts=[1, 3])
+
+    assert len(planar_seg) == 3
+    assert planar_seg.id.data == [0, 1, 2]
+    assert planar_seg.pixel_mask_index.data == [1, 2, 5]
+    np.testing.assert_allclose(planar_seg.pixel_mask_index[2], [(3, 4, 1.0), (5, 6, 0.5), (7, 8, 2.0)])
+
+
+def test_planar_add_rois_with_structured_pixel_mask():
+    """Test bulk adding ROIs, twice, from the structured output of image_masks_to_pixel_mask."""
+    planar_imaging_space = mock_PlanarImagingSpace()
+    planar_seg = Segmentation2D(name="Segmentation2D", description="", planar_imaging_space=planar_imaging_space)
+
+    image_masks = np.zeros((4, 5, 5))
+    image_masks[:, 1:3, 2] = 1.0
+    pixel_mask, pixel_mask_index = planar_seg.image_masks_to_pixel_mask(image_masks)
+    planar_seg.add_rois(pixel_mask=pixel_mask, pixel_mask_index=pixel_mask_index, id=[10, 11, 12, 13])
+
+    assert len(planar_seg) == 4
+    np.testing.assert_array_equal(planar_seg.id.data, [10, 11, 12, 13])
+    assert planar_seg.pixel_mask.data.dtype == planar_seg.pixel_mask_dtype
+    np.testing.assert_allclose(planar_seg.pixel_mask_index[3].tolist(), [(1, 2, 1.0), (2, 2, 1.0)])
+
+    # The structured pixel_mask column stays 1D when extended again
+    planar_seg.add_rois(pixel_mask=pixel_mask[:2], pixel_mask_counts=[2], id=[14])
+    assert planar_seg.pixel_mask.data.shape == (10,)
+    np.testing.assert_allclose(planar_seg.pixel_mask_index[4].tolist(), [(1, 2, 1.0), (2, 2, 1.0)])
+
+
+def test_planar_add_rois_with_image_mask_and_extra_column():
+    """Test bulk adding ROIs from a stack of image masks together with an additional column."""
+    planar_imaging_space = mock_PlanarImagingSpace()
+    planar_seg = Segmentation2D(name="Segmentation2D", description="", planar_imaging_space=planar_imaging_space)
+    planar_seg.add_column(name="quality", description="ROI quality", data=[])
+
+    image_masks = np.ones((3, 5, 5), dtype=bool)
+    planar_seg.add_rois(image_mask=image_masks, quality=[0.1, 0.2, 0.3])
+    planar_seg.add_roi(image_mask=np.ones((5, 5), dtype=bool), quality=0.4)
+
+    assert len(planar_seg) == 4
+    assert np.array_equal(planar_seg.image_mask[1], image_masks[1])
+    np.testing.assert_allclose(planar_seg.quality[:], [0.1, 0.2, 0.3, 0.4])
+
+
+def test_add_rois_value_errors():
+    """Test ValueErrors for add_rois with missing or inconsistent inputs."""
+    planar_imaging_space = mock_PlanarImagingSpace()
+    segmentation_2d = mock_Segmentation2D(planar_imaging_space=planar_imaging_space)
+
+    with pytest.raises(ValueError, match="Must provide 'image_mask' and/or 'pixel_mask'"):
+        segmentation_2d.add_rois()
+    with pytest.raises(ValueError, match="Must provide exactly one of 'pixel_mask_counts' or 'pixel_mask_index'"):
+        segmentation_2d.add_rois(pixel_mask=[[0, 0, 1.0]])
+    with pytest.raises(ValueError, match="must be non-decreasing and end at the length of 'pixel_mask'"):
+        segmentation_2d.add_rois(pixel_mask=[[0, 0, 1.0]], pixel_mask_counts=[2])
+    with pytest.raises(ValueError, match="Values for the existing column\\(s\\) \\['image_mask'\\]"):
+        segmentation_2d.add_rois(pixel_mask=[[0, 0, 1.0]], pixel_mask_counts=[1])
+
+
+def test_volumetric_add_rois_with_voxel_mask_and_counts():
+    """Test bulk adding 3D ROIs from a concatenated voxel_mask and per-ROI counts."""
+    volumetric_imaging_space = mock_VolumetricImagingSpace()
+    segmentation_3D = Segmentation3D(
+        name="Segmentation3D", description="", volumetric_imaging_space=volumetric_imaging_space
+    )
+
+    voxel_mask = [[1, 2, 3, 1.0], [3, 4, 5, 1.0], [5, 6, 7, 2.0]]
+    segmentation_3D.add_rois(voxel_mask=voxel_mask, voxel_mask_counts=[2, 1])
+    segmentation_3D.add_roi(voxel_mask=[[0, 0, 0, 1.0]])
+
+    assert len(segmentation_3D) == 3
+    assert segmentation_3D.voxel_mask.data.dtype == segmentation_3D.voxel_mask_dtype
+    np.testing.assert_allclose(segmentation_3D.voxel_mask_index[1].tolist(), [(5, 6, 7, 2.0)])
+    np.testing.assert_allclose(segmentation_3D.voxel_mask_index[2].tolist(), [(0, 0, 0, 1.0)])
+
+
+def test_planar_get_sparse_mask_matrix():
+    """Test the sparse matrix view of all ROIs from both pixel_mask and image_mask columns."""
+    planar_imaging_space = mock_PlanarImagingSpace()
+    planar_seg = Segmentation2D(name="Segmentation2D", description="", planar_imaging_space=planar_imaging_space)
+
+    image_masks = np.zeros((3, 4, 5))
+    image_masks[0, 0, 0] = 1.0
+    image_masks[1, 1:3, 4] = 0.5
+    image_masks[2, 3, 2] = 2.0
+    pixel_mask, pixel_mask_index = planar_seg.image_masks_to_pixel_mask(image_masks)
+    planar_seg.add_rois(pixel_mask=pixel_mask, pixel_mask_index=pixel_mask_index, image_mask=image_masks)
+
+    sparse_from_pixel_mask = planar_seg.get_sparse_mask_matrix()
+    sparse_from_image_mask = planar_seg.get_sparse_mask_matrix(mask_type="image_mask")
+
+    assert sparse_from_pixel_mask.shape == (3, 20)
+    np.testing.assert_allclose(sparse_from_pixel_mask.toarray(), image_masks.reshape(3, -1))
+    np.testing.assert_allclose(sparse_from_image_mask.toarray(), image_masks.reshape(3, -1))
+
+
+def test_volumetric_get_sparse_mask_matrix():
+    """Test the sparse matrix view of all 3D ROIs from a voxel_mask with an explicit image shape."""
+    volumetric_imaging_space = mock_VolumetricImagingSpace()
+    segmentation_3D = Segmentation3D(
+        name="Segmentation3D", description="", volumetric_imaging_space=volumetric_imaging_space
+    )
+    segmentation_3D.add_roi(voxel_mask=[[0, 1, 2, 1.0], [1, 1, 1, 0.5]])
+    segmentation_3D.add_roi(voxel_mask=[[2, 0, 1, 2.0]])
+
+    sparse_mask_matrix = segmentation_3D.get_sparse_mask_matrix(image_shape=(3, 2, 3))
+
+    expected_image_masks = np.zeros((2, 3, 2, 3))
+    expected_image_masks[0, 0, 1, 2] = 1.0
+    expected_image_masks[0, 1, 1, 1] = 0.5
+    expected_image_masks[1, 2, 0, 1] = 2.0
+    np.testing.assert_allclose(sparse_mask_matrix.toarray(), expected_image_masks.reshape(2, -1))
+
+
+def test_get_sparse_mask_matrix_value_error():
+    """Test ValueError for get_sparse_mask_matrix when the requested mask column is missing."""
+    planar_imaging_space = mock_PlanarImagingSpace()
+    segmentation_2d = mock_Segmentation2D(planar_imaging_space=planar_imaging_space)
+
+    with pytest.raises(ValueError, match="has no 'pixel_mask' column"):
+        segmentation_2d.get_sparse_mask_matrix(mask_type="pixel_mask")
+
+
+def test_planar_find_rois_containing_and_intersecting():
+    """Test point and rectangle queries of the ROI spatial index of a Segmentation2D."""
+    planar_imaging_space = mock_PlanarImagingSpace()
+    planar_seg = Segmentation2D(name="Segmentation2D", description="", planar_imaging_space=planar_imaging_space)
+
+    image_masks = np.zeros((4, 20, 20))
+    image_masks[0, 0:3, 0:3] = 1.0
+    image_masks[1, 2:5, 2:5] = 1.0
+    image_masks[2, 15:18, 10:12] = 1.0
+    image_masks[3, 2, 4] = 1.0
+    image_masks[3, 4, 2] = 1.0  # bounding box covers (3, 3) but the mask does not
+    planar_seg.add_rois(image_mask=image_masks)
+
+    np.testing.assert_array_equal(planar_seg.find_rois_containing(point=[2, 2]), [0, 1])
+    np.testing.assert_array_equal(planar_seg.find_rois_containing(point=[3, 3]), [1])
+    np.testing.assert_array_equal(planar_seg.find_rois_containing(point=[19, 19]), [])
+    np.testing.assert_array_equal(planar_seg.find_rois_intersecting(min_corner=[3, 3], max_corner=[16, 10]), [1, 2, 3])
+
+    # The index is rebuilt once ROIs are added
+    planar_seg.add_roi(image_mask=np.ones((20, 20)))
+    np.testing.assert_array_equal(planar_seg.find_rois_containing(point=[19, 19]), [4])
+
+
+def test_volumetric_find_rois_containing_and_intersecting():
+    """Test point and box queries of the ROI spatial index of a Segmentation3D."""
+    volumetric_imaging_space = mock_VolumetricImagingSpace()
+    segmentation_3D = Segmentation3D(
+        name="Segmentation3D", description="", volumetric_imaging_space=volumetric_imaging_space
+    )
+    segmentation_3D.add_roi(voxel_mask=[[1, 2, 3, 1.0], [2, 2, 3, 1.0]])
+    segmentation_3D.add_roi(voxel_mask=[[5, 5, 5, 1.0]])
+
+    np.testing.assert_array_equal(segmentation_3D.find_rois_containing(point=[2, 2, 3]), [0])
+    np.testing.assert_array_equal(segmentation_3D.find_rois_containing(point=[2, 2, 4]), [])
+    np.testing.assert_array_equal(
+        segmentation_3D.find_rois_intersecting(min_corner=[3, 3, 3], max_corner=[9, 9, 9]), [1]
+    )
+
+
+def test_planar_compute_roi_geometry():
+    """Test the weighted centroid, pixel count and bounding box of every ROI of a Segmentation2D."""
+    planar_imaging_space = mock_PlanarImagingSpace()
+    planar_seg = Segmentation2D(name="Segmentation2D", description="", planar_imaging_space=planar_imaging_space)
+    pixel_mask = [[0, 0, 1.0], [2, 4, 3.0], [5, 5, 1.0]]
+    planar_seg.add_rois(pixel_mask=pixel_mask, pixel_mask_counts=[2, 0, 1])
+
+    roi_geometry = planar_seg.compute_roi_geometry(add_columns=True)
+
+    np.testing.assert_allclose(roi_geometry["centroid"], [[1.5, 3.0], [np.nan, np.nan], [5.0, 5.0]])
+    np.testing.assert_array_equal(roi_geometry["number_of_pixels"], [2, 0, 1])
+    np.testing.assert_array_equal(roi_geometry["bounding_box_min"], [[0, 0], [-1, -1], [5, 5]])
+    np.testing.assert_array_equal(roi_geometry["bounding_box_max"], [[2, 4], [-1, -1], [5, 5]])
+    np.testing.assert_array_equal(planar_seg.number_of_pixels[:], [2, 0, 1])
+    np.testing.assert_allclose(planar_seg.centroid[2], [5.0, 5.0])
+
+
+def test_volumetric_compute_roi_geometry():
+    """Test the weighted centroid, voxel count and bounding box of every ROI of a Segmentation3D."""
+    volumetric_imaging_space = mock_VolumetricImagingSpace()
+    segmentation_3D = mock_Segmentation3D(volumetric_imaging_space=volumetric_imaging_space, number_of_rois=2)
+    segmentation_3D.image_mask.data[1][1:3, 4, 7] = True
+
+    roi_geometry = segmentation_3D.compute_roi_geometry()
+
+    np.testing.assert_allclose(roi_geometry["centroid"][1], [1.5, 4.0, 7.0])
+    np.testing.assert_array_equal(roi_geometry["number_of_voxels"], [0, 2])
+    np.testing.assert_array_equal(roi_geometry["bounding_box_min"][1], [1, 4, 7])
+    np.testing.assert_array_equal(roi_geometry["bounding_box_max"][1], [2, 4, 7])
+    assert "centroid" not in segmentation_3D.colnames
+
+
+def test_planar_add_rois_auto_mask_storage_stores_sparse_pixel_mask():
+    """Test that sparse image masks are stored as a pixel_mask and read back through the lazy image masks."""
+    segmentation_2D = Segmentation2D(
+        name="Segmentation2D", description="", planar_imaging_space=mock_PlanarImagingSpace()
+    )
+    image_masks = np.zeros((3, 20, 20))
+    image_masks[0, 1:3, 1:3] = 1.0
+    image_masks[1, 10, 4:9] = 0.5
+    image_masks[2, 19, 19] = 2.0
+
+    segmentation_2D.add_rois(image_mask=image_masks, mask_storage="auto")
+    segmentation_2D.add_roi(image_mask=image_masks[0], mask_storage="auto")
+
+    assert segmentation_2D.image_mask is None
+    assert len(segmentation_2D.pixel_mask.data) == 4 + 5 + 1 + 4
+    image_mask_view = segmentation_2D.get_image_masks()
+    assert image_mask_view.shape == (4, 20, 20)
+    np.testing.assert_array_equal(image_mask_view[1], image_masks[1])
+    np.testing.assert_array_equal(image_mask_view[[2, 0]], image_masks[[2, 0]])
+    np.testing.assert_array_equal(np.asarray(image_mask_view), np.concatenate((image_masks, image_masks[:1])))
+
+
+def test_planar_add_rois_auto_mask_storage_keeps_dense_image_mask():
+    """Test that dense image masks stay in the image_mask column, which later ROIs keep filling."""
+    segmentation_2D = Segmentation2D(
+        name="Segmentation2D", description="", planar_imaging_space=mock_PlanarImagingSpace()
+    )
+    image_masks = np.ones((2, 4, 4), dtype=bool)
+
+    segmentation_2D.add_rois(image_mask=image_masks, mask_storage="auto")
+    segmentation_2D.add_roi(pixel_mask=[[0, 1, 1.0]], mask_storage="auto")
+
+    assert segmentation_2D.pixel_mask is None
+    assert len(segmentation_2D.image_mask.data) == 3
+    expected_image_mask = np.zeros((4, 4))
+    expected_image_mask[0, 1] = 1.0
+    np.testing.assert_array_equal(segmentation_2D.get_image_masks()[2], expected_image_mask)
+
+
+def test_volumetric_add_rois_auto_mask_storage_stores_sparse_voxel_mask():
+    """Test that sparse 3D image masks are stored as a voxel_mask."""
+    segmentation_3D = Segmentation3D(
+        name="Segmentation3D", description="", volumetric_imaging_space=mock_VolumetricImagingSpace()
+    )
+    image_masks = np.zeros((2, 10, 10, 5), dtype=np.float32)
+    image_masks[0, 2:4, 2:4, 1] = 1.0
+    image_masks[1, 7, 8, :] = 0.25
+
+    segmentation_3D.add_rois(image_mask=image_masks, mask_storage="auto")
+
+    assert segmentation_3D.image_mask is None
+    image_mask_view = segmentation_3D.get_image_masks(image_shape=(10, 10, 5))
+    np.testing.assert_array_equal(image_mask_view[:], image_masks)
+
+
+def test_add_rois_mask_storage_conversions():
+    """Test storing pixel masks as image masks and image masks as pixel masks on request."""
+    planar_imaging_space = mock_PlanarImagingSpace()
+    image_masks = np.zeros((2, 3, 3))
+    image_masks[0, 0, :] = 1.0
+    image_masks[1, 2, 2] = 3.0
+    pixel_mask, pixel_mask_index = Segmentation2D.image_masks_to_pixel_mask(image_masks)
+
+    dense_segmentation_2D = Segmentation2D(name="Dense", description="", planar_imaging_space=planar_imaging_space)
+    dense_segmentation_2D.add_rois(pixel_mask=pixel_mask, pixel_mask_index=pixel_mask_index, mask_storage="image_mask")
+    assert dense_segmentation_2D.pixel_mask is None
+    np.testing.assert_array_equal(dense_segmentation_2D.image_mask.data, image_masks)
+
+    sparse_segmentation_2D = Segmentation2D(name="Sparse", description="", planar_imaging_space=planar_imaging_space)
+    sparse_segmentation_2D.add_rois(image_mask=image_masks, mask_storage="pixel_mask")
+    assert sparse_segmentation_2D.image_mask is None
+    assert sparse_segmentation_2D.pixel_mask.data.tolist() == pixel_mask.tolist()
+
+    with pytest.raises(ValueError, match="'mask_storage' must be 'auto', 'pixel_mask' or 'image_mask'"):
+        sparse_segmentation_2D.add_rois(image_mask=image_masks, mask_storage="dense")
+
+
+def test_planar_rasterize_masks():
+    """Test rasterizing a subset of ROIs into a reused buffer, as booleans and as a label image."""
+    segmentation_2D = Segmentation2D(
+        name="Segmentation2D", description="", planar_imaging_space=mock_PlanarImagingSpace()
+    )
+    image_masks = np.zeros((3, 6, 5), dtype=np.float32)
+    image_masks[0, 0:3, 0:3] = 0.5
+    image_masks[1, 2:5, 2:5] = 1.0
+    image_masks[2, 5, 4] = 2.0
+    pixel_mask, pixel_mask_index = segmentation_2D.image_masks_to_pixel_mask(image_masks)
+    segmentation_2D.add_rois(pixel_mask=pixel_mask, pixel_mask_index=pixel_mask_index)
+
+    np.testing.assert_array_equal(segmentation_2D.rasterize_masks(image_shape=(6, 5)), image_masks)
+
+    out = np.full((2, 6, 5), fill_value=7.0, dtype=np.float32)
+    assert segmentation_2D.rasterize_masks(rois=[2, 0], out=out) is out
+    np.testing.assert_array_equal(out, image_masks[[2, 0]])
+    segmentation_2D.rasterize_masks(rois=[1, 1], out=out)
+    np.testing.assert_array_equal(out, image_masks[[1, 1]])
+
+    binary_masks = segmentation_2D.rasterize_masks(image_shape=(6, 5), dtype=bool)
+    assert binary_masks.dtype == bool
+    np.testing.assert_array_equal(binary_masks, image_masks > 0)
+
+    label_image = segmentation_2D.rasterize_masks(image_shape=(6, 5), label_image=True)
+    assert label_image.dtype == np.uint16
+    expected_label_image = np.zeros((6, 5), dtype=np.uint16)
+    expected_label_image[0:3, 0:3] = 1
+    expected_label_image[2:5, 2:5] = 2  # ROI 1 has the larger weight where it overlaps ROI 0
+    expected_label_image[5, 4] = 3
+    np.testing.assert_array_equal(label_image, expected_label_image)
+
+    label_image = segmentation_2D.rasterize_masks(
+        image_shape=(6, 5), label_image=True, rois=[0, 2], labels=[10, 20], dtype=np.int32
+    )
+    assert label_image[0, 0] == 10 and label_image[5, 4] == 20 and label_image[3, 3] == 0
+
+
+def test_rasterize_masks_label_image_without_positive_weights():
+    """Test that ROIs without any positive weight leave the label image at 0, including an output being reused."""
+    segmentation_2D = Segmentation2D(
+        name="Segmentation2D", description="", planar_imaging_space=mock_PlanarImagingSpace()
+    )
+    segmentation_2D.add_rois(pixel_mask=[[1, 1, 0.0], [2, 3, 0.0], [0, 4, 0.0]], pixel_mask_counts=[2, 1])
+
+    label_image = segmentation_2D.rasterize_masks(image_shape=(6, 5), label_image=True)
+    np.testing.assert_array_equal(label_image, np.zeros((6, 5), dtype=np.uint16))
+    out = np.full((6, 5), fill_value=3, dtype=np.uint16)
+    assert segmentation_2D.rasterize_masks(rois=[1], out=out, label_image=True) is out
+    assert not out.any()
+
+
+def test_volumetric_rasterize_masks():
+    """Test rasterizing the voxel masks of a Segmentation3D into a label image."""
+    segmentation_3D = Segmentation3D(
+        name="Segmentation3D", description="", volumetric_imaging_space=mock_VolumetricImagingSpace()
+    )
+    image_masks = np.zeros((2, 4, 4, 3))
+    image_masks[0, 0, 0, :] = 1.0
+    image_masks[1, 3, 1:3, 2] = 1.0
+    segmentation_3D.add_rois(image_mask=image_masks, mask_storage="voxel_mask")
+
+    np.testing.assert_array_equal(segmentation_3D.rasterize_masks(image_shape=(4, 4, 3)), image_masks)
+    out = np.empty((4, 4, 3), dtype=np.uint8)
+    segmentation_3D.rasterize_masks(out=out, label_image=True)
+    np.testing.assert_array_equal(out, image_masks[0] + 2 * image_masks[1])
+
+
+def test_rasterize_masks_image_shape_from_microscopy_series():
+    """Test that the default image shape is the frame shape of a series recorded from the same imaging space."""
+    nwbfile = mock_NWBFile()
+    planar_imaging_space = mock_PlanarImagingSpace()
+    planar_microscopy_series = mock_PlanarMicroscopySeries(
+        microscope=mock_Microscope(),
+        excitation_light_path=mock_ExcitationLightPath(),
+        planar_imaging_space=planar_imaging_space,
+        emission_light_path=mock_EmissionLightPath(),
+        data=np.zeros((2, 7, 9)),
+    )
+    nwbfile.add_acquisition(nwbdata=planar_microscopy_series)
+    segmentation_2D = Segmentation2D(name="Segmentation2D", description="", planar_imaging_space=planar_imaging_space)
+    segmentation_2D.add_rois(pixel_mask=[[1, 1, 1.0]], pixel_mask_counts=[1])
+    ophys_module = nwbfile.create_processing_module(name="ophys", description="")
+    ophys_module.add(mock_SegmentationContainer(segmentations=[segmentation_2D]))
+
+    assert segmentation_2D.rasterize_masks().shape == (1, 7, 9)
+    assert segmentation_2D.rasterize_masks(label_image=True).shape == (7, 9)
+
+
+def test_rasterize_masks_value_errors():
+    """Test ValueError for an output of the wrong shape and for labels that do not fit in its data type."""
+    segmentation_2D = Segmentation2D(
+        name="Segmentation2D", description="", planar_imaging_space=mock_PlanarImagingSpace()
+    )
+    segmentation_2D.add_rois(pixel_mask=[[0, 0, 1.0], [1, 1, 1.0]], pixel_mask_counts=[1, 1])
+
+    with pytest.raises(ValueError, match="'out' must have shape \\(2, 3, 3\\)"):
+        segmentation_2D.rasterize_masks(out=np.zeros((1, 3, 3)), image_shape=(3, 3))
+    with pytest.raises(ValueError, match="do not fit in uint8"):
+        segmentation_2D.rasterize_masks(out=np.zeros((3, 3), dtype=np.uint8), label_image=True, labels=[1, 300])
+    with pytest.raises(ValueError, match="'labels' must have one entry per ROI"):
+        segmentation_2D.rasterize_masks(label_image=True, labels=[1])
+
+
+def test_planar_label_image_roundtrip():
+    """Test converting a label image to ROIs and back."""
+    rng = np.random.default_rng(seed=0)
+    label_image = rng.choice([0, 3, 7, 12], size=(64, 48)).astype(np.uint16)
+    segmentation_2D = Segmentation2D(
+        name="Segmentation2D", description="", planar_imaging_space=mock_PlanarImagingSpace()
+    )
+
+    labels = segmentation_2D.from_label_image(label_image=label_image, labels_as_ids=True)
+
+    np.testing.assert_array_equal(labels, [3, 7, 12])
+    np.testing.assert_array_equal(segmentation_2D.id[:], [3, 7, 12])
+    assert segmentation_2D.image_mask is None
+    np.testing.assert_array_equal(
+        segmentation_2D.rasterize_masks(image_shape=(64, 48)), [label_image == 3, label_image == 7, label_image == 12]
+    )
+    np.testing.assert_array_equal(segmentation_2D.to_label_image(labels=labels, image_shape=(64, 48)), label_image)
+    np.testing.assert_array_equal(
+        segmentation_2D.to_label_image(image_shape=(64, 48)), np.searchsorted([0, 3, 7, 12], label_image)
+    )
+
+
+def test_volumetric_label_image_roundtrip():
+    """Test converting a 3D label image with a non-zero background to ROIs and back."""
+    label_image = np.full((5, 4, 3), fill_value=-1, dtype=np.int32)
+    label_image[1:3, 1:3, 0] = 4
+    label_image[4, :, 2] = 9
+    segmentation_3D = Segmentation3D(
+        name="Segmentation3D", description="", volumetric_imaging_space=mock_VolumetricImagingSpace()
+    )
+
+    labels = segmentation_3D.from_label_image(label_image=label_image, background=-1)
+
+    np.testing.assert_array_equal(labels, [4, 9])
+    out = np.empty((5, 4, 3), dtype=np.int32)
+    segmentation_3D.to_label_image(labels=labels, out=out)
+    np.testing.assert_array_equal(np.where(out == 0, -1, out), label_image)
+
+
+def test_from_label_image_value_error():
+    """Test ValueError for a label image that does not hold integer labels."""
+    segmentation_2D = Segmentation2D(
+        name="Segmentation2D", description="", planar_imaging_space=mock_PlanarImagingSpace()
+    )
+
+    with pytest.raises(ValueError, match="'label_image' must have an integer data type"):
+        segmentation_2D.from_label_image(label_image=np.ones((3, 3)))
+
+
+def test_planar_compute_roi_overlaps():
+    """Test the sparse overlap matrices between two segmentations against dense computations."""
+    planar_imaging_space = mock_PlanarImagingSpace()
+    rng = np.random.default_rng(seed=0)
+    image_masks = [(rng.random(size=(4, 10, 10)) > 0.7) * rng.random(size=(4, 10, 10)) for _ in range(2)]
+    image_masks[1][3] = 0.0
+    image_masks[1][3, 0, 0] = 1.0
+    image_masks[0][:, 0, 0] = 0.0
+    segmentations = [
+        Segmentation2D(name=f"Segmentation2D{index}", description="", planar_imaging_space=planar_imaging_space)
+        for index in range(2)
+    ]
+    for segmentation_2D, segmentation_image_masks in zip(segmentations, image_masks):
+        segmentation_2D.add_rois(image_mask=segmentation_image_masks, mask_storage="pixel_mask")
+
+    binary_masks = [masks.reshape(4, -1) > 0 for masks in image_masks]
+    expected_intersections = binary_masks[0].astype(int) @ binary_masks[1].T.astype(int)
+    expected_unions = binary_masks[0].sum(axis=1)[:, None] + binary_masks[1].sum(axis=1)[None, :]
+    weights = [masks.reshape(4, -1) for masks in image_masks]
+    expected_weighted = (weights[0] @ weights[1].T) / np.outer(
+        np.linalg.norm(weights[0], axis=1), np.linalg.norm(weights[1], axis=1)
+    )
+
+    intersections = segmentations[0].compute_roi_overlaps(other=segmentations[1], metric="intersection")
+    np.testing.assert_array_equal(intersections.toarray(), expected_intersections)
+    assert intersections.nnz == np.count_nonzero(expected_intersections)
+    np.testing.assert_allclose(
+        segmentations[0].compute_roi_overlaps(other=segmentations[1]).toarray(),
+        expected_intersections / (expected_unions - expected_intersections),
+    )
+    np.testing.assert_allclose(
+        segmentations[0].compute_roi_overlaps(other=segmentations[1], metric="weighted").toarray(),
+        expected_weighted,
+        rtol=1e-6,
+    )
+
+
+def test_volumetric_compute_roi_overlaps():
+    """Test the IoU between the ROIs of two Segmentation3D tables."""
+    volumetric_imaging_space = mock_VolumetricImagingSpace()
+    first_segmentation_3D = Segmentation3D(
+        name="First", description="", volumetric_imaging_space=volumetric_imaging_space
+    )
+    first_segmentation_3D.from_label_image(label_image=np.repeat([[[1, 1, 2, 2]]], 2, axis=0))
+    second_segmentation_3D = Segmentation3D(
+        name="Second", description="", volumetric_imaging_space=volumetric_imaging_space
+    )
+    second_segmentation_3D.from_label_image(label_image=np.repeat([[[0, 1, 1, 1]]], 2, axis=0))
+
+    iou = first_segmentation_3D.compute_roi_overlaps(other=second_segmentation_3D)
+    np.testing.assert_allclose(iou.toarray(), [[1 / 4], [2 / 3]])
+
+
+def test_compute_roi_overlaps_value_error():
+    """Test ValueError for an unknown overlap metric."""
+    segmentation_2D = Segmentation2D(
+        name="Segmentation2D", description="", planar_imaging_space=mock_PlanarImagingSpace()
+    )
+    segmentation_2D.add_roi(pixel_mask=[[0, 0, 1.0]])
+
+    with pytest.raises(ValueError, match="'metric' must be 'intersection', 'iou' or 'weighted'"):
+        segmentation_2D.compute_roi_overlaps(other=segmentation_2D, metric="dice")
+
+
+def test_create_neuropil_segmentation():
+    """Test that the neuropil annuli match a per-ROI computation and are added to the same container."""
+    planar_imaging_space = mock_PlanarImagingSpace()
+    segmentation_2D = Segmentation2D(name="Segmentation2D", description="", planar_imaging_space=planar_imaging_space)
+    image_masks = np.zeros((3, 30, 40))
+    image_masks[0, 4:8, 4:8] = 1.0
+    image_masks[1, 10:13, 9:12] = 0.5
+    image_masks[2, 25:29, 30:38] = 1.0
+    segmentation_2D.add_rois(image_mask=image_masks, mask_storage="pixel_mask", id=[10, 11, 12])
+    segmentation_container = mock_SegmentationContainer(segmentations=[segmentation_2D])
+
+    neuropil_segmentation = segmentation_2D.create_neuropil_segmentation(
+        inner_radius=2, outer_radius=6.5, image_shape=(30, 40)
+    )
+
+    assert segmentation_container.segmentations["Segmentation2DNeuropil"] is neuropil_segmentation
+    assert neuropil_segmentation.planar_imaging_space is planar_imaging_space
+    np.testing.assert_array_equal(neuropil_segmentation.id[:], [10, 11, 12])
+
+    is_in_any_roi = np.any(image_masks > 0, axis=0)
+    x, y = np.meshgrid(np.arange(30), np.arange(40), indexing="ij")
+    neuropil_masks = neuropil_segmentation.rasterize_masks(image_shape=(30, 40))
+    for roi_index, image_mask in enumerate(image_masks):
+        centroid = [np.average(x, weights=image_mask), np.average(y, weights=image_mask)]
+        distances = np.hypot(x - centroid[0], y - centroid[1])
+        expected_neuropil_mask = (distances >= 2) & (distances <= 6.5) & ~is_in_any_roi
+        np.testing.assert_array_equal(neuropil_masks[roi_index], expected_neuropil_mask)
+
+
+def test_create_neuropil_segmentation_value_error():
+    """Test ValueError when the outer radius of the annuli is smaller than the inner radius."""
+    segmentation_2D = Segmentation2D(
+        name="Segmentation2D", description="", planar_imaging_space=mock_PlanarImagingSpace()
+    )
+    segmentation_2D.add_roi(pixel_mask=[[0, 0, 1.0]])
+
+    with pytest.raises(ValueError, match="'outer_radius' \\(1.0\\) must not be smaller than 'inner_radius'"):
+        segmentation_2D.create_neuropil_segmentation(inner_radius=2.0, outer_radius=1.0)
+
+
+def test_volumetric_get_plane_masks():
+    """Test the cross-sections of the ROIs in a depth plane and a range of depth planes."""
+    volumetric_imaging_space = mock_VolumetricImagingSpace()
+    segmentation_3D = Segmentation3D(
+        name="Segmentation3D", description="", volumetric_imaging_space=volumetric_imaging_space
+    )
+    rng = np.random.default_rng(seed=0)
+    image_masks = (rng.random(size=(4, 6, 5, 4)) > 0.8) * rng.random(size=(4, 6, 5, 4))
+    image_masks[2] = 0.0
+    image_masks[2, 1, 1, 3] = 1.0
+    segmentation_3D.add_rois(image_mask=image_masks, mask_storage="voxel_mask", id=[5, 6, 7, 8])
+
+    rois, pixel_mask, pixel_mask_index = segmentation_3D.get_plane_masks(z=1)
+    np.testing.assert_array_equal(rois, [0, 1, 3])
+    segmentation_2D = segmentation_3D.get_plane_masks(z=1, as_segmentation=True)
+    np.testing.assert_array_equal(segmentation_2D.id[:], [5, 6, 8])
+    np.testing.assert_array_equal(
+        segmentation_2D.rasterize_masks(image_shape=(6, 5)), image_masks[[0, 1, 3], :, :, 1].astype(np.float32)
+    )
+    assert segmentation_2D.planar_imaging_space.pixel_size_in_um == (20, 20)
+    assert segmentation_2D.planar_imaging_space.name == f"{volumetric_imaging_space.name}Plane1"
+
+    rois, pixel_mask, pixel_mask_index = segmentation_3D.get_plane_masks(z=2, z_stop=4)
+    np.testing.assert_array_equal(rois, [0, 1, 2, 3])
+    segmentation_2D = Segmentation2D(name="Projection", description="", planar_imaging_space=mock_PlanarImagingSpace())
+    segmentation_2D.add_rois(pixel_mask=pixel_mask, pixel_mask_index=pixel_mask_index)
+    np.testing.assert_array_equal(
+        segmentation_2D.rasterize_masks(image_shape=(6, 5)), np.max(image_masks[..., 2:4], axis=-1).astype(np.float32)
+    )
+
+    rois, pixel_mask, pixel_mask_index = segmentation_3D.get_plane_masks(z=10)
+    assert len(rois) == 0 and len(pixel_mask) == 0
+
+    segmentation_3D.add_roi(voxel_mask=[[0, 0, 10, 1.0]])
+    rois, pixel_mask, pixel_mask_index = segmentation_3D.get_plane_masks(z=10)
+    np.testing.assert_array_equal(rois, [4])
+
+
+def test_get_plane_masks_value_error():
+    """Test ValueError for an empty range of depth planes."""
+    segmentation_3D = Segmentation3D(
+        name="Segmentation3D", description="", volumetric_imaging_space=mock_VolumetricImagingSpace()
+    )
+    segmentation_3D.add_roi(voxel_mask=[[0, 0, 0, 1.0]])
+
+    with pytest.raises(ValueError, match="'z_stop' \\(2\\) must be larger than 'z' \\(2\\)"):
+        segmentation_3D.get_plane_masks(z=2, z_stop=2)
+
+
 def test_add_roi_without_masks():
     """Test error when adding ROI without any mask."""
     planar_imaging_space = mock_PlanarImagingSpace()
@@ -307,3 +950,115 @@ def test_get_indicator_label():
 
 if __name__ == "__main__":
     pytest.main([__file__])
+
+
+def test_get_plane_series():
+    """Test the lazy plane view of a VolumetricMicroscopySeries and its derived imaging space."""
+    volumetric_imaging_space = mock_VolumetricImagingSpace(
+        origin_coordinates=[1.0, 2.0, 3.0], voxel_size_in_um=[1, 2, 5]
+    )
+    data = np.random.default_rng(seed=0).random(size=(6, 5, 4, 3))
+    volumetric_microscopy_series = mock_VolumetricMicroscopySeries(
+        name="VolumetricMicroscopySeries",
+        microscope=mock_Microscope(),
+        excitation_light_path=mock_ExcitationLightPath(),
+        volumetric_imaging_space=volumetric_imaging_space,
+        emission_light_path=mock_EmissionLightPath(),
+        data=data,
+        rate=20.0,
+    )
+
+    plane_series = volumetric_microscopy_series.get_plane_series(depth=2)
+
+    assert plane_series.name == "VolumetricMicroscopySeriesPlane2"
+    assert plane_series.data.shape == (6, 5, 4) and len(plane_series.data) == 6
+    np.testing.assert_array_equal(plane_series.data[1:4], data[1:4, :, :, 2])
+    np.testing.assert_array_equal(plane_series.data[3, ..., 1], data[3, :, 1, 2])
+    np.testing.assert_array_equal(np.asarray(plane_series.data), data[..., 2])
+    assert plane_series.rate == 20.0
+    np.testing.assert_array_equal(plane_series.planar_imaging_space.pixel_size_in_um, [1, 2])
+    np.testing.assert_allclose(plane_series.planar_imaging_space.origin_coordinates, [1.0, 2.0, 13.0])
+    assert volumetric_microscopy_series.get_plane_series(depth=-1).name == "VolumetricMicroscopySeriesPlane2"
+
+    with pytest.raises(ValueError, match="'depth' \\(3\\) is out of range for 3 depth planes"):
+        volumetric_microscopy_series.get_plane_series(depth=3)
+
+
+def test_get_plane_series_with_planar_tooling():
+    """Test that the plane view can be used where a PlanarMicroscopySeries is expected."""
+    data = np.random.default_rng(seed=0).random(size=(8, 5, 4, 3))
+    volumetric_microscopy_series = mock_VolumetricMicroscopySeries(
+        microscope=mock_Microscope(),
+        excitation_light_path=mock_ExcitationLightPath(),
+        volumetric_imaging_space=mock_VolumetricImagingSpace(),
+        emission_light_path=mock_EmissionLightPath(),
+        data=data,
+    )
+    plane_series = volumetric_microscopy_series.get_plane_series(depth=1)
+    segmentation_2D = Segmentation2D(
+        name="Segmentation2D", description="", planar_imaging_space=plane_series.planar_imaging_space
+    )
+    segmentation_2D.add_rois(pixel_mask=[[0, 0, 1.0], [4, 3, 1.0]], pixel_mask_counts=[1, 1])
+
+    response_series = extract_microscopy_response_series(
+        microscopy_series=plane_series, segmentation=segmentation_2D, frames_per_chunk=3
+    )
+
+    np.testing.assert_allclose(response_series.data, data[:, [0, 4], [0, 3], 1], rtol=1e-6)
+
+
+def _mock_multi_plane_microscopy_container(plane_data, depths):
+    microscope, excitation_light_path, emission_light_path = (
+        mock_Microscope(),
+        mock_ExcitationLightPath(),
+        mock_EmissionLightPath(),
+    )
+    planar_microscopy_series = [
+        mock_PlanarMicroscopySeries(
+            name=f"PlanarMicroscopySeries{depth}",
+            microscope=microscope,
+            excitation_light_path=excitation_light_path,
+            planar_imaging_space=mock_PlanarImagingSpace(origin_coordinates=[0.0, 0.0, float(depth)]),
+            emission_light_path=emission_light_path,
+            data=data,
+        )
+        for data, depth in zip(plane_data, depths)
+    ]
+    return mock_MultiPlaneMicroscopyContainer(
+        name="MultiPlaneMicroscopyContainer", planar_microscopy_series=planar_microscopy_series
+    )
+
+
+def test_get_stacked_data():
+    """Test the lazy stacked view of the planes of a MultiPlaneMicroscopyContainer, sorted by depth."""
+    plane_data = np.random.default_rng(seed=0).random(size=(3, 6, 5, 4))
+    multi_plane_microscopy_container = _mock_multi_plane_microscopy_container(
+        plane_data=plane_data, depths=[20.0, 0.0, 10.0]
+    )
+    expected_stacked_data = np.stack([plane_data[1], plane_data[2], plane_data[0]], axis=-1)
+
+    stacked_data = multi_plane_microscopy_container.get_stacked_data()
+
+    assert stacked_data.shape == (6, 5, 4, 3) and len(stacked_data) == 6
+    np.testing.assert_array_equal(stacked_data[:], expected_stacked_data)
+    np.testing.assert_array_equal(stacked_data[2:4, ..., 1], expected_stacked_data[2:4, ..., 1])
+    np.testing.assert_array_equal(stacked_data[1:3, :, :, [0, 2]], expected_stacked_data[1:3, :, :, [0, 2]])
+    np.testing.assert_array_equal(np.asarray(stacked_data), expected_stacked_data)
+
+    stacked_data = multi_plane_microscopy_container.get_stacked_data(
+        planes=["PlanarMicroscopySeries20.0", "PlanarMicroscopySeries0.0"]
+    )
+    np.testing.assert_array_equal(stacked_data[:], np.stack([plane_data[0], plane_data[1]], axis=-1))
+
+
+def test_get_stacked_data_value_error():
+    """Test ValueError for planes of different shapes."""
+    multi_plane_microscopy_container = _mock_multi_plane_microscopy_container(
+        plane_data=[np.zeros((6, 5, 4)), np.zeros((6, 5, 3))], depths=[0.0, 1.0]
+    )
+    with pytest.raises(ValueError, match="The planes must all have the same data shape and type to be stacked"):
+        multi_plane_microscopy_container.get_stacked_data()
+    with pytest.raises(ValueError, match="The data of every plane must be an HDF5 dataset"):
+        multi_plane_microscopy_container.write_virtual_stacked_dataset(
+            file_path="unused.h5", planes=["PlanarMicroscopySeries0.0"]
+        )
@@ -0,0 +1,160 @@
+"""Test the lazy temporal binning of microscopy series."""
+
+from datetime import datetime
+
+import numpy as np
+import pynwb
+import pytest
+from hdmf.backends.hdf5 import H5DataIO
+from pynwb.testing import TestCase as pynwb_TestCase
+from pynwb.testing.mock.file import mock_NWBFile
+from pytz import UTC
+
+from ndx_microscopy.binning import TemporallyBinnedMicroscopySeries
+from ndx_microscopy.testing import (
+    mock_EmissionLightPath,
+    mock_ExcitationLightPath,
+    mock_Microscope,
+    mock_PlanarImagingSpace,
+    mock_PlanarMicroscopySeries,
+    mock_VolumetricImagingSpace,
+    mock_VolumetricMicroscopySeries,
+    mock_microscope_and_light_paths,
+)
+
+
+def _mock_planar_microscopy_series(data, **kwargs):
+    return mock_PlanarMicroscopySeries(
+        microscope=mock_Microscope(),
+        excitation_light_path=mock_ExcitationLightPath(),
+        planar_imaging_space=mock_PlanarImagingSpace(),
+        emission_light_path=mock_EmissionLightPath(),
+        data=data,
+        **kwargs,
+    )
+
+
+def test_temporally_binned_microscopy_series():
+    """Test indexing the binned frames and the timing of the bins, with a trailing partial bin dropped."""
+    data = np.random.default_rng(seed=0).integers(low=0, high=4096, size=(23, 6, 5)).astype(np.uint16)
+    planar_microscopy_series = _mock_planar_microscopy_series(data=data, rate=20.0, starting_time=1.0)
+
+    binned_series = TemporallyBinnedMicroscopySeries(
+        microscopy_series=planar_microscopy_series, bin_size=4, frames_per_chunk=9
+    )
+    expected_binned_data = data[:20].reshape(5, 4, 6, 5).mean(axis=1)
+
+    assert binned_series.shape == (5, 6, 5) and len(binned_series) == 5
+    assert binned_series.dtype == np.float32
+    np.testing.assert_allclose(binned_series[:], expected_binned_data, rtol=1e-6)
+    np.testing.assert_allclose(binned_series[3], expected_binned_data[3], rtol=1e-6)
+    np.testing.assert_allclose(binned_series[[4, 0], 1:3], expected_binned_data[[4, 0], 1:3], rtol=1e-6)
+    np.testing.assert_allclose(np.stack(list(binned_series)), expected_binned_data, rtol=1e-6)
+    assert binned_series.rate == 5.0
+    assert binned_series.starting_time == pytest.approx(1.0 + 1.5 / 20.0)
+    assert binned_series.timestamps is None
+
+
+@pytest.mark.parametrize("method", ["sum", "max"])
+def test_temporally_binned_microscopy_series_methods(method):
+    """Test the sum and max binning methods of a VolumetricMicroscopySeries with timestamps."""
+    data = np.random.default_rng(seed=0).integers(low=0, high=100, size=(9, 4, 3, 2)).astype(np.uint8)
+    timestamps = np.cumsum(np.random.default_rng(seed=1).random(size=9))
+    volumetric_microscopy_series = mock_VolumetricMicroscopySeries(
+        microscope=mock_Microscope(),
+        excitation_light_path=mock_ExcitationLightPath(),
+        volumetric_imaging_space=mock_VolumetricImagingSpace(),
+        emission_light_path=mock_EmissionLightPath(),
+        data=data,
+        rate=None,
+        timestamps=timestamps,
+    )
+
+    binned_series = TemporallyBinnedMicroscopySeries(
+        microscopy_series=volumetric_microscopy_series, bin_size=3, method=method
+    )
+
+    reduce = np.sum if method == "sum" else np.max
+    np.testing.assert_array_equal(binned_series[:], reduce(data.reshape(3, 3, 4, 3, 2), axis=1))
+    assert binned_series.dtype == (np.float32 if method == "sum" else np.uint8)
+    np.testing.assert_allclose(binned_series.timestamps, timestamps.reshape(3, 3).mean(axis=1))
+    assert binned_series.rate is None
+
+
+def test_to_microscopy_series_reads_no_frames():
+    """Test that creating the binned series reads no source frame, deferring all the binning to the write."""
+    data = np.random.default_rng(seed=0).random(size=(12, 4, 3))
+    binned_series = TemporallyBinnedMicroscopySeries(
+        microscopy_series=_mock_planar_microscopy_series(data=data, rate=10.0), bin_size=2
+    )
+    bins_read = list()
+    read_bins = binned_series._read_bins
+
+    def record_read_bins(start, stop):
+        bins_read.extend(range(start, stop))
+        return read_bins(start=start, stop=stop)
+
+    binned_series._read_bins = record_read_bins
+    binned_microscopy_series = binned_series.to_microscopy_series(name="BinnedPlanarMicroscopySeries")
+
+    assert bins_read == []
+    assert binned_microscopy_series.data.data.maxshape == (6, 4, 3)
+    binned_data = np.concatenate([data_chunk.data for data_chunk in binned_microscopy_series.data.data])
+    np.testing.assert_allclose(binned_data, data.reshape(6, 2, 4, 3).mean(axis=1), rtol=1e-6)
+    assert bins_read == list(range(6))
+
+
+def test_temporally_binned_microscopy_series_value_error():
+    """Test ValueError for a bin size larger than the number of frames and an unsupported method."""
+    planar_microscopy_series = _mock_planar_microscopy_series(data=np.zeros((5, 4, 4)))
+    with pytest.raises(ValueError, match="'bin_size' must be between 1 and the number of frames"):
+        TemporallyBinnedMicroscopySeries(microscopy_series=planar_microscopy_series, bin_size=6)
+    with pytest.raises(ValueError, match="'method' must be one of"):
+        TemporallyBinnedMicroscopySeries(microscopy_series=planar_microscopy_series, bin_size=2, method="median")
+
+
+class TestTemporallyBinnedPlanarMicroscopySeriesRoundtrip(pynwb_TestCase):
+    """Roundtrip test for a binned PlanarMicroscopySeries written from a series read back from a file."""
+
+    def setUp(self):
+        self.nwbfile_path = "test_temporally_binned_planar_microscopy_series_roundtrip.nwb"
+
+    def tearDown(self):
+        pynwb.testing.remove_test_file(self.nwbfile_path)
+
+    def test_roundtrip(self):
+        nwbfile = mock_NWBFile(session_start_time=datetime(2000, 1, 1, tzinfo=UTC))
+        devices = mock_microscope_and_light_paths(nwbfile=nwbfile)
+
+        data = np.random.default_rng(seed=0).integers(low=0, high=4096, size=(40, 8, 6)).astype(np.uint16)
+        planar_microscopy_series = mock_PlanarMicroscopySeries(
+            name="PlanarMicroscopySeries",
+            planar_imaging_space=mock_PlanarImagingSpace(name="PlanarImagingSpace"),
+            data=H5DataIO(data=data, chunks=(5, 8, 6)),
+            rate=30.0,
+            **devices,
+        )
+        nwbfile.add_acquisition(nwbdata=planar_microscopy_series)
+
+        with pynwb.NWBHDF5IO(path=self.nwbfile_path, mode="w") as io:
+            io.write(nwbfile)
+
+        with pynwb.NWBHDF5IO(path=self.nwbfile_path, mode="a", load_namespaces=True) as io:
+            read_nwbfile = io.read()
+            binned_series = TemporallyBinnedMicroscopySeries(
+                microscopy_series=read_nwbfile.acquisition["PlanarMicroscopySeries"], bin_size=3, frames_per_chunk=10
+            )
+            read_nwbfile.add_acquisition(nwbdata=binned_series.to_microscopy_series(frames_per_chunk=4))
+            io.write(read_nwbfile)
+
+        with pynwb.NWBHDF5IO(path=self.nwbfile_path, mode="r", load_namespaces=True) as io:
+            read_nwbfile = io.read()
+            read_binned_series = read_nwbfile.acquisition["PlanarMicroscopySeriesBinned3"]
+
+            expected_binned_data = data[:39].reshape(13, 3, 8, 6).mean(axis=1).astype(np.float32)
+            np.testing.assert_allclose(read_binned_series.data[:], expected_binned_data)
+            assert read_binned_series.data.chunks == (4, 8, 6)
+            assert read_binned_series.rate == 10.0
+            assert read_binned_series.starting_time == pytest.approx(1 / 30.0)
+            assert read_binned_series.planar_imaging_space.name == "PlanarImagingSpace"
+            assert read_binned_series.microscope.name == "Microscope"
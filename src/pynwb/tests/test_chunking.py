@@ -0,0 +1,51 @@
+"""Test the recommendation of chunk shapes for microscopy datasets."""
+
+import numpy as np
+import pytest
+
+from ndx_microscopy import Segmentation2D
+from ndx_microscopy.chunking import recommend_chunk_shape, recommend_data_io_settings
+
+
+def test_recommend_chunk_shape_for_frame_access():
+    """Test that frame access gets chunks of whole frames within the chunk size."""
+    assert recommend_chunk_shape(data_shape=(10000, 512, 512), dtype=np.uint16) == (2, 512, 512)
+    assert recommend_chunk_shape(data_shape=(3, 64, 64), dtype=np.uint16) == (3, 64, 64)
+    assert recommend_chunk_shape(data_shape=(100, 2048, 2048), dtype=np.float32) == (1, 2048, 2048)
+    assert recommend_chunk_shape(data_shape=(30000, 500), dtype=np.float32) == (524, 500)
+
+
+def test_recommend_chunk_shape_for_time_access():
+    """Test that time access gets chunks spanning the time axis over a small block of the other axes."""
+    chunk_shape = recommend_chunk_shape(data_shape=(10000, 512, 512), dtype=np.uint16, access_pattern="time")
+    assert chunk_shape[0] == 10000
+    assert np.prod(chunk_shape) * 2 <= 1024**2
+
+    assert recommend_chunk_shape(data_shape=(100, 512, 512), dtype=np.uint16, access_pattern="time") == (100, 64, 64)
+    assert recommend_chunk_shape(data_shape=(30000, 500), dtype=np.float32, access_pattern="time") == (30000, 8)
+    chunk_shape = recommend_chunk_shape(data_shape=(10000, 64, 64, 20), dtype=np.float32, access_pattern="time")
+    assert chunk_shape[0] == 10000 and len(chunk_shape) == 4
+
+
+def test_recommend_chunk_shape_for_block_access_and_mask_columns():
+    """Test block access and the compound dtype of a pixel_mask column."""
+    chunk_shape = recommend_chunk_shape(data_shape=(10000, 512, 512), dtype=np.uint16, access_pattern="block")
+    assert chunk_shape == (79, 64, 64)
+
+    pixel_mask_chunk_shape = recommend_chunk_shape(data_shape=(2_000_000,), dtype=Segmentation2D.pixel_mask_dtype)
+    assert pixel_mask_chunk_shape == (62500,)
+
+
+def test_recommend_data_io_settings():
+    """Test the H5DataIO settings, with and without compression."""
+    settings = recommend_data_io_settings(data_shape=(20, 32, 32), dtype=np.uint16, chunk_size_in_bytes=32 * 32 * 2)
+    assert settings == dict(chunks=(1, 32, 32), compression="gzip", compression_opts=4)
+
+    settings = recommend_data_io_settings(data_shape=(20, 32, 32), dtype=np.uint16, compression=None)
+    assert settings == dict(chunks=(20, 32, 32))
+
+
+def test_recommend_chunk_shape_value_error():
+    """Test ValueError for an unknown access pattern."""
+    with pytest.raises(ValueError, match="'access_pattern' must be one of"):
+        recommend_chunk_shape(data_shape=(10, 4, 4), dtype=np.uint16, access_pattern="random")
@@ -0,0 +1,183 @@
+"""Test the lazy raw binary and TIFF data sources of microscopy series."""
+
+from datetime import datetime
+
+import numpy as np
+import pynwb
+import pytest
+from hdmf.backends.hdf5 import H5DataIO
+from pynwb.testing import TestCase as pynwb_TestCase
+from pynwb.testing.mock.file import mock_NWBFile
+from pytz import UTC
+
+from ndx_microscopy.data_sources import RawBinaryMicroscopyData, TiffMicroscopyData, _MicroscopyFileData
+from ndx_microscopy.testing import (
+    mock_PlanarImagingSpace,
+    mock_PlanarMicroscopySeries,
+    mock_VolumetricImagingSpace,
+    mock_VolumetricMicroscopySeries,
+    mock_microscope_and_light_paths,
+)
+
+
+def _write_raw_binary_file(file_path, data, header_size_in_bytes=0):
+    with open(file_path, "wb") as file:
+        file.write(b"\xff" * header_size_in_bytes)
+        file.write(data.tobytes())
+
+
+def test_raw_binary_microscopy_data(tmp_path):
+    """Test indexing the frames of a raw binary file after a header, including the frames of volumes."""
+    data = np.random.default_rng(seed=0).integers(low=0, high=4096, size=(12, 6, 5)).astype(np.int16)
+    file_path = tmp_path / "data.bin"
+    _write_raw_binary_file(file_path=file_path, data=data, header_size_in_bytes=16)
+
+    raw_data = RawBinaryMicroscopyData(file_path=file_path, dtype=np.int16, frame_shape=(6, 5), header_size_in_bytes=16)
+
+    assert raw_data.shape == (12, 6, 5) and len(raw_data) == 12 and raw_data.dtype == np.int16
+    np.testing.assert_array_equal(raw_data[:], data)
+    np.testing.assert_array_equal(raw_data[3], data[3])
+    np.testing.assert_array_equal(raw_data[[7, 2], 1:3, ...], data[[7, 2], 1:3, ...])
+    np.testing.assert_array_equal(raw_data[4:9, :, -1], data[4:9, :, -1])
+    np.testing.assert_array_equal(raw_data[::-3], data[::-3])
+    np.testing.assert_array_equal(np.asarray(raw_data), data)
+
+    volumetric_data = RawBinaryMicroscopyData(
+        file_path=file_path, dtype=np.int16, frame_shape=(6, 5, 2), header_size_in_bytes=16, number_of_frames=5
+    )
+    assert volumetric_data.shape == (5, 6, 5, 2)
+    np.testing.assert_array_equal(volumetric_data[:], data[:10].reshape(5, 6, 5, 2))
+
+
+def test_raw_binary_microscopy_data_value_error(tmp_path):
+    """Test ValueError for a file that is not made of whole frames, and for too many requested frames."""
+    file_path = tmp_path / "data.bin"
+    _write_raw_binary_file(file_path=file_path, data=np.zeros((4, 3, 3), dtype=np.uint16))
+
+    with pytest.raises(ValueError, match="are not whole frames of shape"):
+        RawBinaryMicroscopyData(file_path=file_path, dtype=np.uint16, frame_shape=(3, 3), header_size_in_bytes=2)
+    with pytest.raises(ValueError, match="has 4 frames, fewer than the 5 requested"):
+        RawBinaryMicroscopyData(file_path=file_path, dtype=np.uint16, frame_shape=(3, 3), number_of_frames=5)
+
+
+def test_microscopy_file_data_requires_read_frames():
+    """Test that a data source which does not implement _read_frames cannot be instantiated."""
+
+    class IncompleteMicroscopyData(_MicroscopyFileData):
+        def __init__(self):
+            self._shape, self._dtype, self._source_kwargs = (4, 3, 3), np.dtype(np.uint16), dict()
+            super().__init__()
+
+    with pytest.raises(TypeError, match="_read_frames"):
+        IncompleteMicroscopyData()
+
+
+@pytest.mark.parametrize("compression", [None, "zlib"])
+def test_tiff_microscopy_data(tmp_path, compression):
+    """Test indexing the frames and volumes of a memory-mapped (uncompressed) and a compressed multi-page TIFF."""
+    tifffile = pytest.importorskip("tifffile")
+    pages = np.random.default_rng(seed=0).integers(low=0, high=4096, size=(12, 6, 5)).astype(np.uint16)
+    file_path = tmp_path / "data.tif"
+    tifffile.imwrite(file_path, pages, compression=compression)
+
+    tiff_data = TiffMicroscopyData(file_path=file_path)
+    assert tiff_data.shape == (12, 6, 5) and tiff_data.dtype == np.uint16
+    assert (tiff_data._memmap is None) == (compression is not None)
+    np.testing.assert_array_equal(tiff_data[:], pages)
+    np.testing.assert_array_equal(tiff_data[5, 2:4], pages[5, 2:4])
+    tiff_data.close()
+
+    volumetric_tiff_data = TiffMicroscopyData(file_path=file_path, number_of_planes=3)
+    expected_volumes = pages.reshape(4, 3, 6, 5).transpose(0, 2, 3, 1)
+    assert volumetric_tiff_data.shape == (4, 6, 5, 3)
+    np.testing.assert_array_equal(volumetric_tiff_data[:], expected_volumes)
+    np.testing.assert_array_equal(volumetric_tiff_data[[3, 1], ..., 2], expected_volumes[[3, 1], ..., 2])
+    volumetric_tiff_data.close()
+
+    with pytest.raises(ValueError, match="which is not a multiple of the 5 planes"):
+        TiffMicroscopyData(file_path=file_path, number_of_planes=5)
+
+
+class TestRawBinaryPlanarMicroscopySeriesRoundtrip(pynwb_TestCase):
+    """Roundtrip test for a PlanarMicroscopySeries written from a raw binary file in buffers of whole frames."""
+
+    def setUp(self):
+        self.nwbfile_path = "test_raw_binary_planar_microscopy_series_roundtrip.nwb"
+        self.raw_file_path = "test_raw_binary_planar_microscopy_series_roundtrip.bin"
+
+    def tearDown(self):
+        pynwb.testing.remove_test_file(self.nwbfile_path)
+        pynwb.testing.remove_test_file(self.raw_file_path)
+
+    def test_roundtrip(self):
+        nwbfile = mock_NWBFile(session_start_time=datetime(2000, 1, 1, tzinfo=UTC))
+        devices = mock_microscope_and_light_paths(nwbfile=nwbfile)
+
+        data = np.random.default_rng(seed=0).integers(low=0, high=4096, size=(50, 16, 12)).astype(np.uint16)
+        _write_raw_binary_file(file_path=self.raw_file_path, data=data)
+        raw_data = RawBinaryMicroscopyData(
+            file_path=self.raw_file_path,
+            dtype=np.uint16,
+            frame_shape=(16, 12),
+            chunk_shape=(4, 16, 12),
+            buffer_size_in_bytes=3 * 4 * 16 * 12 * 2,
+        )
+        assert raw_data.buffer_shape == (12, 16, 12)
+
+        planar_microscopy_series = mock_PlanarMicroscopySeries(
+            name="PlanarMicroscopySeries",
+            planar_imaging_space=mock_PlanarImagingSpace(name="PlanarImagingSpace"),
+            data=H5DataIO(data=raw_data, compression="gzip"),
+            **devices,
+        )
+        nwbfile.add_acquisition(nwbdata=planar_microscopy_series)
+
+        with pynwb.NWBHDF5IO(path=self.nwbfile_path, mode="w") as io:
+            io.write(nwbfile)
+
+        with pynwb.NWBHDF5IO(path=self.nwbfile_path, mode="r", load_namespaces=True) as io:
+            read_nwbfile = io.read()
+            read_data = read_nwbfile.acquisition["PlanarMicroscopySeries"].data
+
+            np.testing.assert_array_equal(read_data[:], data)
+            assert read_data.chunks == (4, 16, 12)
+            assert read_data.compression == "gzip"
+
+
+class TestTiffVolumetricMicroscopySeriesRoundtrip(pynwb_TestCase):
+    """Roundtrip test for a VolumetricMicroscopySeries written from the interleaved planes of a TIFF file."""
+
+    def setUp(self):
+        self.nwbfile_path = "test_tiff_volumetric_microscopy_series_roundtrip.nwb"
+        self.tiff_file_path = "test_tiff_volumetric_microscopy_series_roundtrip.tif"
+
+    def tearDown(self):
+        pynwb.testing.remove_test_file(self.nwbfile_path)
+        pynwb.testing.remove_test_file(self.tiff_file_path)
+
+    def test_roundtrip(self):
+        tifffile = pytest.importorskip("tifffile")
+        nwbfile = mock_NWBFile(session_start_time=datetime(2000, 1, 1, tzinfo=UTC))
+        devices = mock_microscope_and_light_paths(nwbfile=nwbfile)
+
+        pages = np.random.default_rng(seed=0).integers(low=0, high=4096, size=(20, 8, 6)).astype(np.uint16)
+        tifffile.imwrite(self.tiff_file_path, pages)
+        tiff_data = TiffMicroscopyData(file_path=self.tiff_file_path, number_of_planes=2)
+
+        volumetric_microscopy_series = mock_VolumetricMicroscopySeries(
+            name="VolumetricMicroscopySeries",
+            volumetric_imaging_space=mock_VolumetricImagingSpace(name="VolumetricImagingSpace"),
+            data=tiff_data,
+            **devices,
+        )
+        nwbfile.add_acquisition(nwbdata=volumetric_microscopy_series)
+
+        with pynwb.NWBHDF5IO(path=self.nwbfile_path, mode="w") as io:
+            io.write(nwbfile)
+        tiff_data.close()
+
+        with pynwb.NWBHDF5IO(path=self.nwbfile_path, mode="r", load_namespaces=True) as io:
+            read_nwbfile = io.read()
+            read_data = read_nwbfile.acquisition["VolumetricMicroscopySeries"].data
+
+            np.testing.assert_array_equal(read_data[:], pages.reshape(10, 2, 8, 6).transpose(0, 2, 3, 1))
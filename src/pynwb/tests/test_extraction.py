@@ -0,0 +1,257 @@
+"""Test extraction of ROI responses from microscopy series."""
+
+from datetime import datetime
+
+import numpy as np
+import pynwb
+import pytest
+from pynwb.testing import TestCase as pynwb_TestCase
+from pynwb.testing.mock.file import mock_NWBFile
+from pytz import UTC
+
+from ndx_microscopy import Segmentation2D, Segmentation3D
+from ndx_microscopy.extraction import extract_microscopy_response_series
+from ndx_microscopy.testing import (
+    mock_EmissionLightPath,
+    mock_ExcitationLightPath,
+    mock_Microscope,
+    mock_PlanarImagingSpace,
+    mock_PlanarMicroscopySeries,
+    mock_SegmentationContainer,
+    mock_VolumetricImagingSpace,
+    mock_VolumetricMicroscopySeries,
+    mock_microscope_and_light_paths,
+)
+
+
+def _make_planar_segmentation(image_masks, planar_imaging_space):
+    segmentation_2D = Segmentation2D(name="Segmentation2D", description="", planar_imaging_space=planar_imaging_space)
+    pixel_mask, pixel_mask_index = segmentation_2D.image_masks_to_pixel_mask(image_masks)
+    segmentation_2D.add_rois(pixel_mask=pixel_mask, pixel_mask_index=pixel_mask_index)
+    return segmentation_2D
+
+
+def _expected_responses(data, image_masks):
+    flat_masks = image_masks.reshape(image_masks.shape[0], -1)
+    return data.reshape(data.shape[0], -1) @ flat_masks.T / flat_masks.sum(axis=1)
+
+
+def test_extract_planar_microscopy_response_series():
+    """Test chunked extraction from a PlanarMicroscopySeries matches a dense weighted mean."""
+    planar_imaging_space = mock_PlanarImagingSpace()
+    rng = np.random.default_rng(seed=0)
+    data = rng.integers(low=0, high=1000, size=(23, 6, 7)).astype(np.uint16)
+    planar_microscopy_series = mock_PlanarMicroscopySeries(
+        microscope=mock_Microscope(),
+        excitation_light_path=mock_ExcitationLightPath(),
+        planar_imaging_space=planar_imaging_space,
+        emission_light_path=mock_EmissionLightPath(),
+        data=data,
+        rate=30.0,
+    )
+
+    image_masks = np.zeros((3, 6, 7))
+    image_masks[0, :2, :2] = 1.0
+    image_masks[1, 3, 1:6] = rng.random(5)
+    image_masks[2, 5, 6] = 2.0
+    segmentation_2D = _make_planar_segmentation(image_masks=image_masks, planar_imaging_space=planar_imaging_space)
+
+    microscopy_response_series = extract_microscopy_response_series(
+        microscopy_series=planar_microscopy_series, segmentation=segmentation_2D, frames_per_chunk=5, dtype=np.float64
+    )
+
+    np.testing.assert_allclose(microscopy_response_series.data, _expected_responses(data, image_masks), rtol=1e-6)
+    assert microscopy_response_series.rate == 30.0
+    assert microscopy_response_series.rois.table is segmentation_2D
+    assert microscopy_response_series.rois.data == [0, 1, 2]
+
+
+def test_extract_subset_of_rois_from_image_mask():
+    """Test extraction of a subset of ROIs using the image_mask column."""
+    planar_imaging_space = mock_PlanarImagingSpace()
+    data = np.arange(4 * 3 * 3, dtype=float).reshape(4, 3, 3)
+    timestamps = np.array([0.0, 0.1, 0.25, 0.3])
+    planar_microscopy_series = mock_PlanarMicroscopySeries(
+        microscope=mock_Microscope(),
+        excitation_light_path=mock_ExcitationLightPath(),
+        planar_imaging_space=planar_imaging_space,
+        emission_light_path=mock_EmissionLightPath(),
+        data=data,
+        timestamps=timestamps,
+    )
+    segmentation_2D = Segmentation2D(name="Segmentation2D", description="", planar_imaging_space=planar_imaging_space)
+    image_masks = np.zeros((3, 3, 3))
+    image_masks[0, 0, 0] = 1.0
+    image_masks[2, 2, :] = 1.0
+    segmentation_2D.add_rois(image_mask=image_masks)
+
+    microscopy_response_series = extract_microscopy_response_series(
+        microscopy_series=planar_microscopy_series, segmentation=segmentation_2D, rois=[2, 0]
+    )
+
+    np.testing.assert_allclose(
+        microscopy_response_series.data, _expected_responses(data, image_masks[[2, 0]]), rtol=1e-6
+    )
+    np.testing.assert_array_equal(microscopy_response_series.timestamps, timestamps)
+    assert microscopy_response_series.rois.data == [2, 0]
+
+
+def test_extract_volumetric_microscopy_response_series():
+    """Test extraction from a VolumetricMicroscopySeries with a Segmentation3D."""
+    volumetric_imaging_space = mock_VolumetricImagingSpace()
+    rng = np.random.default_rng(seed=0)
+    data = rng.random(size=(7, 4, 3, 2))
+    volumetric_microscopy_series = mock_VolumetricMicroscopySeries(
+        microscope=mock_Microscope(),
+        excitation_light_path=mock_ExcitationLightPath(),
+        volumetric_imaging_space=volumetric_imaging_space,
+        emission_light_path=mock_EmissionLightPath(),
+        data=data,
+    )
+    segmentation_3D = Segmentation3D(
+        name="Segmentation3D", description="", volumetric_imaging_space=volumetric_imaging_space
+    )
+    image_masks = np.zeros((2, 4, 3, 2))
+    image_masks[0, 1:3, 0, 1] = 0.5
+    image_masks[1, 3, 2, :] = 1.0
+    voxel_mask, voxel_mask_index = segmentation_3D.image_masks_to_voxel_mask(image_masks)
+    segmentation_3D.add_rois(voxel_mask=voxel_mask, voxel_mask_index=voxel_mask_index)
+
+    microscopy_response_series = extract_microscopy_response_series(
+        microscopy_series=volumetric_microscopy_series, segmentation=segmentation_3D, frames_per_chunk=3
+    )
+
+    np.testing.assert_allclose(microscopy_response_series.data, _expected_responses(data, image_masks), rtol=1e-6)
+
+
+def test_parallel_extraction_matches_serial_extraction():
+    """Test that distributing blocks of frames across processes gives the same responses as the serial path."""
+    planar_imaging_space = mock_PlanarImagingSpace()
+    data = np.random.default_rng(seed=0).random(size=(31, 5, 5))
+    planar_microscopy_series = mock_PlanarMicroscopySeries(
+        microscope=mock_Microscope(),
+        excitation_light_path=mock_ExcitationLightPath(),
+        planar_imaging_space=planar_imaging_space,
+        emission_light_path=mock_EmissionLightPath(),
+        data=data,
+    )
+    image_masks = np.zeros((2, 5, 5))
+    image_masks[0, 1:4, 1:4] = 1.0
+    image_masks[1, 0, :] = 0.25
+    segmentation_2D = _make_planar_segmentation(image_masks=image_masks, planar_imaging_space=planar_imaging_space)
+
+    serial_responses = extract_microscopy_response_series(
+        microscopy_series=planar_microscopy_series, segmentation=segmentation_2D, frames_per_chunk=4
+    )
+    parallel_responses = extract_microscopy_response_series(
+        microscopy_series=planar_microscopy_series, segmentation=segmentation_2D, frames_per_chunk=4, max_workers=2
+    )
+
+    np.testing.assert_array_equal(parallel_responses.data, serial_responses.data)
+
+
+def test_extract_mismatched_segmentation_value_error():
+    """Test ValueError when the segmentation does not match the dimensionality of the series."""
+    planar_microscopy_series = mock_PlanarMicroscopySeries(
+        microscope=mock_Microscope(),
+        excitation_light_path=mock_ExcitationLightPath(),
+        planar_imaging_space=mock_PlanarImagingSpace(),
+        emission_light_path=mock_EmissionLightPath(),
+    )
+    segmentation_3D = Segmentation3D(
+        name="Segmentation3D", description="", volumetric_imaging_space=mock_VolumetricImagingSpace()
+    )
+
+    with pytest.raises(ValueError, match="A PlanarMicroscopySeries requires a Segmentation2D"):
+        extract_microscopy_response_series(microscopy_series=planar_microscopy_series, segmentation=segmentation_3D)
+
+
+def test_extract_max_workers_value_error():
+    """Test ValueError for fewer than one worker."""
+    planar_imaging_space = mock_PlanarImagingSpace()
+    planar_microscopy_series = mock_PlanarMicroscopySeries(
+        microscope=mock_Microscope(),
+        excitation_light_path=mock_ExcitationLightPath(),
+        planar_imaging_space=planar_imaging_space,
+        emission_light_path=mock_EmissionLightPath(),
+        data=np.zeros((4, 5, 5)),
+    )
+    segmentation_2D = _make_planar_segmentation(
+        image_masks=np.ones((1, 5, 5)), planar_imaging_space=planar_imaging_space
+    )
+
+    with pytest.raises(ValueError, match="'max_workers' must be at least 1, got 0."):
+        extract_microscopy_response_series(
+            microscopy_series=planar_microscopy_series, segmentation=segmentation_2D, max_workers=0
+        )
+
+
+class TestExtractionFromFileRoundtrip(pynwb_TestCase):
+    """Test extraction from a PlanarMicroscopySeries read back from an NWB file."""
+
+    def setUp(self):
+        self.nwbfile_path = "test_extraction_from_file.nwb"
+
+    def tearDown(self):
+        pynwb.testing.remove_test_file(self.nwbfile_path)
+
+    def test_roundtrip(self):
+        nwbfile = mock_NWBFile(session_start_time=datetime(2000, 1, 1, tzinfo=UTC))
+
+        devices = mock_microscope_and_light_paths(nwbfile=nwbfile)
+
+        planar_imaging_space = mock_PlanarImagingSpace(name="PlanarImagingSpace")
+        data = np.random.default_rng(seed=0).random(size=(40, 8, 8))
+        planar_microscopy_series = mock_PlanarMicroscopySeries(
+            name="PlanarMicroscopySeries",
+            planar_imaging_space=planar_imaging_space,
+            data=pynwb.H5DataIO(data=data, chunks=(4, 8, 8)),
+            **devices,
+        )
+        nwbfile.add_acquisition(nwbdata=planar_microscopy_series)
+
+        image_masks = np.zeros((5, 8, 8))
+        for roi_index in range(5):
+            image_masks[roi_index, roi_index : roi_index + 2, roi_index : roi_index + 3] = roi_index + 1
+        segmentation_2D = _make_planar_segmentation(image_masks=image_masks, planar_imaging_space=planar_imaging_space)
+        ophys_module = nwbfile.create_processing_module(name="ophys", description="")
+        ophys_module.add(mock_SegmentationContainer(name="SegmentationContainer", segmentations=[segmentation_2D]))
+
+        with pynwb.NWBHDF5IO(path=self.nwbfile_path, mode="w") as io:
+            io.write(nwbfile)
+
+        with pynwb.NWBHDF5IO(path=self.nwbfile_path, mode="r", load_namespaces=True) as io:
+            read_nwbfile = io.read()
+            read_segmentation_2D = read_nwbfile.processing["ophys"]["SegmentationContainer"].segmentations[
+                "Segmentation2D"
+            ]
+
+            microscopy_response_series = extract_microscopy_response_series(
+                microscopy_series=read_nwbfile.acquisition["PlanarMicroscopySeries"],
+                segmentation=read_segmentation_2D,
+                frames_per_chunk=6,
+            )
+
+            np.testing.assert_allclose(
+                microscopy_response_series.data, _expected_responses(data, image_masks), rtol=1e-6
+            )
+            assert microscopy_response_series.rois.table is read_segmentation_2D
+
+            parallel_microscopy_response_series = extract_microscopy_response_series(
+                microscopy_series=read_nwbfile.acquisition["PlanarMicroscopySeries"],
+                segmentation=read_segmentation_2D,
+                frames_per_chunk=6,
+                max_workers=2,
+            )
+            np.testing.assert_array_equal(parallel_microscopy_response_series.data, microscopy_response_series.data)
+
+        # Workers cannot open a file the parent holds open for writing, so its frames are sent to them instead
+        with pynwb.NWBHDF5IO(path=self.nwbfile_path, mode="a", load_namespaces=True) as io:
+            read_nwbfile = io.read()
+            appendable_microscopy_response_series = extract_microscopy_response_series(
+                microscopy_series=read_nwbfile.acquisition["PlanarMicroscopySeries"],
+                segmentation=read_nwbfile.processing["ophys"]["SegmentationContainer"].segmentations["Segmentation2D"],
+                frames_per_chunk=6,
+                max_workers=2,
+            )
+            np.testing.assert_array_equal(appendable_microscopy_response_series.data, microscopy_response_series.data)
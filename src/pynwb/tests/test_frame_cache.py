@@ -0,0 +1,122 @@
+"""Test the cached frame reader of microscopy series."""
+
+from datetime import datetime
+
+import numpy as np
+import pynwb
+import pytest
+from hdmf.backends.hdf5 import H5DataIO
+from pynwb.testing import TestCase as pynwb_TestCase
+from pynwb.testing.mock.file import mock_NWBFile
+from pytz import UTC
+
+from ndx_microscopy.testing import (
+    mock_EmissionLightPath,
+    mock_ExcitationLightPath,
+    mock_Microscope,
+    mock_PlanarImagingSpace,
+    mock_PlanarMicroscopySeries,
+    mock_microscope_and_light_paths,
+)
+
+
+def _mock_planar_microscopy_series(data):
+    return mock_PlanarMicroscopySeries(
+        microscope=mock_Microscope(),
+        excitation_light_path=mock_ExcitationLightPath(),
+        planar_imaging_space=mock_PlanarImagingSpace(),
+        emission_light_path=mock_EmissionLightPath(),
+        data=data,
+    )
+
+
+def test_cached_frame_reader_hits_and_misses():
+    """Test that frames are read a block at a time and that repeated accesses hit the cache."""
+    data = np.random.default_rng(seed=0).random(size=(20, 8, 6))
+    planar_microscopy_series = _mock_planar_microscopy_series(data=data)
+
+    with planar_microscopy_series.get_cached_frame_reader(frames_per_block=4, prefetch=False) as reader:
+        np.testing.assert_array_equal(reader[5], data[5])
+        np.testing.assert_array_equal(reader[6], data[6])
+        np.testing.assert_array_equal(reader[-1], data[-1])
+        np.testing.assert_array_equal(reader[3:9], data[3:9])
+        np.testing.assert_array_equal(reader[[19, 0]], data[[19, 0]])
+
+        assert (reader.misses, reader.hits) == (4, 7)
+        assert reader.cache_size_in_bytes == 4 * data[:4].nbytes
+        assert len(reader) == 20 and reader.shape == data.shape
+
+        reader.clear()
+        assert (reader.misses, reader.hits, reader.cache_size_in_bytes) == (0, 0, 0)
+
+
+def test_cached_frame_reader_is_bounded():
+    """Test that the least recently used blocks are dropped to stay within the cache size."""
+    data = np.zeros((20, 8, 6))
+    block_size_in_bytes = data[:4].nbytes
+    planar_microscopy_series = _mock_planar_microscopy_series(data=data)
+
+    reader = planar_microscopy_series.get_cached_frame_reader(
+        max_cache_size_in_bytes=2 * block_size_in_bytes, frames_per_block=4, prefetch=False
+    )
+    reader[0], reader[4], reader[0], reader[8]  # Block 1 is the least recently used when block 2 is added
+    assert reader.cache_size_in_bytes == 2 * block_size_in_bytes
+    reader[0]
+    reader[4]
+    assert (reader.misses, reader.hits) == (4, 2)
+
+
+def test_cached_frame_reader_prefetches_adjacent_blocks():
+    """Test that the blocks adjacent to an accessed block are read in the background."""
+    data = np.random.default_rng(seed=0).random(size=(20, 8, 6))
+    planar_microscopy_series = _mock_planar_microscopy_series(data=data)
+
+    with planar_microscopy_series.get_cached_frame_reader(frames_per_block=4) as reader:
+        reader[9]
+        reader._wait_for_prefetches()
+        np.testing.assert_array_equal(reader[4:13], data[4:13])
+        assert (reader.misses, reader.hits) == (1, 9)
+
+
+def test_get_cached_frame_reader_value_error():
+    """Test ValueError for an invalid block length."""
+    planar_microscopy_series = _mock_planar_microscopy_series(data=np.zeros((3, 4, 4)))
+    with pytest.raises(ValueError, match="'frames_per_block' must be positive"):
+        planar_microscopy_series.get_cached_frame_reader(frames_per_block=0)
+
+
+class TestCachedFrameReaderRoundtrip(pynwb_TestCase):
+    """Test the cached frame reader on a chunked dataset read back from a file."""
+
+    def setUp(self):
+        self.nwbfile_path = "test_cached_frame_reader_roundtrip.nwb"
+
+    def tearDown(self):
+        pynwb.testing.remove_test_file(self.nwbfile_path)
+
+    def test_roundtrip(self):
+        nwbfile = mock_NWBFile(session_start_time=datetime(2000, 1, 1, tzinfo=UTC))
+        devices = mock_microscope_and_light_paths(nwbfile=nwbfile)
+
+        data = np.random.default_rng(seed=0).integers(low=0, high=4096, size=(30, 16, 12)).astype(np.uint16)
+        planar_microscopy_series = mock_PlanarMicroscopySeries(
+            name="PlanarMicroscopySeries",
+            planar_imaging_space=mock_PlanarImagingSpace(name="PlanarImagingSpace"),
+            data=H5DataIO(data=data, chunks=(7, 16, 12), compression="gzip"),
+            **devices,
+        )
+        nwbfile.add_acquisition(nwbdata=planar_microscopy_series)
+
+        with pynwb.NWBHDF5IO(path=self.nwbfile_path, mode="w") as io:
+            io.write(nwbfile)
+
+        with pynwb.NWBHDF5IO(path=self.nwbfile_path, mode="r", load_namespaces=True) as io:
+            read_nwbfile = io.read()
+            read_planar_microscopy_series = read_nwbfile.acquisition["PlanarMicroscopySeries"]
+
+            with read_planar_microscopy_series.get_cached_frame_reader() as reader:
+                assert reader.frames_per_block == 7
+                np.testing.assert_array_equal(np.stack([reader[frame] for frame in range(30)]), data)
+                np.testing.assert_array_equal(reader[::-1], data[::-1])
+                assert reader.misses + reader.hits == 60
+                assert reader.misses <= 5
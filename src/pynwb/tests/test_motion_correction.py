@@ -0,0 +1,182 @@
+"""Test the rigid motion correction of planar microscopy series."""
+
+import threading
+from datetime import datetime
+
+import numpy as np
+import pynwb
+import pytest
+from hdmf.backends.hdf5 import H5DataIO
+from pynwb.testing import TestCase as pynwb_TestCase
+from pynwb.testing.mock.file import mock_NWBFile
+from pytz import UTC
+from scipy.ndimage import gaussian_filter
+
+from ndx_microscopy import SummaryImage
+from ndx_microscopy.motion_correction import (
+    _apply_shifts,
+    _estimate_shifts,
+    _get_search_mask,
+    correct_rigid_motion,
+)
+from ndx_microscopy.testing import (
+    mock_EmissionLightPath,
+    mock_ExcitationLightPath,
+    mock_Microscope,
+    mock_PlanarImagingSpace,
+    mock_PlanarMicroscopySeries,
+    mock_microscope_and_light_paths,
+)
+
+
+def _mock_reference_image(shape=(32, 40)):
+    return 100.0 + 1000.0 * gaussian_filter(np.random.default_rng(seed=0).random(size=shape), sigma=2.0)
+
+
+def _shift_frames(reference_image, shifts):
+    """Move the reference image by each integer (x, y) shift, wrapping around the edges."""
+    return np.stack([np.roll(reference_image, shift=shift, axis=(0, 1)) for shift in shifts])
+
+
+def test_correct_rigid_motion():
+    """Test estimating and undoing integer shifts of a uint16 series, in blocks across two threads."""
+    reference_image = _mock_reference_image()
+    shifts = np.random.default_rng(seed=1).integers(low=-4, high=5, size=(25, 2))
+    data = np.round(_shift_frames(reference_image=reference_image, shifts=shifts)).astype(np.uint16)
+    planar_microscopy_series = mock_PlanarMicroscopySeries(
+        name="PlanarMicroscopySeries",
+        microscope=mock_Microscope(),
+        excitation_light_path=mock_ExcitationLightPath(),
+        planar_imaging_space=mock_PlanarImagingSpace(),
+        emission_light_path=mock_EmissionLightPath(),
+        data=data,
+        rate=30.0,
+    )
+
+    active_threads = threading.active_count()
+    corrected_series, shifts_series = correct_rigid_motion(
+        planar_microscopy_series=planar_microscopy_series,
+        reference_image=SummaryImage(name="mean", description="", data=reference_image),
+        max_shift=(6, 6),
+        frames_per_chunk=4,
+        max_workers=2,
+    )
+    # No thread is left running until the corrected series is written
+    assert threading.active_count() == active_threads
+
+    # The shifts are estimated when called, while the corrected frames are streamed one storage chunk at a time
+    np.testing.assert_allclose(shifts_series.data, shifts, atol=0.01)
+    corrected_frames = np.concatenate([data_chunk.data for data_chunk in corrected_series.data.data])
+    interior = (slice(None), slice(4, -4), slice(4, -4))
+    expected_frames = np.broadcast_to(np.round(reference_image), data.shape)
+    np.testing.assert_allclose(corrected_frames[interior], expected_frames[interior], atol=1)
+    assert corrected_frames.dtype == np.uint16
+    assert corrected_series.name == "PlanarMicroscopySeriesMotionCorrected" and corrected_series.rate == 30.0
+    assert shifts_series.name == "PlanarMicroscopySeriesMotionShifts" and shifts_series.unit == "pixels"
+
+
+def test_estimate_and_apply_subpixel_shifts():
+    """Test the subpixel estimate of shifts within the search range, and the blanking of wrapped pixels."""
+    reference_image = _mock_reference_image()
+    frame_shape = reference_image.shape
+    shifts = np.array([[2.5, -1.25], [-3.0, 0.5], [0.0, 0.0]])
+    frequencies = (np.fft.fftfreq(frame_shape[0])[:, None], np.fft.rfftfreq(frame_shape[1])[None, :])
+    frames = np.stack(
+        [
+            np.fft.irfft2(
+                np.fft.rfft2(reference_image) * np.exp(-2j * np.pi * (x * frequencies[0] + y * frequencies[1])),
+                s=frame_shape,
+            )
+            for x, y in shifts
+        ]
+    )
+    reference_fft = np.conj(np.fft.rfft2(reference_image - reference_image.mean()))
+
+    estimated_shifts = _estimate_shifts(
+        frames=frames,
+        reference_fft=reference_fft,
+        search_mask=_get_search_mask(frame_shape=frame_shape, max_shift=(4, 4)),
+    )
+    corrected_frames = _apply_shifts(frames=frames, shifts=estimated_shifts, dtype=np.dtype(np.float64))
+
+    np.testing.assert_allclose(estimated_shifts, shifts, atol=0.25)
+    assert np.all(corrected_frames[0, -3:] == 0) and np.all(corrected_frames[0, :, :2] == 0)
+    assert np.all(corrected_frames[1, :3] == 0) and np.all(corrected_frames[1, :, -1:] == 0)
+    np.testing.assert_allclose(corrected_frames[2], reference_image, rtol=1e-5)
+
+
+def test_correct_rigid_motion_value_error():
+    """Test ValueError for a reference image that does not have the shape of the frames."""
+    planar_microscopy_series = mock_PlanarMicroscopySeries(
+        microscope=mock_Microscope(),
+        excitation_light_path=mock_ExcitationLightPath(),
+        planar_imaging_space=mock_PlanarImagingSpace(),
+        emission_light_path=mock_EmissionLightPath(),
+        data=np.zeros((5, 8, 6)),
+    )
+    with pytest.raises(ValueError, match="'reference_image' must have the shape of the frames"):
+        correct_rigid_motion(planar_microscopy_series=planar_microscopy_series, reference_image=np.zeros((6, 8)))
+
+
+class TestRigidMotionCorrectedPlanarMicroscopySeriesRoundtrip(pynwb_TestCase):
+    """Roundtrip test for a motion corrected PlanarMicroscopySeries and its shifts, written from a file."""
+
+    def setUp(self):
+        self.nwbfile_path = "test_rigid_motion_corrected_planar_microscopy_series_roundtrip.nwb"
+
+    def tearDown(self):
+        pynwb.testing.remove_test_file(self.nwbfile_path)
+
+    def _test_roundtrip(self, shifts_first):
+        nwbfile = mock_NWBFile(session_start_time=datetime(2000, 1, 1, tzinfo=UTC))
+        devices = mock_microscope_and_light_paths(nwbfile=nwbfile)
+
+        reference_image = _mock_reference_image()
+        shifts = np.random.default_rng(seed=2).integers(low=-3, high=4, size=(30, 2))
+        data = _shift_frames(reference_image=reference_image, shifts=shifts).astype(np.float32)
+        timestamps = np.arange(30) / 15.0 + 2.0
+        planar_microscopy_series = mock_PlanarMicroscopySeries(
+            name="PlanarMicroscopySeries",
+            planar_imaging_space=mock_PlanarImagingSpace(name="PlanarImagingSpace"),
+            data=H5DataIO(data=data, chunks=(5, 32, 40)),
+            rate=None,
+            timestamps=timestamps,
+            **devices,
+        )
+        nwbfile.add_acquisition(nwbdata=planar_microscopy_series)
+
+        with pynwb.NWBHDF5IO(path=self.nwbfile_path, mode="w") as io:
+            io.write(nwbfile)
+
+        with pynwb.NWBHDF5IO(path=self.nwbfile_path, mode="a", load_namespaces=True) as io:
+            read_nwbfile = io.read()
+            corrected_series, shifts_series = correct_rigid_motion(
+                planar_microscopy_series=read_nwbfile.acquisition["PlanarMicroscopySeries"],
+                reference_image=reference_image,
+                max_workers=2,
+            )
+            ophys_module = read_nwbfile.create_processing_module(name="ophys", description="")
+            for series in [shifts_series, corrected_series] if shifts_first else [corrected_series, shifts_series]:
+                ophys_module.add(series)
+            io.write(read_nwbfile)
+
+        with pynwb.NWBHDF5IO(path=self.nwbfile_path, mode="r", load_namespaces=True) as io:
+            read_nwbfile = io.read()
+            read_corrected_series = read_nwbfile.processing["ophys"]["PlanarMicroscopySeriesMotionCorrected"]
+            read_shifts_series = read_nwbfile.processing["ophys"]["PlanarMicroscopySeriesMotionShifts"]
+
+            np.testing.assert_allclose(read_shifts_series.data[:], shifts, atol=1e-3)
+            np.testing.assert_allclose(
+                read_corrected_series.data[:, 3:-3, 3:-3], [reference_image[3:-3, 3:-3]] * 30, rtol=1e-4
+            )
+            np.testing.assert_array_equal(read_corrected_series.timestamps[:], timestamps)
+            np.testing.assert_array_equal(read_shifts_series.timestamps[:], timestamps)
+            assert read_corrected_series.planar_imaging_space.name == "PlanarImagingSpace"
+            assert read_corrected_series.microscope.name == "Microscope"
+
+    def test_roundtrip(self):
+        self._test_roundtrip(shifts_first=False)
+
+    def test_roundtrip_shifts_first(self):
+        """Test writing the shifts before the corrected series, which then reads the series a second time."""
+        self._test_roundtrip(shifts_first=True)
@@ -0,0 +1,269 @@
+"""Test the multi-resolution pyramids of planar microscopy series."""
+
+from datetime import datetime
+from unittest import mock
+
+import numpy as np
+import pynwb
+import pytest
+from hdmf.backends.hdf5 import H5DataIO
+from pynwb.testing import TestCase as pynwb_TestCase
+from pynwb.testing.mock.file import mock_NWBFile
+from pytz import UTC
+
+from ndx_microscopy import pyramid
+from ndx_microscopy.pyramid import (
+    create_pyramid_microscopy_series,
+    get_pyramid_levels,
+    select_pyramid_level,
+    stream_microscopy_pyramid,
+)
+from ndx_microscopy.testing import (
+    mock_EmissionLightPath,
+    mock_ExcitationLightPath,
+    mock_Microscope,
+    mock_PlanarImagingSpace,
+    mock_PlanarMicroscopySeries,
+    mock_microscope_and_light_paths,
+)
+
+
+def _expected_level(data, factor):
+    """Average blocks of factor x factor pixels one block at a time, rounding to the data type."""
+    height, width = -(-data.shape[1] // factor), -(-data.shape[2] // factor)
+    level = np.empty((data.shape[0], height, width))
+    for row in range(height):
+        for column in range(width):
+            block = data[:, row * factor : (row + 1) * factor, column * factor : (column + 1) * factor]
+            level[:, row, column] = block.mean(axis=(1, 2))
+    return np.round(level).astype(data.dtype)
+
+
+class _RecordedPyramidFrames(pyramid._PyramidFrames):
+    """Keep the instances created, to check the lengths of their queues once written."""
+
+    instances = list()
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.instances.append(self)
+
+
+def test_create_pyramid_microscopy_series():
+    """Test the names, imaging spaces and timing of the levels of a series."""
+    planar_imaging_space = mock_PlanarImagingSpace(pixel_size_in_um=[0.5, 0.75])
+    planar_microscopy_series = mock_PlanarMicroscopySeries(
+        name="PlanarMicroscopySeries",
+        microscope=mock_Microscope(),
+        excitation_light_path=mock_ExcitationLightPath(),
+        planar_imaging_space=planar_imaging_space,
+        emission_light_path=mock_EmissionLightPath(),
+        data=np.zeros((3, 20, 12), dtype=np.uint16),
+        rate=10.0,
+    )
+
+    pyramid_levels = create_pyramid_microscopy_series(
+        planar_microscopy_series=planar_microscopy_series, downsampling_factors=[2, 8]
+    )
+
+    assert [level.name for level in pyramid_levels] == [
+        "PlanarMicroscopySeriesDownsampled2",
+        "PlanarMicroscopySeriesDownsampled8",
+    ]
+    np.testing.assert_array_equal(pyramid_levels[1].planar_imaging_space.pixel_size_in_um, [4.0, 6.0])
+    assert pyramid_levels[1].planar_imaging_space.location == planar_imaging_space.location
+    assert pyramid_levels[1].rate == 10.0
+    assert pyramid_levels[1].data.data.maxshape == (3, 3, 2)
+
+    with pytest.raises(ValueError, match="'downsampling_factors' must be integers of at least 2"):
+        create_pyramid_microscopy_series(planar_microscopy_series=planar_microscopy_series, downsampling_factors=[1])
+
+
+def test_select_pyramid_level():
+    """Test that the coarsest level keeping at least the on-screen resolution is selected."""
+    nwbfile = mock_NWBFile()
+    planar_microscopy_series = mock_PlanarMicroscopySeries(
+        name="PlanarMicroscopySeries",
+        microscope=mock_Microscope(),
+        excitation_light_path=mock_ExcitationLightPath(),
+        planar_imaging_space=mock_PlanarImagingSpace(),
+        emission_light_path=mock_EmissionLightPath(),
+        data=np.zeros((2, 1000, 800), dtype=np.uint16),
+    )
+    nwbfile.add_acquisition(nwbdata=planar_microscopy_series)
+    for level in create_pyramid_microscopy_series(planar_microscopy_series=planar_microscopy_series):
+        nwbfile.add_acquisition(nwbdata=level)
+
+    assert [factor for factor, _ in get_pyramid_levels(planar_microscopy_series)] == [1, 2, 4, 8]
+    factor, level = select_pyramid_level(planar_microscopy_series, screen_shape=(240, 200))
+    assert (factor, level.name) == (4, "PlanarMicroscopySeriesDownsampled4")
+    assert select_pyramid_level(planar_microscopy_series, screen_shape=(100, 100))[0] == 8
+    assert select_pyramid_level(planar_microscopy_series, screen_shape=(1000, 800))[0] == 1
+    assert select_pyramid_level(planar_microscopy_series, screen_shape=(200, 200), region_shape=(400, 400))[0] == 2
+
+
+class TestStreamedPyramidRoundtrip(pynwb_TestCase):
+    """Roundtrip test for a PlanarMicroscopySeries streamed with its pyramid levels in one pass over the frames."""
+
+    def setUp(self):
+        self.nwbfile_path = "test_streamed_pyramid_roundtrip.nwb"
+
+    def tearDown(self):
+        pynwb.testing.remove_test_file(self.nwbfile_path)
+
+    def test_roundtrip(self):
+        nwbfile = mock_NWBFile(session_start_time=datetime(2000, 1, 1, tzinfo=UTC))
+        devices = mock_microscope_and_light_paths(nwbfile=nwbfile)
+
+        data = np.random.default_rng(seed=0).integers(low=0, high=4096, size=(11, 18, 13)).astype(np.uint16)
+        frames_read = list()
+
+        def read_frames():
+            for frame_index, frame in enumerate(data):
+                frames_read.append(frame_index)
+                yield frame
+
+        _RecordedPyramidFrames.instances.clear()
+        with mock.patch.object(pyramid, "_PyramidFrames", _RecordedPyramidFrames):
+            full_resolution_data, *level_data = stream_microscopy_pyramid(
+                read_frames(), downsampling_factors=[2, 4], frames_per_chunk=3
+            )
+        planar_microscopy_series = mock_PlanarMicroscopySeries(
+            name="PlanarMicroscopySeries",
+            planar_imaging_space=mock_PlanarImagingSpace(name="PlanarImagingSpace", pixel_size_in_um=[1.0, 1.0]),
+            data=full_resolution_data,
+            rate=30.0,
+            **devices,
+        )
+        nwbfile.add_acquisition(nwbdata=planar_microscopy_series)
+        for level in create_pyramid_microscopy_series(
+            planar_microscopy_series=planar_microscopy_series, downsampling_factors=[2, 4], level_data=level_data
+        ):
+            nwbfile.add_acquisition(nwbdata=level)
+
+        with pynwb.NWBHDF5IO(path=self.nwbfile_path, mode="w") as io:
+            io.write(nwbfile, exhaust_dci=False)
+        assert frames_read == list(range(11))
+        # Written one chunk of each level at a time, no level waits for more than about one chunk of frames
+        assert _RecordedPyramidFrames.instances[0].max_queue_length <= 3
+        assert _RecordedPyramidFrames.instances[0].number_of_spilled_frames == 0
+
+        with pynwb.NWBHDF5IO(path=self.nwbfile_path, mode="r", load_namespaces=True) as io:
+            read_nwbfile = io.read()
+            read_planar_microscopy_series = read_nwbfile.acquisition["PlanarMicroscopySeries"]
+            np.testing.assert_array_equal(read_planar_microscopy_series.data[:], data)
+
+            factor, read_level = select_pyramid_level(read_planar_microscopy_series, screen_shape=(4, 3))
+            assert factor == 4
+            np.testing.assert_array_equal(read_level.data[:], _expected_level(data=data, factor=4))
+            assert read_level.data.chunks == (3, 5, 4)
+            np.testing.assert_array_equal(read_level.planar_imaging_space.pixel_size_in_um, [4.0, 4.0])
+            read_level = read_nwbfile.acquisition["PlanarMicroscopySeriesDownsampled2"]
+            np.testing.assert_array_equal(read_level.data[:], _expected_level(data=data, factor=2))
+
+
+class TestStreamedPyramidDefaultWriteRoundtrip(pynwb_TestCase):
+    """Roundtrip test for streamed pyramid levels written one after the other, by the default io.write."""
+
+    def setUp(self):
+        self.nwbfile_path = "test_streamed_pyramid_default_write_roundtrip.nwb"
+
+    def tearDown(self):
+        pynwb.testing.remove_test_file(self.nwbfile_path)
+
+    def test_roundtrip(self):
+        nwbfile = mock_NWBFile(session_start_time=datetime(2000, 1, 1, tzinfo=UTC))
+        devices = mock_microscope_and_light_paths(nwbfile=nwbfile)
+
+        data = np.random.default_rng(seed=0).integers(low=0, high=4096, size=(200, 8, 8)).astype(np.uint16)
+        _RecordedPyramidFrames.instances.clear()
+        with mock.patch.object(pyramid, "_PyramidFrames", _RecordedPyramidFrames):
+            full_resolution_data, *level_data = stream_microscopy_pyramid(
+                iter(data), downsampling_factors=[2, 4], frames_per_chunk=5
+            )
+        planar_microscopy_series = mock_PlanarMicroscopySeries(
+            name="PlanarMicroscopySeries",
+            planar_imaging_space=mock_PlanarImagingSpace(name="PlanarImagingSpace"),
+            data=full_resolution_data,
+            **devices,
+        )
+        nwbfile.add_acquisition(nwbdata=planar_microscopy_series)
+        for level in create_pyramid_microscopy_series(
+            planar_microscopy_series=planar_microscopy_series, downsampling_factors=[2, 4], level_data=level_data
+        ):
+            nwbfile.add_acquisition(nwbdata=level)
+
+        with pynwb.NWBHDF5IO(path=self.nwbfile_path, mode="w") as io:
+            io.write(nwbfile)
+        # The levels written last wait in a temporary file, with at most two chunks of frames in memory
+        pyramid_frames = _RecordedPyramidFrames.instances[0]
+        assert pyramid_frames.max_queue_length <= 10
+        assert pyramid_frames.number_of_spilled_frames > 0
+
+        with pynwb.NWBHDF5IO(path=self.nwbfile_path, mode="r", load_namespaces=True) as io:
+            read_nwbfile = io.read()
+            np.testing.assert_array_equal(read_nwbfile.acquisition["PlanarMicroscopySeries"].data[:], data)
+            for factor in (2, 4):
+                read_level = read_nwbfile.acquisition[f"PlanarMicroscopySeriesDownsampled{factor}"]
+                np.testing.assert_array_equal(read_level.data[:], _expected_level(data=data, factor=factor))
+
+
+class TestPyramidFromWrittenSeriesRoundtrip(pynwb_TestCase):
+    """Roundtrip test for pyramid levels added to a PlanarMicroscopySeries read back from a file, in one pass."""
+
+    def setUp(self):
+        self.nwbfile_path = "test_pyramid_from_written_series_roundtrip.nwb"
+
+    def tearDown(self):
+        pynwb.testing.remove_test_file(self.nwbfile_path)
+
+    def test_roundtrip(self):
+        nwbfile = mock_NWBFile(session_start_time=datetime(2000, 1, 1, tzinfo=UTC))
+        devices = mock_microscope_and_light_paths(nwbfile=nwbfile)
+
+        data = np.random.default_rng(seed=0).random(size=(7, 16, 16)).astype(np.float32)
+        planar_microscopy_series = mock_PlanarMicroscopySeries(
+            name="PlanarMicroscopySeries",
+            planar_imaging_space=mock_PlanarImagingSpace(name="PlanarImagingSpace"),
+            data=H5DataIO(data=data, chunks=(2, 16, 16)),
+            **devices,
+        )
+        nwbfile.add_acquisition(nwbdata=planar_microscopy_series)
+
+        with pynwb.NWBHDF5IO(path=self.nwbfile_path, mode="w") as io:
+            io.write(nwbfile)
+
+        _RecordedPyramidFrames.instances.clear()
+        frames_read = list()
+        iter_frames = pyramid._iter_frames
+
+        def record_iter_frames(data, frames_per_chunk):
+            for frame in iter_frames(data=data, frames_per_chunk=frames_per_chunk):
+                frames_read.append(frame)
+                yield frame
+
+        with pynwb.NWBHDF5IO(path=self.nwbfile_path, mode="a", load_namespaces=True) as io:
+            read_nwbfile = io.read()
+            with mock.patch.object(pyramid, "_PyramidFrames", _RecordedPyramidFrames), mock.patch.object(
+                pyramid, "_iter_frames", record_iter_frames
+            ):
+                pyramid_levels = create_pyramid_microscopy_series(
+                    planar_microscopy_series=read_nwbfile.acquisition["PlanarMicroscopySeries"],
+                    frames_per_chunk=2,
+                    compression=None,
+                )
+            for level in pyramid_levels:
+                read_nwbfile.add_acquisition(nwbdata=level)
+            assert frames_read == []
+            io.write(read_nwbfile)
+        # All the levels are computed from a single pass over the series
+        assert len(frames_read) == 7
+        assert _RecordedPyramidFrames.instances[0].number_of_spilled_frames > 0
+
+        with pynwb.NWBHDF5IO(path=self.nwbfile_path, mode="r", load_namespaces=True) as io:
+            read_nwbfile = io.read()
+            pyramid_levels = get_pyramid_levels(read_nwbfile.acquisition["PlanarMicroscopySeries"])
+            assert [factor for factor, _ in pyramid_levels] == [1, 2, 4, 8]
+            for factor, level in pyramid_levels[1:]:
+                expected_level = data.reshape(7, 16 // factor, factor, 16 // factor, factor).mean(axis=(2, 4))
+                np.testing.assert_allclose(level.data[:], expected_level, rtol=1e-6)
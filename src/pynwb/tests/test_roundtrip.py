@@ -1,7 +1,13 @@
 """Test roundtrip (write and read back) of the Python API for the ndx-microscopy extension."""
 
+import os
+import shutil
+import time
 from datetime import datetime
 
+import h5py
+import numpy as np
+
 from pytz import UTC
 import pytest
 from pynwb.testing import TestCase as pynwb_TestCase
@@ -17,8 +23,12 @@ from ndx_ophys_devices.testing import (
 from ndx_microscopy.testing import (
     mock_EmissionLightPath,
     mock_ExcitationLightPath,
+    mock_LineScan,
     mock_Microscope,
+    mock_PlaneAcquisition,
+    mock_RandomAccessScan,
     mock_Segmentation2D,
+    mock_Segmentation3D,
     mock_SegmentationContainer,
     mock_PlanarImagingSpace,
     mock_VolumetricImagingSpace,
@@ -26,8 +36,23 @@ from ndx_microscopy.testing import (
     mock_MultiPlaneMicroscopyContainer,
     mock_VolumetricMicroscopySeries,
     mock_MicroscopyResponseSeries,
+    mock_microscope_and_light_paths,
+)
+from ndx_microscopy import MicroscopyResponseSeriesContainer, Segmentation2D
+from ndx_microscopy.chunking import recommend_data_io_settings
+from ndx_microscopy.data_sources import RawBinaryMicroscopyData
+
+try:
+    from hdmf_zarr.nwb import NWBZarrIO
+except ImportError:
+    NWBZarrIO = None
+
+requires_hdmf_zarr = pytest.mark.skipif(NWBZarrIO is None, reason="hdmf-zarr is not installed")
+
+# Timed benchmarks are only run on request, e.g., NDX_MICROSCOPY_BENCHMARK=1 pytest, as timings vary across machines
+requires_benchmark = pytest.mark.skipif(
+    not os.environ.get("NDX_MICROSCOPY_BENCHMARK"), reason="set NDX_MICROSCOPY_BENCHMARK=1 to run benchmarks"
 )
-from ndx_microscopy import MicroscopyResponseSeriesContainer
 
 
 class TestPlanarMicroscopySeriesSimpleRoundtrip(pynwb_TestCase):
@@ -236,6 +261,43 @@ class TestVolumetricMicroscopySeriesSimpleRoundtrip(pynwb_TestCase):
             )
 
 
+class TestVolumetricMicroscopySeriesPlaneViewRoundtrip(pynwb_TestCase):
+    """Roundtrip test for the lazy plane views of a VolumetricMicroscopySeries read from a file."""
+
+    def setUp(self):
+        self.nwbfile_path = "test_volumetric_microscopy_series_plane_view_roundtrip.nwb"
+
+    def tearDown(self):
+        pynwb.testing.remove_test_file(self.nwbfile_path)
+
+    def test_roundtrip(self):
+        nwbfile = mock_NWBFile(session_start_time=datetime(2000, 1, 1, tzinfo=UTC))
+        devices = mock_microscope_and_light_paths(nwbfile=nwbfile)
+
+        data = np.random.default_rng(seed=0).integers(low=0, high=4096, size=(10, 8, 6, 4)).astype(np.uint16)
+        volumetric_microscopy_series = mock_VolumetricMicroscopySeries(
+            name="VolumetricMicroscopySeries",
+            volumetric_imaging_space=mock_VolumetricImagingSpace(name="VolumetricImagingSpace"),
+            data=pynwb.H5DataIO(data=data, chunks=(5, 8, 6, 1)),
+            **devices,
+        )
+        nwbfile.add_acquisition(nwbdata=volumetric_microscopy_series)
+
+        with pynwb.NWBHDF5IO(path=self.nwbfile_path, mode="w") as io:
+            io.write(nwbfile)
+
+        with pynwb.NWBHDF5IO(path=self.nwbfile_path, mode="r", load_namespaces=True) as io:
+            read_nwbfile = io.read()
+            read_volumetric_microscopy_series = read_nwbfile.acquisition["VolumetricMicroscopySeries"]
+
+            for depth in range(4):
+                plane_series = read_volumetric_microscopy_series.get_plane_series(depth=depth)
+                assert plane_series.data.dataset is read_volumetric_microscopy_series.data
+                np.testing.assert_array_equal(plane_series.data[2:7], data[2:7, :, :, depth])
+                assert plane_series.planar_imaging_space.name == f"VolumetricImagingSpacePlane{depth}"
+                assert plane_series.microscope is read_volumetric_microscopy_series.microscope
+
+
 class TestMultiPlaneMicroscopyContainerSimpleRoundtrip(pynwb_TestCase):
     """Simple roundtrip test for MultiPlaneMicroscopyContainer."""
 
@@ -331,6 +393,61 @@ class TestMultiPlaneMicroscopyContainerSimpleRoundtrip(pynwb_TestCase):
             )
 
 
+class TestMultiPlaneMicroscopyContainerVirtualStackRoundtrip(pynwb_TestCase):
+    """Roundtrip test for the stacked view and virtual dataset of the planes of a MultiPlaneMicroscopyContainer."""
+
+    def setUp(self):
+        self.nwbfile_path = "test_multi_plane_microscopy_container_virtual_stack_roundtrip.nwb"
+        self.virtual_file_path = "test_multi_plane_microscopy_container_virtual_stack.h5"
+
+    def tearDown(self):
+        pynwb.testing.remove_test_file(self.nwbfile_path)
+        pynwb.testing.remove_test_file(self.virtual_file_path)
+
+    def test_roundtrip(self):
+        nwbfile = mock_NWBFile(session_start_time=datetime(2000, 1, 1, tzinfo=UTC))
+        devices = mock_microscope_and_light_paths(nwbfile=nwbfile)
+
+        plane_data = np.random.default_rng(seed=0).integers(low=0, high=4096, size=(3, 7, 6, 5)).astype(np.uint16)
+        planar_microscopy_series = [
+            mock_PlanarMicroscopySeries(
+                name=f"PlanarMicroscopySeries_{depth}",
+                planar_imaging_space=mock_PlanarImagingSpace(
+                    name=f"PlanarImagingSpace_{depth}", origin_coordinates=[0.0, 0.0, float(depth)]
+                ),
+                data=data,
+                **devices,
+            )
+            for depth, data in enumerate(plane_data)
+        ]
+        multi_plane_microscopy_container = mock_MultiPlaneMicroscopyContainer(
+            name="MultiPlaneMicroscopyContainer", planar_microscopy_series=planar_microscopy_series
+        )
+        nwbfile.add_acquisition(nwbdata=multi_plane_microscopy_container)
+
+        with pynwb.NWBHDF5IO(path=self.nwbfile_path, mode="w") as io:
+            io.write(nwbfile)
+
+        expected_stacked_data = np.stack(list(plane_data), axis=-1)
+        with pynwb.NWBHDF5IO(path=self.nwbfile_path, mode="r", load_namespaces=True) as io:
+            read_nwbfile = io.read()
+            read_multi_plane_microscopy_container = read_nwbfile.acquisition["MultiPlaneMicroscopyContainer"]
+
+            stacked_data = read_multi_plane_microscopy_container.get_stacked_data()
+            np.testing.assert_array_equal(stacked_data[2:5, 1:3], expected_stacked_data[2:5, 1:3])
+
+            dataset_name = read_multi_plane_microscopy_container.write_virtual_stacked_dataset(
+                file_path=self.virtual_file_path
+            )
+
+        with h5py.File(self.virtual_file_path, mode="r") as file:
+            virtual_dataset = file[dataset_name]
+            assert virtual_dataset.is_virtual
+            assert virtual_dataset.shape == (7, 6, 5, 3)
+            np.testing.assert_array_equal(virtual_dataset[:], expected_stacked_data)
+            assert list(virtual_dataset.attrs["planes"]) == [series.name for series in planar_microscopy_series]
+
+
 class TestSegmentationContainerSimpleRoundtrip(pynwb_TestCase):
     """Simple roundtrip test for SegmentationContainer."""
 
@@ -356,6 +473,153 @@ class TestSegmentationContainerSimpleRoundtrip(pynwb_TestCase):
             self.assertContainerEqual(container, read_nwbfile.processing["ophys"]["SegmentationContainer"])
 
 
+class TestSegmentation2DBulkPixelMaskRoundtrip(pynwb_TestCase):
+    """Roundtrip test for a Segmentation2D populated with add_rois."""
+
+    def setUp(self):
+        self.nwbfile_path = "test_segmentation_2d_bulk_pixel_mask_roundtrip.nwb"
+
+    def tearDown(self):
+        pynwb.testing.remove_test_file(self.nwbfile_path)
+
+    def test_roundtrip(self):
+        nwbfile = mock_NWBFile(session_start_time=datetime(2000, 1, 1, tzinfo=UTC))
+
+        planar_imaging_space = mock_PlanarImagingSpace(name="PlanarImagingSpace")
+        segmentation_2D = Segmentation2D(
+            name="Segmentation2D", description="", planar_imaging_space=planar_imaging_space
+        )
+        image_masks = np.zeros((10, 8, 8))
+        for roi_index in range(10):
+            image_masks[roi_index, roi_index % 8, : roi_index % 5 + 1] = 0.5
+        pixel_mask, pixel_mask_index = segmentation_2D.image_masks_to_pixel_mask(image_masks)
+        segmentation_2D.add_rois(pixel_mask=pixel_mask, pixel_mask_index=pixel_mask_index)
+        segmentation_2D.add_roi(pixel_mask=[[7, 7, 1.0]])
+
+        segmentation_container = mock_SegmentationContainer(
+            name="SegmentationContainer", segmentations=[segmentation_2D]
+        )
+        ophys_module = nwbfile.create_processing_module(name="ophys", description="")
+        ophys_module.add(segmentation_container)
+
+        with pynwb.NWBHDF5IO(path=self.nwbfile_path, mode="w") as io:
+            io.write(nwbfile)
+
+        with pynwb.NWBHDF5IO(path=self.nwbfile_path, mode="r", load_namespaces=True) as io:
+            read_nwbfile = io.read()
+
+            read_segmentation_container = read_nwbfile.processing["ophys"]["SegmentationContainer"]
+            self.assertContainerEqual(segmentation_container, read_segmentation_container)
+
+            read_segmentation_2D = read_segmentation_container.segmentations["Segmentation2D"]
+            np.testing.assert_allclose(
+                read_segmentation_2D.get_sparse_mask_matrix(image_shape=(8, 8)).toarray(),
+                segmentation_2D.get_sparse_mask_matrix(image_shape=(8, 8)).toarray(),
+            )
+            np.testing.assert_array_equal(
+                read_segmentation_2D.get_image_masks(image_shape=(8, 8))[2:5], image_masks[2:5]
+            )
+
+
+def _count_chunks_touched(chunk_shape, data_shape, selection):
+    """Count the storage chunks read by a selection of integers and slices along the leading axes of a dataset."""
+    selection = tuple(selection) + (slice(None),) * (len(data_shape) - len(selection))
+    number_of_chunks = 1
+    for index, chunk_length, length in zip(selection, chunk_shape, data_shape):
+        if isinstance(index, slice):
+            start, stop, _ = index.indices(length)
+            number_of_chunks *= (stop - 1) // chunk_length - start // chunk_length + 1
+    return number_of_chunks
+
+
+class TestPlanarMicroscopySeriesChunkingRoundtrip(pynwb_TestCase):
+    """Roundtrip test for PlanarMicroscopySeries chunked for each access pattern, counting the chunks of each read."""
+
+    access_patterns = ("frame", "time", "block")
+
+    def setUp(self):
+        self.nwbfile_path = "test_planar_microscopy_series_chunking_roundtrip.nwb"
+
+    def tearDown(self):
+        pynwb.testing.remove_test_file(self.nwbfile_path)
+
+    def _write_series(self):
+        """Write the same data chunked for each access pattern, and return it."""
+        nwbfile = mock_NWBFile(session_start_time=datetime(2000, 1, 1, tzinfo=UTC))
+        devices = mock_microscope_and_light_paths(nwbfile=nwbfile)
+        planar_imaging_space = mock_PlanarImagingSpace(name="PlanarImagingSpace")
+
+        data = np.random.default_rng(seed=0).integers(low=0, high=512, size=(240, 96, 96)).astype(np.uint16)
+        for access_pattern in self.access_patterns:
+            data_io_settings = recommend_data_io_settings(
+                data_shape=data.shape, dtype=data.dtype, access_pattern=access_pattern, chunk_size_in_bytes=64 * 1024
+            )
+            nwbfile.add_acquisition(
+                nwbdata=mock_PlanarMicroscopySeries(
+                    name=f"PlanarMicroscopySeries_{access_pattern}",
+                    planar_imaging_space=planar_imaging_space,
+                    data=pynwb.H5DataIO(data=data, **data_io_settings),
+                    **devices,
+                )
+            )
+
+        with pynwb.NWBHDF5IO(path=self.nwbfile_path, mode="w") as io:
+            io.write(nwbfile)
+        return data
+
+    def test_roundtrip(self):
+        data = self._write_series()
+
+        chunk_shapes = dict()
+        with pynwb.NWBHDF5IO(path=self.nwbfile_path, mode="r", load_namespaces=True) as io:
+            read_nwbfile = io.read()
+            for access_pattern in self.access_patterns:
+                read_data = read_nwbfile.acquisition[f"PlanarMicroscopySeries_{access_pattern}"].data
+                np.testing.assert_array_equal(read_data[:], data)
+                chunk_shapes[access_pattern] = read_data.chunks
+
+        assert chunk_shapes == dict(frame=(3, 96, 96), time=(240, 6, 12), block=(30, 24, 24))
+
+        # Each access pattern reads a single chunk from the chunks recommended for it, and many from the others
+        frame_selection, trace_selection = (17,), (slice(None), 40, 70)
+        frame_chunks_touched, trace_chunks_touched = (
+            {
+                access_pattern: _count_chunks_touched(
+                    chunk_shape=chunk_shape, data_shape=data.shape, selection=selection
+                )
+                for access_pattern, chunk_shape in chunk_shapes.items()
+            }
+            for selection in (frame_selection, trace_selection)
+        )
+        assert frame_chunks_touched == dict(frame=1, time=128, block=16)
+        assert trace_chunks_touched == dict(frame=80, time=1, block=8)
+
+    @requires_benchmark
+    def test_read_throughput(self):
+        """Benchmark the time to read random frames and pixel traces from the chunks of each access pattern."""
+        data = self._write_series()
+        rng = np.random.default_rng(seed=1)
+        frame_selections = [(int(frame),) for frame in rng.integers(low=0, high=data.shape[0], size=100)]
+        trace_selections = [(slice(None), int(x), int(y)) for x, y in rng.integers(low=0, high=96, size=(100, 2))]
+
+        frame_read_times, trace_read_times = dict(), dict()
+        with pynwb.NWBHDF5IO(path=self.nwbfile_path, mode="r", load_namespaces=True) as io:
+            read_nwbfile = io.read()
+            for access_pattern in self.access_patterns:
+                read_data = read_nwbfile.acquisition[f"PlanarMicroscopySeries_{access_pattern}"].data
+                for read_times, selections in (
+                    (frame_read_times, frame_selections),
+                    (trace_read_times, trace_selections),
+                ):
+                    start_time = time.perf_counter()
+                    for selection in selections:
+                        read_data[selection]
+                    read_times[access_pattern] = time.perf_counter() - start_time
+
+        assert frame_read_times["frame"] < frame_read_times["time"], f"Frame read times (s): {frame_read_times}"
+        assert trace_read_times["time"] < trace_read_times["frame"], f"Trace read times (s): {trace_read_times}"
+
+
 class TestMicroscopyResponseSeriesSimpleRoundtrip(pynwb_TestCase):
     """Simple roundtrip test for MicroscopyResponseSeries."""
 
@@ -413,5 +677,144 @@ class TestMicroscopyResponseSeriesSimpleRoundtrip(pynwb_TestCase):
             )
 
 
+@requires_hdmf_zarr
+class TestZarrRoundtrip(pynwb_TestCase):
+    """Roundtrip test for every ndx-microscopy type through hdmf-zarr on a local directory store."""
+
+    def setUp(self):
+        self.nwbfile_path = "test_zarr_roundtrip.nwb.zarr"
+
+    def tearDown(self):
+        shutil.rmtree(self.nwbfile_path, ignore_errors=True)
+
+    def test_roundtrip(self):
+        nwbfile = mock_NWBFile(session_start_time=datetime(2000, 1, 1, tzinfo=UTC))
+        devices = mock_microscope_and_light_paths(nwbfile=nwbfile)
+
+        planar_imaging_space = mock_PlanarImagingSpace(
+            name="PlanarImagingSpace", illumination_pattern=mock_LineScan(name="LineScan")
+        )
+        volumetric_imaging_space = mock_VolumetricImagingSpace(
+            name="VolumetricImagingSpace", illumination_pattern=mock_PlaneAcquisition(name="PlaneAcquisition")
+        )
+        planar_imaging_space_2 = mock_PlanarImagingSpace(
+            name="PlanarImagingSpace_2",
+            origin_coordinates=[0.0, 0.0, 1.0],
+            illumination_pattern=mock_RandomAccessScan(name="RandomAccessScan"),
+        )
+
+        planar_microscopy_series = mock_PlanarMicroscopySeries(
+            name="PlanarMicroscopySeries", planar_imaging_space=planar_imaging_space, **devices
+        )
+        volumetric_microscopy_series = mock_VolumetricMicroscopySeries(
+            name="VolumetricMicroscopySeries", volumetric_imaging_space=volumetric_imaging_space, **devices
+        )
+        multi_plane_microscopy_container = mock_MultiPlaneMicroscopyContainer(
+            name="MultiPlaneMicroscopyContainer",
+            planar_microscopy_series=[
+                mock_PlanarMicroscopySeries(
+                    name="PlanarMicroscopySeries_1", planar_imaging_space=planar_imaging_space, **devices
+                ),
+                mock_PlanarMicroscopySeries(
+                    name="PlanarMicroscopySeries_2", planar_imaging_space=planar_imaging_space_2, **devices
+                ),
+            ],
+        )
+        for acquisition in (planar_microscopy_series, volumetric_microscopy_series, multi_plane_microscopy_container):
+            nwbfile.add_acquisition(nwbdata=acquisition)
+
+        segmentation_2D = mock_Segmentation2D(name="Segmentation2D", planar_imaging_space=planar_imaging_space)
+        segmentation_2D_pixel_masks = Segmentation2D(
+            name="Segmentation2DPixelMasks", description="", planar_imaging_space=planar_imaging_space
+        )
+        segmentation_2D_pixel_masks.add_rois(
+            pixel_mask=[[0, 0, 1.0], [1, 0, 0.5], [3, 4, 1.0]], pixel_mask_counts=[2, 1]
+        )
+        segmentation_3D = mock_Segmentation3D(name="Segmentation3D", volumetric_imaging_space=volumetric_imaging_space)
+        segmentation_container = mock_SegmentationContainer(
+            name="SegmentationContainer",
+            segmentations=[segmentation_2D, segmentation_2D_pixel_masks, segmentation_3D],
+        )
+        ophys_module = nwbfile.create_processing_module(name="ophys", description="")
+        ophys_module.add(segmentation_container)
+
+        microscopy_response_series = mock_MicroscopyResponseSeries(
+            name="MicroscopyResponseSeries",
+            rois=segmentation_2D.create_roi_table_region(description="", region=list(range(len(segmentation_2D.id)))),
+        )
+        microscopy_response_series_container = MicroscopyResponseSeriesContainer(
+            name="MicroscopyResponseSeriesContainer", microscopy_response_series=[microscopy_response_series]
+        )
+        ophys_module.add(microscopy_response_series_container)
+
+        with NWBZarrIO(path=self.nwbfile_path, mode="w") as io:
+            io.write(nwbfile)
+
+        with NWBZarrIO(path=self.nwbfile_path, mode="r") as io:
+            read_nwbfile = io.read()
+
+            self.assertContainerEqual(devices["microscope"], read_nwbfile.devices["Microscope"])
+            self.assertContainerEqual(
+                devices["excitation_light_path"], read_nwbfile.lab_meta_data["ExcitationLightPath"]
+            )
+            self.assertContainerEqual(devices["emission_light_path"], read_nwbfile.lab_meta_data["EmissionLightPath"])
+            self.assertContainerEqual(planar_microscopy_series, read_nwbfile.acquisition["PlanarMicroscopySeries"])
+            self.assertContainerEqual(
+                volumetric_microscopy_series, read_nwbfile.acquisition["VolumetricMicroscopySeries"]
+            )
+            self.assertContainerEqual(
+                multi_plane_microscopy_container, read_nwbfile.acquisition["MultiPlaneMicroscopyContainer"]
+            )
+            self.assertContainerEqual(segmentation_container, read_nwbfile.processing["ophys"]["SegmentationContainer"])
+            self.assertContainerEqual(
+                microscopy_response_series_container,
+                read_nwbfile.processing["ophys"]["MicroscopyResponseSeriesContainer"],
+            )
+
+
+@requires_hdmf_zarr
+class TestZarrParallelWriteRoundtrip(pynwb_TestCase):
+    """Roundtrip test for the data of a PlanarMicroscopySeries written to Zarr chunks across processes."""
+
+    def setUp(self):
+        self.nwbfile_path = "test_zarr_parallel_write_roundtrip.nwb.zarr"
+        self.raw_file_path = "test_zarr_parallel_write_roundtrip.bin"
+
+    def tearDown(self):
+        shutil.rmtree(self.nwbfile_path, ignore_errors=True)
+        pynwb.testing.remove_test_file(self.raw_file_path)
+
+    def test_roundtrip(self):
+        nwbfile = mock_NWBFile(session_start_time=datetime(2000, 1, 1, tzinfo=UTC))
+        devices = mock_microscope_and_light_paths(nwbfile=nwbfile)
+
+        data = np.random.default_rng(seed=0).integers(low=0, high=4096, size=(48, 16, 12)).astype(np.uint16)
+        data.tofile(self.raw_file_path)
+        raw_data = RawBinaryMicroscopyData(
+            file_path=self.raw_file_path,
+            dtype=np.uint16,
+            frame_shape=(16, 12),
+            chunk_shape=(4, 16, 12),
+            buffer_size_in_bytes=2 * 4 * 16 * 12 * 2,
+        )
+        planar_microscopy_series = mock_PlanarMicroscopySeries(
+            name="PlanarMicroscopySeries",
+            planar_imaging_space=mock_PlanarImagingSpace(name="PlanarImagingSpace"),
+            data=raw_data,
+            **devices,
+        )
+        nwbfile.add_acquisition(nwbdata=planar_microscopy_series)
+
+        with NWBZarrIO(path=self.nwbfile_path, mode="w") as io:
+            io.write(nwbfile, number_of_jobs=2)
+
+        with NWBZarrIO(path=self.nwbfile_path, mode="r") as io:
+            read_nwbfile = io.read()
+            read_data = read_nwbfile.acquisition["PlanarMicroscopySeries"].data
+
+            np.testing.assert_array_equal(read_data[:], data)
+            assert read_data.chunks == (4, 16, 12)
+
+
 if __name__ == "__main__":
     pytest.main()  # Required since not a typical package structure
@@ -0,0 +1,133 @@
+"""Test streaming of frames into the data of microscopy series."""
+
+from datetime import datetime
+
+import numpy as np
+import pynwb
+import pytest
+from pynwb.testing import TestCase as pynwb_TestCase
+from pynwb.testing.mock.file import mock_NWBFile
+from pytz import UTC
+
+from ndx_microscopy.streaming import stream_microscopy_frames
+from ndx_microscopy.testing import (
+    mock_PlanarImagingSpace,
+    mock_PlanarMicroscopySeries,
+    mock_VolumetricImagingSpace,
+    mock_VolumetricMicroscopySeries,
+    mock_microscope_and_light_paths,
+)
+
+
+def test_stream_microscopy_frames_settings():
+    """Test the frame-aligned chunking and compression chosen for streamed frames."""
+    frames = (np.zeros((64, 32), dtype=np.uint16) for _ in range(10))
+
+    data_io = stream_microscopy_frames(frames, chunk_size_in_bytes=64 * 32 * 2 * 3)
+
+    assert data_io.io_settings["chunks"] == (3, 64, 32)
+    assert data_io.io_settings["compression"] == "gzip"
+    assert data_io.data.maxshape == (None, 64, 32)
+    assert data_io.data.dtype == np.uint16
+
+
+def test_stream_microscopy_frames_with_frame_shape_and_dtype():
+    """Test that no frame is read before writing when the frame shape and data type are given."""
+    frames_read = list()
+
+    def read_frames():
+        for frame_index in range(4):
+            frames_read.append(frame_index)
+            yield np.zeros((8, 6), dtype=np.int16)
+
+    data_io = stream_microscopy_frames(read_frames(), frame_shape=(8, 6), dtype=np.int16, number_of_frames=4)
+
+    assert frames_read == []
+    assert data_io.io_settings["chunks"] == (4, 8, 6)
+    assert data_io.data.maxshape == (4, 8, 6) and data_io.data.dtype == np.int16
+    assert np.concatenate([data_chunk.data for data_chunk in data_io.data]).shape == (4, 8, 6)
+    assert frames_read == [0, 1, 2, 3]
+
+
+def test_stream_microscopy_frames_value_error():
+    """Test ValueError for an empty iterator of frames."""
+    with pytest.raises(ValueError, match="'frames' must contain at least one frame"):
+        stream_microscopy_frames(iter([]))
+
+
+class TestStreamedPlanarMicroscopySeriesRoundtrip(pynwb_TestCase):
+    """Roundtrip test for a PlanarMicroscopySeries written from a generator of frames."""
+
+    def setUp(self):
+        self.nwbfile_path = "test_streamed_planar_microscopy_series_roundtrip.nwb"
+
+    def tearDown(self):
+        pynwb.testing.remove_test_file(self.nwbfile_path)
+
+    def test_roundtrip(self):
+        nwbfile = mock_NWBFile(session_start_time=datetime(2000, 1, 1, tzinfo=UTC))
+        devices = mock_microscope_and_light_paths(nwbfile=nwbfile)
+
+        data = np.random.default_rng(seed=0).integers(low=0, high=4096, size=(23, 16, 12)).astype(np.uint16)
+        frames_read = list()
+
+        def read_frames():
+            for frame_index, frame in enumerate(data):
+                frames_read.append(frame_index)
+                yield frame
+
+        planar_microscopy_series = mock_PlanarMicroscopySeries(
+            name="PlanarMicroscopySeries",
+            planar_imaging_space=mock_PlanarImagingSpace(name="PlanarImagingSpace"),
+            data=stream_microscopy_frames(read_frames(), frames_per_chunk=5),
+            rate=30.0,
+            **devices,
+        )
+        nwbfile.add_acquisition(nwbdata=planar_microscopy_series)
+        assert len(frames_read) == 1  # Only the first frame is read before writing
+
+        with pynwb.NWBHDF5IO(path=self.nwbfile_path, mode="w") as io:
+            io.write(nwbfile)
+
+        with pynwb.NWBHDF5IO(path=self.nwbfile_path, mode="r", load_namespaces=True) as io:
+            read_nwbfile = io.read()
+            read_data = read_nwbfile.acquisition["PlanarMicroscopySeries"].data
+
+            np.testing.assert_array_equal(read_data[:], data)
+            assert read_data.chunks == (5, 16, 12)
+            assert read_data.maxshape == (None, 16, 12)
+            assert read_data.compression == "gzip"
+
+
+class TestStreamedVolumetricMicroscopySeriesRoundtrip(pynwb_TestCase):
+    """Roundtrip test for a VolumetricMicroscopySeries written from a generator of volumes."""
+
+    def setUp(self):
+        self.nwbfile_path = "test_streamed_volumetric_microscopy_series_roundtrip.nwb"
+
+    def tearDown(self):
+        pynwb.testing.remove_test_file(self.nwbfile_path)
+
+    def test_roundtrip(self):
+        nwbfile = mock_NWBFile(session_start_time=datetime(2000, 1, 1, tzinfo=UTC))
+        devices = mock_microscope_and_light_paths(nwbfile=nwbfile)
+
+        data = np.random.default_rng(seed=0).random(size=(9, 8, 6, 4))
+        volumetric_microscopy_series = mock_VolumetricMicroscopySeries(
+            name="VolumetricMicroscopySeries",
+            volumetric_imaging_space=mock_VolumetricImagingSpace(name="VolumetricImagingSpace"),
+            data=stream_microscopy_frames(iter(data), number_of_frames=9, compression=None),
+            **devices,
+        )
+        nwbfile.add_acquisition(nwbdata=volumetric_microscopy_series)
+
+        with pynwb.NWBHDF5IO(path=self.nwbfile_path, mode="w") as io:
+            io.write(nwbfile)
+
+        with pynwb.NWBHDF5IO(path=self.nwbfile_path, mode="r", load_namespaces=True) as io:
+            read_nwbfile = io.read()
+            read_data = read_nwbfile.acquisition["VolumetricMicroscopySeries"].data
+
+            np.testing.assert_array_equal(read_data[:], data)
+            assert read_data.chunks == (9, 8, 6, 4)
+            assert read_data.compression is None
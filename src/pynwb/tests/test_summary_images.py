@@ -0,0 +1,153 @@
+"""Test the one-pass computation of summary images from microscopy series."""
+
+from datetime import datetime
+
+import numpy as np
+import pynwb
+import pytest
+from hdmf.backends.hdf5 import H5DataIO
+from pynwb.testing import TestCase as pynwb_TestCase
+from pynwb.testing.mock.file import mock_NWBFile
+from pytz import UTC
+
+from ndx_microscopy import Segmentation2D
+from ndx_microscopy.summary_images import compute_summary_images
+from ndx_microscopy.testing import (
+    mock_EmissionLightPath,
+    mock_ExcitationLightPath,
+    mock_Microscope,
+    mock_PlanarImagingSpace,
+    mock_PlanarMicroscopySeries,
+    mock_VolumetricImagingSpace,
+    mock_VolumetricMicroscopySeries,
+    mock_microscope_and_light_paths,
+)
+
+
+def _expected_correlation_image(data):
+    """Compute the mean correlation of each pixel with its adjacent pixels, one pair at a time (0 if constant)."""
+    frame_shape = data.shape[1:]
+    correlation_image = np.zeros(frame_shape)
+    for pixel in np.ndindex(*frame_shape):
+        correlations = list()
+        for offset in np.ndindex(*(3,) * len(frame_shape)):
+            neighbour = tuple(coordinate + step - 1 for coordinate, step in zip(pixel, offset))
+            if neighbour == pixel or not all(
+                0 <= coordinate < length for coordinate, length in zip(neighbour, frame_shape)
+            ):
+                continue
+            with np.errstate(invalid="ignore", divide="ignore"):
+                correlation = np.corrcoef(data[(slice(None),) + pixel], data[(slice(None),) + neighbour])[0, 1]
+            correlations.append(np.nan_to_num(correlation))
+        correlation_image[pixel] = np.mean(correlations)
+    return correlation_image
+
+
+@pytest.mark.parametrize("max_workers", [1, 2])
+def test_compute_planar_summary_images(max_workers):
+    """Test that summary images computed in blocks of frames match the statistics of the whole movie."""
+    data = np.random.default_rng(seed=0).integers(low=0, high=4096, size=(50, 6, 5)).astype(np.uint16)
+    data[:, :3] += np.arange(50, dtype=np.uint16)[:, np.newaxis, np.newaxis] * 100
+    planar_microscopy_series = mock_PlanarMicroscopySeries(
+        microscope=mock_Microscope(),
+        excitation_light_path=mock_ExcitationLightPath(),
+        planar_imaging_space=mock_PlanarImagingSpace(),
+        emission_light_path=mock_EmissionLightPath(),
+        data=data,
+    )
+
+    summary_images = compute_summary_images(
+        microscopy_series=planar_microscopy_series, frames_per_chunk=7, max_workers=max_workers
+    )
+
+    assert [summary_image.name for summary_image in summary_images] == ["mean", "max", "std", "correlation"]
+    mean_image, max_image, std_image, correlation_image = (summary_image.data for summary_image in summary_images)
+    np.testing.assert_allclose(mean_image, data.mean(axis=0), rtol=1e-6)
+    np.testing.assert_array_equal(max_image, data.max(axis=0))
+    assert max_image.dtype == np.uint16 and mean_image.dtype == np.float32
+    np.testing.assert_allclose(std_image, data.std(axis=0), rtol=1e-5)
+    np.testing.assert_allclose(correlation_image, _expected_correlation_image(data.astype(np.float64)), atol=1e-6)
+
+
+def test_compute_volumetric_summary_images():
+    """Test the std and correlation images of a VolumetricMicroscopySeries, with a constant voxel."""
+    data = np.random.default_rng(seed=0).random(size=(20, 4, 3, 3))
+    data[:, 0, 0, 0] = 1.0
+    volumetric_microscopy_series = mock_VolumetricMicroscopySeries(
+        microscope=mock_Microscope(),
+        excitation_light_path=mock_ExcitationLightPath(),
+        volumetric_imaging_space=mock_VolumetricImagingSpace(),
+        emission_light_path=mock_EmissionLightPath(),
+        data=data,
+    )
+
+    std_image, correlation_image = compute_summary_images(
+        microscopy_series=volumetric_microscopy_series,
+        statistics=["std", "correlation"],
+        frames_per_chunk=3,
+        dtype=np.float64,
+    )
+
+    np.testing.assert_allclose(std_image.data, data.std(axis=0))
+    np.testing.assert_allclose(correlation_image.data, _expected_correlation_image(data), atol=1e-10)
+    assert correlation_image.data[0, 0, 0] == 0.0
+
+
+def test_compute_summary_images_value_error():
+    """Test ValueError for an unsupported statistic."""
+    planar_microscopy_series = mock_PlanarMicroscopySeries(
+        microscope=mock_Microscope(),
+        excitation_light_path=mock_ExcitationLightPath(),
+        planar_imaging_space=mock_PlanarImagingSpace(),
+        emission_light_path=mock_EmissionLightPath(),
+    )
+    with pytest.raises(ValueError, match="'statistics' must be among"):
+        compute_summary_images(microscopy_series=planar_microscopy_series, statistics=["median"])
+
+
+class TestSummaryImagesRoundtrip(pynwb_TestCase):
+    """Roundtrip test for summary images computed from a chunked PlanarMicroscopySeries read back from a file."""
+
+    def setUp(self):
+        self.nwbfile_path = "test_summary_images_roundtrip.nwb"
+
+    def tearDown(self):
+        pynwb.testing.remove_test_file(self.nwbfile_path)
+
+    def test_roundtrip(self):
+        nwbfile = mock_NWBFile(session_start_time=datetime(2000, 1, 1, tzinfo=UTC))
+        devices = mock_microscope_and_light_paths(nwbfile=nwbfile)
+
+        data = np.random.default_rng(seed=0).random(size=(30, 8, 6)).astype(np.float32)
+        planar_imaging_space = mock_PlanarImagingSpace(name="PlanarImagingSpace")
+        planar_microscopy_series = mock_PlanarMicroscopySeries(
+            name="PlanarMicroscopySeries",
+            planar_imaging_space=planar_imaging_space,
+            data=H5DataIO(data=data, chunks=(4, 8, 6)),
+            **devices,
+        )
+        nwbfile.add_acquisition(nwbdata=planar_microscopy_series)
+
+        with pynwb.NWBHDF5IO(path=self.nwbfile_path, mode="w") as io:
+            io.write(nwbfile)
+
+        with pynwb.NWBHDF5IO(path=self.nwbfile_path, mode="a", load_namespaces=True) as io:
+            read_nwbfile = io.read()
+            read_planar_microscopy_series = read_nwbfile.acquisition["PlanarMicroscopySeries"]
+            summary_images = compute_summary_images(microscopy_series=read_planar_microscopy_series, max_workers=2)
+            segmentation_2D = Segmentation2D(
+                name="Segmentation2D",
+                description="",
+                planar_imaging_space=read_nwbfile.acquisition["PlanarMicroscopySeries"].planar_imaging_space,
+                summary_images=summary_images,
+            )
+            ophys_module = read_nwbfile.create_processing_module(name="ophys", description="")
+            ophys_module.add(segmentation_2D)
+            io.write(read_nwbfile)
+
+        with pynwb.NWBHDF5IO(path=self.nwbfile_path, mode="r", load_namespaces=True) as io:
+            read_nwbfile = io.read()
+            read_summary_images = read_nwbfile.processing["ophys"]["Segmentation2D"].summary_images
+            np.testing.assert_allclose(read_summary_images["mean"].data[:], data.mean(axis=0), rtol=1e-6)
+            np.testing.assert_array_equal(read_summary_images["max"].data[:], data.max(axis=0))
+            assert read_summary_images["correlation"].data.shape == (8, 6)
@@ -0,0 +1,123 @@
+"""Test the lookup of the frames of microscopy series and response series at given times."""
+
+import numpy as np
+import pytest
+
+from ndx_microscopy import MicroscopyResponseSeriesContainer
+from ndx_microscopy.testing import (
+    mock_EmissionLightPath,
+    mock_ExcitationLightPath,
+    mock_Microscope,
+    mock_MicroscopyResponseSeries,
+    mock_MultiPlaneMicroscopyContainer,
+    mock_PlanarImagingSpace,
+    mock_PlanarMicroscopySeries,
+    mock_Segmentation2D,
+)
+
+
+def _mock_planar_microscopy_series(name, number_of_frames, **timing):
+    return mock_PlanarMicroscopySeries(
+        name=name,
+        microscope=mock_Microscope(),
+        excitation_light_path=mock_ExcitationLightPath(),
+        planar_imaging_space=mock_PlanarImagingSpace(),
+        emission_light_path=mock_EmissionLightPath(),
+        data=np.zeros((number_of_frames, 2, 2)),
+        **timing,
+    )
+
+
+def _expected_frame_indices(frame_times, times, method):
+    """Look up each time by brute force over the frame times."""
+    if method == "floor":
+        return np.array([np.sum(frame_times <= time) - 1 for time in times])
+    return np.array([np.argmin(np.abs(frame_times - time)) for time in times])
+
+
+@pytest.mark.parametrize("method", ["nearest", "floor"])
+def test_get_frame_indices(method):
+    """Test that regular and irregular series map times to the same frames as a brute force lookup."""
+    times = np.random.default_rng(seed=0).uniform(low=-1.0, high=12.0, size=1000)
+    frame_times = 0.5 + np.arange(100) / 10.0
+    regular_series = _mock_planar_microscopy_series(
+        name="RegularSeries", number_of_frames=100, starting_time=0.5, rate=10.0
+    )
+    irregular_frame_times = np.cumsum(np.random.default_rng(seed=1).uniform(low=0.05, high=0.15, size=100))
+    irregular_series = _mock_planar_microscopy_series(
+        name="IrregularSeries", number_of_frames=100, rate=None, timestamps=irregular_frame_times
+    )
+
+    np.testing.assert_array_equal(
+        regular_series.get_frame_indices(times=times, method=method),
+        _expected_frame_indices(frame_times=frame_times, times=times, method=method),
+    )
+    np.testing.assert_array_equal(
+        irregular_series.get_frame_indices(times=times, method=method),
+        _expected_frame_indices(frame_times=irregular_frame_times, times=times, method=method),
+    )
+    # The times of the frames map to their own frames despite rounding errors
+    np.testing.assert_array_equal(regular_series.get_frame_indices(times=frame_times, method=method), np.arange(100))
+    assert regular_series.get_frame_time_index() is regular_series.get_frame_time_index()
+
+
+def test_get_frame_windows():
+    """Test the ranges of frames within time windows of regular and irregular series."""
+    regular_series = _mock_planar_microscopy_series(name="RegularSeries", number_of_frames=10, rate=2.0)
+    start_frame_indices, stop_frame_indices = regular_series.get_frame_windows(
+        start_times=[-1.0, 0.5, 1.2, 4.0, 3.0], stop_times=[0.6, 1.5, 1.3, 9.0, 2.0]
+    )
+    np.testing.assert_array_equal(start_frame_indices, [0, 1, 3, 8, 6])
+    np.testing.assert_array_equal(stop_frame_indices, [2, 3, 3, 10, 6])
+
+    irregular_series = _mock_planar_microscopy_series(
+        name="IrregularSeries", number_of_frames=4, rate=None, timestamps=[0.0, 0.1, 0.5, 0.6]
+    )
+    start_frame_indices, stop_frame_indices = irregular_series.get_frame_windows(start_times=[0.1], stop_times=[0.6])
+    np.testing.assert_array_equal(start_frame_indices, [1])
+    np.testing.assert_array_equal(stop_frame_indices, [3])
+
+
+def test_get_frame_indices_value_error():
+    """Test ValueError for an unsupported lookup method."""
+    regular_series = _mock_planar_microscopy_series(name="RegularSeries", number_of_frames=10, rate=2.0)
+    with pytest.raises(ValueError, match="'method' must be one of"):
+        regular_series.get_frame_indices(times=[1.0], method="ceil")
+
+
+def test_get_frame_indices_across_planes():
+    """Test that each plane of a MultiPlaneMicroscopyContainer is looked up with its own time offset."""
+    planar_microscopy_series = [
+        _mock_planar_microscopy_series(
+            name=f"PlanarMicroscopySeries{plane}", number_of_frames=50, starting_time=plane * 0.025, rate=10.0
+        )
+        for plane in range(4)
+    ]
+    multi_plane_microscopy_container = mock_MultiPlaneMicroscopyContainer(
+        name="MultiPlaneMicroscopyContainer", planar_microscopy_series=planar_microscopy_series
+    )
+
+    frame_indices = multi_plane_microscopy_container.get_frame_indices(times=[0.07, 1.0], method="floor")
+
+    assert list(frame_indices) == [f"PlanarMicroscopySeries{plane}" for plane in range(4)]
+    assert [list(indices) for indices in frame_indices.values()] == [[0, 10], [0, 9], [0, 9], [-1, 9]]
+    frame_windows = multi_plane_microscopy_container.get_frame_windows(start_times=[0.0], stop_times=[0.3])
+    assert [int(stop[0] - start[0]) for start, stop in frame_windows.values()] == [3, 3, 3, 3]
+
+
+def test_get_frame_indices_across_response_series():
+    """Test the lookup of the frames of the series of a MicroscopyResponseSeriesContainer."""
+    segmentation_2D = mock_Segmentation2D(planar_imaging_space=mock_PlanarImagingSpace())
+    rois = segmentation_2D.create_roi_table_region(description="", region=[0])
+    microscopy_response_series_container = MicroscopyResponseSeriesContainer(
+        name="MicroscopyResponseSeriesContainer",
+        microscopy_response_series=[
+            mock_MicroscopyResponseSeries(name="Fast", rois=rois, rate=30.0),
+            mock_MicroscopyResponseSeries(name="Irregular", rois=rois, timestamps=np.arange(100) * 0.5),
+        ],
+    )
+
+    frame_indices = microscopy_response_series_container.get_frame_indices(times=[1.0, 2.26])
+
+    np.testing.assert_array_equal(frame_indices["Fast"], [30, 68])
+    np.testing.assert_array_equal(frame_indices["Irregular"], [2, 5])